@@ -0,0 +1,68 @@
+# benchmark_sessions.py
+"""
+Measure the per-request overhead of SessionMemoryManager as the number of sessions grows.
+
+No Sonar calls are made: each simulated turn does the memory work of `chat_with_memory`
+(put user message, get history, put assistant reply) against a MockLLM, so the numbers
+isolate the cost of session lookup, locking, LRU eviction and rehydration.
+
+Usage:
+  python benchmark_sessions.py --sessions 100 1000 10000 --requests 20000
+"""
+
+import argparse
+import random
+import statistics
+import tempfile
+import time
+
+from llama_index.core.llms import ChatMessage, MockLLM
+
+from session_memory_manager import SessionMemoryManager
+
+
+def run(num_sessions: int, num_requests: int, max_active: int, seed: int = 0) -> dict:
+    rng = random.Random(seed)
+    with tempfile.TemporaryDirectory() as spill_dir:
+        manager = SessionMemoryManager(
+            llm=MockLLM(max_tokens=32),
+            system_prompt="You're an AI assistant providing detailed, accurate answers",
+            token_limit=3000,
+            max_active_sessions=max_active,
+            spill_dir=spill_dir,
+        )
+        latencies = []
+        for i in range(num_requests):
+            session_id = f"user-{rng.randrange(num_sessions)}"
+            start = time.perf_counter()
+            with manager.session(session_id) as memory:
+                memory.put(ChatMessage(role="user", content=f"Question {i} about the market"))
+                memory.get()
+                memory.put(ChatMessage(role="assistant", content=f"Answer {i}: prices moved."))
+            latencies.append((time.perf_counter() - start) * 1e6)
+
+    latencies.sort()
+    return {
+        "sessions": num_sessions,
+        "mean_us": statistics.fmean(latencies),
+        "p50_us": latencies[len(latencies) // 2],
+        "p99_us": latencies[int(len(latencies) * 0.99)],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark SessionMemoryManager overhead")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--max-active", type=int, default=1000)
+    args = parser.parse_args()
+
+    print(f"{'sessions':>10} {'mean (us)':>10} {'p50 (us)':>10} {'p99 (us)':>10}")
+    for num_sessions in args.sessions:
+        stats = run(num_sessions, args.requests, args.max_active)
+        print(f"{stats['sessions']:>10} {stats['mean_us']:>10.1f} "
+              f"{stats['p50_us']:>10.1f} {stats['p99_us']:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,12 @@
-from llama_index.core.memory import ChatSummaryMemoryBuffer
 from llama_index.core.llms import ChatMessage
 from llama_index.llms.openai import OpenAI as LlamaOpenAI
 from openai import OpenAI as PerplexityClient
 from dotenv import load_dotenv
 import os
 
+from memory_persistence import SQLiteMemoryBackend
+from session_memory_manager import SessionMemoryManager
+
 # Load environment variables from .env file
 load_dotenv()
 
@@ -15,43 +17,50 @@ llm = LlamaOpenAI(
     base_url="https://api.openai.com/v1/chat/completions"
 )
 
-# Initialize memory with token-aware summarization
-memory = ChatSummaryMemoryBuffer.from_defaults(
-    token_limit=3000,
-    llm=llm
-)
+# Session-keyed memory: every session gets its own token-aware, incrementally summarized
+# memory. Idle sessions beyond `max_active_sessions` are evicted and rehydrated on demand.
+# Messages are appended to a SQLite log (with periodic snapshots) by a background writer,
+# so conversations survive process restarts.
+def create_session_manager() -> SessionMemoryManager:
+    return SessionMemoryManager(
+        llm=llm,
+        system_prompt="You're an AI assistant providing detailed, accurate answers",
+        token_limit=3000,
+        max_active_sessions=1000,
+        backend=SQLiteMemoryBackend(os.getenv("CHAT_MEMORY_DB", "./chat_memory.db")),
+        snapshot_every=20
+    )
 
-# Add system prompt using ChatMessage
-memory.put(ChatMessage(
-    role="system",
-    content="You're an AI assistant providing detailed, accurate answers"
-))
+sessions = create_session_manager()
 
 # Create API client
 sonar_client = PerplexityClient(
     api_key=os.getenv("PERPLEXITY_API_KEY"),
-    base_url="https://api.perplexity.ai"
+    base_url=os.getenv("PERPLEXITY_BASE_URL", "https://api.perplexity.ai")
 )
 
-def chat_with_memory(user_query: str):
-    memory.put(ChatMessage(role="user", content=user_query))
-    messages = memory.get()
-    
-    messages_dict = [
-        {"role": m.role, "content": m.content}
-        for m in messages
-    ]
-    
-    response = sonar_client.chat.completions.create(
-        model="sonar-pro",
-        messages=messages_dict,
-        temperature=0.3
-    )
-    
-    assistant_response = response.choices[0].message.content
-    memory.put(ChatMessage(
-        role="assistant",
-        content=assistant_response
-    ))
-    
+def chat_with_memory(user_query: str, session_id: str = "default"):
+    # The session lock is held for the whole turn so concurrent requests
+    # for the same conversation can't interleave their messages
+    with sessions.session(session_id) as memory:
+        memory.put(ChatMessage(role="user", content=user_query))
+        messages = memory.get()
+
+        messages_dict = [
+            {"role": m.role, "content": m.content}
+            for m in messages
+        ]
+
+        response = sonar_client.chat.completions.create(
+            model="sonar-pro",
+            messages=messages_dict,
+            temperature=0.3
+        )
+
+        assistant_response = response.choices[0].message.content
+        memory.put(ChatMessage(
+            role="assistant",
+            content=assistant_response
+        ))
+
     return assistant_response
@@ -1,6 +1,6 @@
 # example_usage.py
+import chat_memory_buffer
 from chat_memory_buffer import chat_with_memory
-import os
 
 
 def demonstrate_conversation():
@@ -18,12 +18,18 @@ def demonstrate_conversation():
     print("User: Save this conversation about the US stock market.")
     chat_with_memory("Save this conversation about the US stock market.")
     
-    # New session
+    # New session: simulate a process restart by dropping all in-memory state.
+    # The new manager restores the conversation from the SQLite log and snapshots.
+    chat_memory_buffer.sessions.close()
+    chat_memory_buffer.sessions = chat_memory_buffer.create_session_manager()
     print("\n--- New Session ---")
     print("User: What were we discussing earlier?")
     response = chat_with_memory("What were we discussing earlier?")
     print(f"Assistant: {response}")
 
+    # Make sure every queued write reaches disk before exiting
+    chat_memory_buffer.sessions.close()
+
 if __name__ == "__main__":
     demonstrate_conversation()
 
@@ -0,0 +1,231 @@
+import json
+import threading
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Deque, List, Optional, Tuple
+
+from llama_index.core.llms import LLM, ChatMessage, MessageRole
+from llama_index.core.utils import get_tokenizer
+
+DEFAULT_SUMMARIZE_PROMPT = (
+    "You maintain a running summary of a conversation between a user and an AI assistant. "
+    "Update the existing summary with the new conversation turns below. Keep names, numbers, "
+    "dates and open questions; drop pleasantries. Reply with the updated summary only."
+)
+
+# Shared by every memory instance so thousands of sessions don't spawn thousands of threads
+_SUMMARY_EXECUTOR = ThreadPoolExecutor(max_workers=4, thread_name_prefix="memory-summarizer")
+
+
+class IncrementalSummaryMemory:
+    """
+    Token-limited chat memory with a rolling summary.
+
+    Messages that fall out of the token window are folded into the existing summary by a
+    background worker instead of re-summarizing the whole history on the request path.
+    Token counts are computed once per message, so `get()` never re-tokenizes history.
+    """
+
+    def __init__(
+        self,
+        llm: LLM,
+        token_limit: int = 3000,
+        summarize_prompt: str = DEFAULT_SUMMARIZE_PROMPT,
+        tokenizer_fn: Optional[Callable[[str], List]] = None,
+        executor: Optional[ThreadPoolExecutor] = None,
+        on_put: Optional[Callable[[ChatMessage, int], None]] = None,
+        max_fallback_summary_tokens: Optional[int] = None,
+    ):
+        self.llm = llm
+        self.token_limit = token_limit
+        # If summarization fails, raw turns are kept as the summary, trimmed to this size
+        self.max_fallback_summary_tokens = max_fallback_summary_tokens or token_limit // 2
+        self.summarize_prompt = summarize_prompt
+        self._tokenizer_fn = tokenizer_fn or get_tokenizer()
+        self._executor = executor or _SUMMARY_EXECUTOR
+        # Called as on_put(message, seq) after every put, e.g. to append to a persistence log
+        self.on_put = on_put
+        self.message_count = 0
+
+        self._lock = threading.Lock()
+        self._system: List[Tuple[ChatMessage, int]] = []
+        self._recent: Deque[Tuple[ChatMessage, int]] = deque()
+        self._recent_tokens = 0
+        self._system_tokens = 0
+        self._summary = ""
+        self._summary_tokens = 0
+        self._pending: List[ChatMessage] = []
+        self._fold_future = None
+        # Bumped by reset(), so folds started before it don't restore the old conversation
+        self._generation = 0
+
+    def count_tokens(self, message: ChatMessage) -> int:
+        """Count tokens for a single message (role marker included)."""
+        return len(self._tokenizer_fn(f"{message.role.value}: {message.content or ''}"))
+
+    def put(self, message: ChatMessage) -> None:
+        """Add a message, evicting the oldest turns into the summary queue if over budget."""
+        tokens = self.count_tokens(message)
+        with self._lock:
+            if message.role == MessageRole.SYSTEM:
+                self._system.append((message, tokens))
+                self._system_tokens += tokens
+            else:
+                self._recent.append((message, tokens))
+                self._recent_tokens += tokens
+            self.message_count += 1
+            seq = self.message_count
+            self._evict_locked()
+        if self.on_put is not None:
+            self.on_put(message, seq)
+
+    def get(self) -> List[ChatMessage]:
+        """Return system prompt(s), the rolling summary and the recent message window."""
+        with self._lock:
+            messages = [m for m, _ in self._system]
+            if self._summary:
+                messages.append(ChatMessage(
+                    role=MessageRole.SYSTEM,
+                    content=f"Summary of the earlier conversation:\n{self._summary}"
+                ))
+            messages.extend(m for m, _ in self._recent)
+            return messages
+
+    @property
+    def summary(self) -> str:
+        return self._summary
+
+    @property
+    def is_summarizing(self) -> bool:
+        """True while evicted turns are queued or being folded into the summary."""
+        return self._fold_future is not None
+
+    def to_bytes(self) -> bytes:
+        """
+        Serialize the memory into a compact, compressed blob.
+
+        Cached token counts are stored alongside each message so restoring never re-tokenizes.
+        Call only while no summarization is in flight (see `is_summarizing`).
+        """
+        with self._lock:
+            state = {
+                "v": 1,
+                "n": self.message_count,
+                "sys": [[m.role.value, m.content, t] for m, t in self._system],
+                "msgs": [[m.role.value, m.content, t] for m, t in self._recent],
+                "sum": self._summary,
+                "sumtok": self._summary_tokens,
+                "pend": [[m.role.value, m.content] for m in self._pending],
+            }
+        return zlib.compress(json.dumps(state, separators=(",", ":")).encode("utf-8"))
+
+    @classmethod
+    def from_bytes(cls, blob: bytes, llm: LLM, **kwargs) -> "IncrementalSummaryMemory":
+        """Rebuild a memory from `to_bytes()` output."""
+        state = json.loads(zlib.decompress(blob))
+        memory = cls(llm=llm, **kwargs)
+        memory.message_count = state["n"]
+        memory._system = [(ChatMessage(role=r, content=c), t) for r, c, t in state["sys"]]
+        memory._system_tokens = sum(t for _, t in memory._system)
+        memory._recent = deque((ChatMessage(role=r, content=c), t) for r, c, t in state["msgs"])
+        memory._recent_tokens = sum(t for _, t in memory._recent)
+        memory._summary = state["sum"]
+        memory._summary_tokens = state["sumtok"]
+        memory._pending = [ChatMessage(role=r, content=c) for r, c in state["pend"]]
+        if memory._pending:
+            memory._fold_future = memory._executor.submit(memory._fold_pending)
+        return memory
+
+    def flush(self, timeout: Optional[float] = None) -> None:
+        """Block until all evicted turns have been folded into the summary."""
+        while True:
+            with self._lock:
+                future = self._fold_future
+            if future is None:
+                return
+            future.result(timeout=timeout)
+
+    def reset(self) -> None:
+        """Drop conversation history and summary, keeping system messages."""
+        with self._lock:
+            self._recent.clear()
+            self._recent_tokens = 0
+            self._summary = ""
+            self._summary_tokens = 0
+            self._pending = []
+            self._generation += 1
+
+    def _evict_locked(self) -> None:
+        budget = self.token_limit - self._system_tokens - self._summary_tokens
+        evicted = []
+        # Always keep the newest message, even if it alone exceeds the budget
+        while len(self._recent) > 1 and self._recent_tokens > budget:
+            evicted.append(self._pop_oldest_locked())
+        # Never start the window on an assistant/tool reply whose question was evicted
+        while evicted and len(self._recent) > 1 and self._recent[0][0].role != MessageRole.USER:
+            evicted.append(self._pop_oldest_locked())
+
+        if evicted:
+            self._pending.extend(evicted)
+            if self._fold_future is None:
+                self._fold_future = self._executor.submit(self._fold_pending)
+
+    def _pop_oldest_locked(self) -> ChatMessage:
+        message, tokens = self._recent.popleft()
+        self._recent_tokens -= tokens
+        return message
+
+    def _fold_pending(self) -> None:
+        """Background worker: fold queued turns into the summary until the queue is empty."""
+        batch: List[ChatMessage] = []
+        generation = self._generation
+        try:
+            while True:
+                with self._lock:
+                    batch, self._pending = self._pending, []
+                    previous = self._summary
+                    generation = self._generation
+                    if not batch:
+                        self._fold_future = None
+                        return
+
+                transcript = "\n".join(f"{m.role.value}: {m.content}" for m in batch)
+                prompt = [
+                    ChatMessage(role=MessageRole.SYSTEM, content=self.summarize_prompt),
+                    ChatMessage(
+                        role=MessageRole.USER,
+                        content=f"Existing summary:\n{previous or '(none)'}\n\nNew turns:\n{transcript}"
+                    ),
+                ]
+                try:
+                    summary = (self.llm.chat(prompt).message.content or "").strip()
+                except Exception:
+                    # Keep the raw turns in the summary rather than losing them, newest first
+                    summary = self._trim_to_tokens(f"{previous}\n{transcript}".strip(), self.max_fallback_summary_tokens)
+
+                summary_tokens = len(self._tokenizer_fn(summary))
+                with self._lock:
+                    if generation != self._generation:
+                        continue  # reset() ran while this batch was being summarized
+                    self._summary = summary
+                    self._summary_tokens = summary_tokens
+                    batch = []
+                    # A longer summary shrinks the window budget, which may evict more turns
+                    self._evict_locked()
+        except BaseException:
+            # E.g. the tokenizer failed: requeue the batch and let the next eviction start a
+            # new fold, instead of leaving is_summarizing/flush() stuck on this one
+            with self._lock:
+                if generation == self._generation:
+                    self._pending[:0] = batch
+                self._fold_future = None
+            raise
+
+    def _trim_to_tokens(self, text: str, max_tokens: int) -> str:
+        """Keep the end of `text`, cutting from the start until it fits in `max_tokens`."""
+        tokens = len(self._tokenizer_fn(text))
+        while tokens > max_tokens and text:
+            text = text[len(text) - len(text) * max_tokens // tokens:].lstrip()
+            tokens = len(self._tokenizer_fn(text))
+        return text
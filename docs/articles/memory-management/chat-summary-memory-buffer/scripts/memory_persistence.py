@@ -0,0 +1,317 @@
+import hashlib
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# A log entry is (seq, role, content); seq numbers a session's messages from 1
+LogEntry = Tuple[int, str, str]
+
+
+class MemoryBackend:
+    """
+    Storage interface for session memories: an append-only message log plus snapshots.
+
+    A snapshot is an `IncrementalSummaryMemory.to_bytes()` blob covering every message up to
+    its `seq`. Restoring a session loads the latest snapshot and replays only the log entries
+    written after it, so start-up cost doesn't grow with conversation length.
+    """
+
+    def write_batch(self, ops: List[tuple]) -> None:
+        """
+        Apply a batch of write operations in order. Each op is either
+        ("append", session_id, seq, role, content) or ("snapshot", session_id, seq, blob).
+        """
+        raise NotImplementedError
+
+    def load(self, session_id: str) -> Tuple[Optional[bytes], List[LogEntry]]:
+        """Return the latest snapshot blob (or None) and the log entries after it."""
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class SQLiteMemoryBackend(MemoryBackend):
+    """Stores all sessions in a single SQLite database in WAL mode."""
+
+    def __init__(self, path: str = "./chat_memory.db"):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS log (
+                session_id TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                role TEXT NOT NULL,
+                content TEXT,
+                PRIMARY KEY (session_id, seq)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS snapshots (
+                session_id TEXT PRIMARY KEY,
+                seq INTEGER NOT NULL,
+                blob BLOB NOT NULL
+            );
+        """)
+        self._conn.commit()
+
+    def write_batch(self, ops: List[tuple]) -> None:
+        with self._lock, self._conn:
+            for op in ops:
+                if op[0] == "append":
+                    _, session_id, seq, role, content = op
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO log VALUES (?, ?, ?, ?)",
+                        (session_id, seq, role, content),
+                    )
+                else:
+                    _, session_id, seq, blob = op
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO snapshots VALUES (?, ?, ?)",
+                        (session_id, seq, blob),
+                    )
+                    # The snapshot covers everything up to seq; the log only needs the tail
+                    self._conn.execute(
+                        "DELETE FROM log WHERE session_id = ? AND seq <= ?", (session_id, seq)
+                    )
+
+    def load(self, session_id: str) -> Tuple[Optional[bytes], List[LogEntry]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT seq, blob FROM snapshots WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            snap_seq, blob = row if row else (0, None)
+            tail = self._conn.execute(
+                "SELECT seq, role, content FROM log WHERE session_id = ? AND seq > ? ORDER BY seq",
+                (session_id, snap_seq),
+            ).fetchall()
+        return blob, tail
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class FileMemoryBackend(MemoryBackend):
+    """Stores each session as a JSON-lines log file plus a snapshot file in one directory."""
+
+    def __init__(self, directory: str = "./chat_memory"):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def write_batch(self, ops: List[tuple]) -> None:
+        pending_lines = {}
+        for op in ops:
+            session_id = op[1]
+            if op[0] == "append":
+                _, _, seq, role, content = op
+                pending_lines.setdefault(session_id, []).append(
+                    json.dumps([seq, role, content], separators=(",", ":")) + "\n"
+                )
+            else:
+                _, _, seq, blob = op
+                # Appends queued before the snapshot are covered by it
+                pending_lines.pop(session_id, None)
+                snap_path = self._path(session_id, ".snap")
+                tmp_path = snap_path.with_suffix(".snap.tmp")
+                tmp_path.write_bytes(f"{seq}\n".encode("ascii") + blob)
+                tmp_path.replace(snap_path)
+                # Everything logged so far is covered by the snapshot
+                self._path(session_id, ".log").unlink(missing_ok=True)
+        for session_id, lines in pending_lines.items():
+            self._append_lines(session_id, lines)
+
+    def load(self, session_id: str) -> Tuple[Optional[bytes], List[LogEntry]]:
+        snap_seq, blob = 0, None
+        snap_path = self._path(session_id, ".snap")
+        if snap_path.exists():
+            header, blob = snap_path.read_bytes().split(b"\n", 1)
+            snap_seq = int(header)
+
+        tail = []
+        log_path = self._path(session_id, ".log")
+        if log_path.exists():
+            with open(log_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        seq, role, content = json.loads(line)
+                    except ValueError:
+                        # A torn final line from a crash mid-write; everything before it is intact
+                        break
+                    if seq > snap_seq:
+                        tail.append((seq, role, content))
+        return blob, tail
+
+    def _append_lines(self, session_id: str, lines: List[str]) -> None:
+        if not lines:
+            return
+        with open(self._path(session_id, ".log"), "a+b") as f:
+            end = f.seek(0, os.SEEK_END)
+            if end:
+                f.seek(end - 1)
+                if f.read(1) != b"\n":
+                    # Drop a torn final line from a crash mid-write; appending after it would
+                    # glue the next record onto it and load() would skip everything from there
+                    f.truncate(self._last_line_end(f, end))
+            f.write("".join(lines).encode("utf-8"))
+
+    @staticmethod
+    def _last_line_end(f, end: int, chunk_size: int = 4096) -> int:
+        """Offset just past the last newline before `end`, or 0 if there is none."""
+        while end > 0:
+            start = max(0, end - chunk_size)
+            f.seek(start)
+            newline = f.read(end - start).rfind(b"\n")
+            if newline != -1:
+                return start + newline + 1
+            end = start
+        return 0
+
+    def _path(self, session_id: str, suffix: str) -> Path:
+        digest = hashlib.sha1(session_id.encode("utf-8")).hexdigest()
+        return self.directory / f"{digest}{suffix}"
+
+
+class PersistenceError(RuntimeError):
+    """Queued memory writes could not be persisted."""
+    pass
+
+
+class AsyncBatchWriter:
+    """
+    Moves backend writes off the request path.
+
+    Operations are queued and written by a single background thread in batches of up to
+    `batch_size`, or every `flush_interval` seconds, whichever comes first. A single writer
+    keeps each session's operations in order. A failed batch is retried `max_retries`
+    times; if it still fails it is logged and dropped, and the next `flush()` (or `load()`
+    of an affected session) raises `PersistenceError`.
+    """
+
+    def __init__(
+        self,
+        backend: MemoryBackend,
+        batch_size: int = 256,
+        flush_interval: float = 0.5,
+        max_retries: int = 3,
+        retry_delay: float = 0.1,
+    ):
+        self.backend = backend
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self._queue: "queue.Queue" = queue.Queue()
+        self._closed = False
+        # Queued-but-unwritten operations per session, so load() waits only for its own
+        self._cond = threading.Condition()
+        self._unwritten: Dict[str, int] = {}
+        self._failed_sessions: Set[str] = set()
+        self._failure: Optional[Exception] = None
+        self._thread = threading.Thread(target=self._run, name="memory-writer", daemon=True)
+        self._thread.start()
+
+    def append(self, session_id: str, seq: int, role: str, content: str) -> None:
+        self._put(("append", session_id, seq, role, content))
+
+    def snapshot(self, session_id: str, seq: int, blob: bytes) -> None:
+        self._put(("snapshot", session_id, seq, blob))
+
+    def _put(self, op: tuple) -> None:
+        with self._cond:
+            if self._closed:
+                raise PersistenceError("AsyncBatchWriter is closed")
+            self._unwritten[op[1]] = self._unwritten.get(op[1], 0) + 1
+            self._queue.put(op)
+
+    def load(self, session_id: str) -> Tuple[Optional[bytes], List[LogEntry]]:
+        """Load a session after making sure its own queued writes have reached the backend."""
+        with self._cond:
+            if self._unwritten.get(session_id):
+                # Write the current batch now instead of waiting for it to fill up
+                self._queue.put("wake")
+                self._cond.wait_for(lambda: not self._unwritten.get(session_id))
+            if session_id in self._failed_sessions:
+                self._failed_sessions.discard(session_id)
+                raise PersistenceError(f"Writes for session {session_id!r} were lost: {self._failure}")
+        return self.backend.load(session_id)
+
+    def flush(self) -> None:
+        """Block until everything queued so far has been written."""
+        if self._closed:
+            return
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait()
+        with self._cond:
+            failure, self._failure = self._failure, None
+        if failure is not None:
+            raise PersistenceError(f"Some memory writes were lost: {failure}") from failure
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        try:
+            self.flush()
+        finally:
+            with self._cond:
+                self._closed = True
+            self._queue.put(None)
+            self._thread.join()
+            self.backend.close()
+
+    def _write(self, batch: List[tuple]) -> None:
+        for attempt in range(self.max_retries + 1):
+            try:
+                self.backend.write_batch(batch)
+                error = None
+                break
+            except Exception as e:
+                error = e
+                if attempt < self.max_retries:
+                    time.sleep(self.retry_delay * 2 ** attempt)
+        if error is not None:
+            logger.error("Dropped %d memory operations after %d attempts: %s",
+                         len(batch), self.max_retries + 1, error)
+        with self._cond:
+            for op in batch:
+                remaining = self._unwritten[op[1]] - 1
+                if remaining:
+                    self._unwritten[op[1]] = remaining
+                else:
+                    del self._unwritten[op[1]]
+                if error is not None:
+                    self._failed_sessions.add(op[1])
+            if error is not None:
+                self._failure = error
+            self._cond.notify_all()
+
+    def _run(self) -> None:
+        batch = []
+        while True:
+            try:
+                item = self._queue.get(timeout=self.flush_interval if batch else None)
+            except queue.Empty:
+                item = "timeout"
+
+            if isinstance(item, tuple):
+                batch.append(item)
+                if len(batch) < self.batch_size:
+                    continue
+
+            if batch:
+                self._write(batch)
+                batch = []
+
+            if isinstance(item, threading.Event):
+                item.set()
+            elif item is None:
+                return
@@ -0,0 +1,219 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, Optional
+
+from llama_index.core.llms import LLM, ChatMessage
+
+from incremental_summary_memory import IncrementalSummaryMemory
+from memory_persistence import AsyncBatchWriter, MemoryBackend
+
+
+class _Session:
+    """An active session: its memory plus the lock serializing its requests."""
+
+    __slots__ = ("memory", "lock", "evicted", "snapshot_seq")
+
+    def __init__(self, memory: IncrementalSummaryMemory):
+        self.memory = memory
+        self.lock = threading.Lock()
+        self.evicted = False
+        self.snapshot_seq = memory.message_count
+
+
+class SessionMemoryManager:
+    """
+    Session-keyed memory store for many concurrent conversations.
+
+    Each session gets its own `IncrementalSummaryMemory` and lock, so requests for different
+    sessions never block each other. At most `max_active_sessions` memories are kept in
+    process; the least recently used idle sessions are spilled to `spill_dir` as compressed
+    blobs and rehydrated transparently on their next request.
+
+    With a `backend` (see `memory_persistence.py`), every message is also appended to a
+    durable log and a snapshot is taken every `snapshot_every` messages, so sessions survive
+    process restarts. Writes go through a background batch writer, and evicted sessions are
+    snapshotted to the backend instead of `spill_dir`.
+    """
+
+    def __init__(
+        self,
+        llm: LLM,
+        system_prompt: Optional[str] = None,
+        token_limit: int = 3000,
+        max_active_sessions: int = 1000,
+        spill_dir: str = "./memory_sessions",
+        backend: Optional[MemoryBackend] = None,
+        snapshot_every: int = 20,
+    ):
+        self.llm = llm
+        self.system_prompt = system_prompt
+        self.token_limit = token_limit
+        self.max_active_sessions = max_active_sessions
+        self.spill_dir = Path(spill_dir)
+        self.snapshot_every = snapshot_every
+        self._writer = AsyncBatchWriter(backend) if backend is not None else None
+        if self._writer is None:
+            self.spill_dir.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._active: "OrderedDict[str, _Session]" = OrderedDict()
+        # Blobs evicted from memory whose disk write hasn't finished yet
+        self._spilling: Dict[str, bytes] = {}
+
+    @contextmanager
+    def session(self, session_id: str) -> Iterator[IncrementalSummaryMemory]:
+        """Hold the session's lock and yield its memory for one request."""
+        while True:
+            entry = self._get_entry(session_id)
+            entry.lock.acquire()
+            if not entry.evicted:
+                break
+            # Spilled between lookup and lock acquisition; look it up again
+            entry.lock.release()
+        try:
+            yield entry.memory
+        finally:
+            entry.lock.release()
+        self._evict_overflow()
+
+    def active_sessions(self) -> int:
+        return len(self._active)
+
+    def flush_all(self) -> None:
+        """Wait for background summaries and spill every session to disk (e.g. at shutdown)."""
+        with self._lock:
+            session_ids = list(self._active)
+        for session_id in session_ids:
+            with self._lock:
+                entry = self._active.get(session_id)
+            if entry is None:
+                continue
+            with entry.lock:
+                entry.memory.flush()
+                self._spill(session_id, entry)
+
+    def close(self) -> None:
+        """Spill every session and wait for all pending backend writes."""
+        self.flush_all()
+        if self._writer is not None:
+            self._writer.close()
+
+    def _get_entry(self, session_id: str) -> _Session:
+        with self._lock:
+            entry = self._active.get(session_id)
+            if entry is not None:
+                self._active.move_to_end(session_id)
+                return entry
+            blob = self._spilling.get(session_id)
+
+        # Load outside the manager lock so a cold session doesn't stall the others
+        path = self._spill_path(session_id)
+        if self._writer is not None:
+            memory = self._restore(session_id)
+        elif blob is not None or path.exists():
+            memory = IncrementalSummaryMemory.from_bytes(
+                blob if blob is not None else path.read_bytes(),
+                llm=self.llm,
+                token_limit=self.token_limit,
+            )
+        else:
+            memory = self._new_memory()
+        entry = _Session(memory)
+        if self._writer is not None:
+            memory.on_put = lambda message, seq: self._on_put(session_id, entry, message, seq)
+
+        with self._lock:
+            existing = self._active.get(session_id)
+            if existing is not None:
+                # Another request loaded the same session first
+                return existing
+            self._spilling.pop(session_id, None)
+            path.unlink(missing_ok=True)
+            self._active[session_id] = entry
+        return entry
+
+    def _restore(self, session_id: str) -> IncrementalSummaryMemory:
+        """Rebuild a session from its latest snapshot plus the log entries written after it."""
+        blob, tail = self._writer.load(session_id)
+        if blob is not None:
+            memory = IncrementalSummaryMemory.from_bytes(
+                blob, llm=self.llm, token_limit=self.token_limit
+            )
+        else:
+            memory = self._new_memory()
+        for seq, role, content in tail:
+            memory.put(ChatMessage(role=role, content=content))
+            memory.message_count = seq
+        return memory
+
+    def _on_put(self, session_id: str, entry: _Session, message: ChatMessage, seq: int) -> None:
+        self._writer.append(session_id, seq, message.role.value, message.content)
+        # Snapshots bound how much log a restore has to replay; skip while a fold is in flight
+        # because its turns are in neither the window nor the summary yet
+        if seq - entry.snapshot_seq >= self.snapshot_every and not entry.memory.is_summarizing:
+            self._writer.snapshot(session_id, seq, entry.memory.to_bytes())
+            entry.snapshot_seq = seq
+
+    def _new_memory(self) -> IncrementalSummaryMemory:
+        memory = IncrementalSummaryMemory(llm=self.llm, token_limit=self.token_limit)
+        if self.system_prompt:
+            memory.put(ChatMessage(role="system", content=self.system_prompt))
+        return memory
+
+    def _evict_overflow(self) -> None:
+        """Spill least recently used idle sessions until under `max_active_sessions`."""
+        while True:
+            with self._lock:
+                if len(self._active) <= self.max_active_sessions:
+                    return
+                victim = None
+                for session_id, entry in self._active.items():
+                    # Skip sessions serving a request or still summarizing in the background
+                    if entry.memory.is_summarizing or not entry.lock.acquire(blocking=False):
+                        continue
+                    victim = session_id, entry
+                    break
+                if victim is None:
+                    return
+            try:
+                self._spill(*victim)
+            finally:
+                victim[1].lock.release()
+
+    def _spill(self, session_id: str, entry: _Session) -> None:
+        """Serialize and write one session to disk; caller holds `entry.lock`."""
+        if self._writer is not None:
+            # The log already holds every message; a snapshot just makes the restore cheap
+            if entry.memory.message_count > entry.snapshot_seq:
+                self._writer.snapshot(
+                    session_id, entry.memory.message_count, entry.memory.to_bytes()
+                )
+            with self._lock:
+                entry.evicted = True
+                self._active.pop(session_id, None)
+            return
+
+        blob = entry.memory.to_bytes()
+        with self._lock:
+            entry.evicted = True
+            self._active.pop(session_id, None)
+            self._spilling[session_id] = blob
+
+        path = self._spill_path(session_id)
+        tmp_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+        tmp_path.write_bytes(blob)
+
+        with self._lock:
+            if self._spilling.get(session_id) is blob:
+                tmp_path.replace(path)
+                del self._spilling[session_id]
+            else:
+                # Rehydrated from `_spilling` while we were writing; the file would be stale
+                tmp_path.unlink(missing_ok=True)
+
+    def _spill_path(self, session_id: str) -> Path:
+        digest = hashlib.sha1(session_id.encode("utf-8")).hexdigest()
+        return self.spill_dir / f"{digest}.session"
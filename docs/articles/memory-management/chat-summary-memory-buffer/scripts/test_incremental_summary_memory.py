@@ -0,0 +1,70 @@
+"""Tests for IncrementalSummaryMemory. Run with: python -m pytest test_incremental_summary_memory.py"""
+
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import pytest
+from llama_index.core.llms import ChatMessage, MessageRole
+
+from incremental_summary_memory import IncrementalSummaryMemory
+
+
+class FakeLLM:
+    def chat(self, messages):
+        return SimpleNamespace(message=SimpleNamespace(content="SUMMARY " + messages[-1].content.split()[-1]))
+
+
+class Tokenizer:
+    """Whitespace tokenizer that can be told to fail on summaries."""
+
+    def __init__(self):
+        self.fail_on_summary = False
+
+    def __call__(self, text):
+        if self.fail_on_summary and text.startswith("SUMMARY"):
+            raise RuntimeError("tokenizer failed")
+        return text.split()
+
+
+@pytest.fixture
+def executor():
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        yield executor
+
+
+def make_memory(executor, tokenizer):
+    return IncrementalSummaryMemory(FakeLLM(), token_limit=6, tokenizer_fn=tokenizer, executor=executor)
+
+
+def user(text):
+    return ChatMessage(role=MessageRole.USER, content=text)
+
+
+def test_evicted_turns_are_folded_into_the_summary(executor):
+    memory = make_memory(executor, Tokenizer())
+    for word in ("one", "two", "three", "four"):
+        memory.put(user(word))
+    memory.flush(timeout=5)
+    assert not memory.is_summarizing
+    assert memory.summary.startswith("SUMMARY")
+    assert memory.get()[-1].content == "four"
+
+
+def test_failed_fold_is_cleared_and_its_turns_are_kept(executor):
+    tokenizer = Tokenizer()
+    memory = make_memory(executor, tokenizer)
+    tokenizer.fail_on_summary = True
+    for word in ("one", "two", "three", "four"):
+        memory.put(user(word))
+    with pytest.raises(RuntimeError, match="tokenizer failed"):
+        memory.flush(timeout=5)
+    assert not memory.is_summarizing
+    assert [m.content for m in memory._pending][:1] == ["one"]
+
+    # The next eviction starts a new fold, which picks up the requeued turns
+    tokenizer.fail_on_summary = False
+    memory.put(user("five"))
+    memory.flush(timeout=5)
+    assert not memory.is_summarizing
+    assert memory._pending == []
+    assert memory.summary.startswith("SUMMARY")
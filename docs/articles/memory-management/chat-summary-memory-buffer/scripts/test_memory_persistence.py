@@ -0,0 +1,67 @@
+"""Tests for the memory persistence backends. Run with: python -m pytest test_memory_persistence.py"""
+
+import pytest
+
+from memory_persistence import AsyncBatchWriter, FileMemoryBackend, SQLiteMemoryBackend
+
+
+@pytest.fixture(params=["sqlite", "file"])
+def backend(request, tmp_path):
+    if request.param == "sqlite":
+        backend = SQLiteMemoryBackend(str(tmp_path / "memory.db"))
+    else:
+        backend = FileMemoryBackend(str(tmp_path / "memory"))
+    yield backend
+    backend.close()
+
+
+def test_log_round_trip(backend):
+    backend.write_batch([
+        ("append", "alice", 1, "user", "hi"),
+        ("append", "bob", 1, "user", "hello"),
+        ("append", "alice", 2, "assistant", "héllo, \"alice\"\nwelcome"),
+    ])
+    assert backend.load("alice") == (None, [(1, "user", "hi"), (2, "assistant", "héllo, \"alice\"\nwelcome")])
+    assert backend.load("bob") == (None, [(1, "user", "hello")])
+    assert backend.load("carol") == (None, [])
+
+
+def test_snapshot_replaces_the_log_it_covers(backend):
+    backend.write_batch([
+        ("append", "alice", 1, "user", "one"),
+        ("append", "alice", 2, "assistant", "two"),
+        ("snapshot", "alice", 2, b"\x00blob\nbytes"),
+        ("append", "alice", 3, "user", "three"),
+    ])
+    assert backend.load("alice") == (b"\x00blob\nbytes", [(3, "user", "three")])
+
+
+def test_writer_load_sees_its_queued_writes(backend):
+    writer = AsyncBatchWriter(backend, flush_interval=60.0)
+    try:
+        writer.append("alice", 1, "user", "hi")
+        assert writer.load("alice") == (None, [(1, "user", "hi")])
+    finally:
+        writer.close()
+
+
+def test_torn_final_line_is_dropped_before_the_next_append(tmp_path):
+    backend = FileMemoryBackend(str(tmp_path))
+    backend.write_batch([("append", "alice", 1, "user", "one"), ("append", "alice", 2, "user", "two")])
+    log_path = backend._path("alice", ".log")
+    # Simulate a crash halfway through writing the third record
+    with open(log_path, "ab") as f:
+        f.write(b'[3,"user","thr')
+    assert backend.load("alice")[1] == [(1, "user", "one"), (2, "user", "two")]
+
+    backend.write_batch([("append", "alice", 3, "user", "three"), ("append", "alice", 4, "user", "four")])
+    assert backend.load("alice")[1] == [
+        (1, "user", "one"), (2, "user", "two"), (3, "user", "three"), (4, "user", "four"),
+    ]
+
+
+def test_log_that_is_one_torn_line_is_emptied(tmp_path):
+    backend = FileMemoryBackend(str(tmp_path))
+    backend._path("alice", ".log").write_bytes(b"x" * 10_000)
+    backend.write_batch([("append", "alice", 1, "user", "one")])
+    assert backend.load("alice")[1] == [(1, "user", "one")]
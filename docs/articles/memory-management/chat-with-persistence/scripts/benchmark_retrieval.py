@@ -0,0 +1,130 @@
+# benchmark_retrieval.py
+"""
+Compare brute-force and IVF-PQ retrieval latency on a large chat_history-style table.
+
+Builds a throwaway LanceDB table with `--rows` 768-dim turns (1M by default), times top-3
+searches before and after LanceTableMaintainer builds the vector index, and checks the
+indexed search's recall against the exact results. The run fails when recall@3 is below
+`--min-recall`.
+
+Like real conversation embeddings, the synthetic turns cluster around topics (about 50
+turns per topic), and each query is a new turn on one of the stored topics. `--uniform`
+draws turns and queries uniformly from the unit sphere instead; there the true nearest
+neighbours are barely closer than any other row, which is the worst case for IVF-PQ.
+
+Usage:
+  python benchmark_retrieval.py --rows 1000000 --queries 200
+"""
+
+import argparse
+import statistics
+import sys
+import tempfile
+import time
+
+import lancedb
+import numpy as np
+import pyarrow as pa
+
+from lance_maintenance import SEARCH_NPROBES, SEARCH_REFINE_FACTOR, LanceTableMaintainer
+
+DIM = 768
+TURNS_PER_TOPIC = 50
+
+
+def random_vectors(rng: np.random.Generator, size: int, topics) -> np.ndarray:
+    """Unit vectors; near a random topic centre when `topics` is given, else uniform."""
+    vectors = rng.standard_normal((size, DIM), dtype=np.float32)
+    if topics is not None:
+        # Unit-norm noise around a unit centre: two turns on one topic have cosine ~0.5
+        vectors = topics[rng.integers(0, len(topics), size)] + vectors / np.sqrt(DIM)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def random_batch(rng: np.random.Generator, start: int, size: int, topics=None) -> pa.Table:
+    vectors = random_vectors(rng, size, topics)
+    return pa.table({
+        "id": pa.array([f"turn-{i}" for i in range(start, start + size)]),
+        "text": pa.array([f"stored chat turn {i}" for i in range(start, start + size)]),
+        "vector": pa.FixedSizeListArray.from_arrays(pa.array(vectors.ravel()), DIM),
+    })
+
+
+def time_queries(table, queries: np.ndarray, **search_options) -> tuple:
+    latencies, results = [], []
+    for query in queries:
+        start = time.perf_counter()
+        search = table.search(query).metric("cosine").limit(3)
+        if search_options:
+            search = search.nprobes(search_options["nprobes"]).refine_factor(search_options["refine_factor"])
+        hits = search.to_list()
+        latencies.append((time.perf_counter() - start) * 1000)
+        results.append({hit["id"] for hit in hits})
+    latencies.sort()
+    return latencies, results
+
+
+def report(label: str, latencies: list) -> None:
+    print(f"{label:<24} mean {statistics.fmean(latencies):8.2f} ms   "
+          f"p50 {latencies[len(latencies) // 2]:8.2f} ms   "
+          f"p99 {latencies[int(len(latencies) * 0.99)]:8.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark chat_history retrieval latency")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--batch-size", type=int, default=100_000)
+    parser.add_argument("--min-recall", type=float, default=0.9,
+                        help="Fail when the indexed search's recall@3 is below this (default: 0.9)")
+    parser.add_argument("--uniform", action="store_true",
+                        help="Uniformly random vectors instead of topic clusters (worst case for IVF-PQ)")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    topics = None if args.uniform else random_vectors(rng, max(1, args.rows // TURNS_PER_TOPIC), None)
+    with tempfile.TemporaryDirectory() as uri:
+        db = lancedb.connect(uri)
+        maintainer = LanceTableMaintainer(db, table_name="chat_history", index_threshold=0)
+
+        start = time.perf_counter()
+        table = db.create_table("chat_history", random_batch(rng, 0, min(args.batch_size, args.rows), topics))
+        for offset in range(args.batch_size, args.rows, args.batch_size):
+            table.add(random_batch(rng, offset, min(args.batch_size, args.rows - offset), topics))
+        print(f"Loaded {table.count_rows():,} rows in {time.perf_counter() - start:.1f}s")
+
+        start = time.perf_counter()
+        maintainer.compact(table)
+        print(f"Compacted in {time.perf_counter() - start:.1f}s")
+
+        queries = random_vectors(rng, args.queries, topics)
+        brute_latencies, exact = time_queries(table, queries)
+        report("brute force", brute_latencies)
+
+        start = time.perf_counter()
+        maintainer.build_index(table)
+        print(f"Built IVF-PQ index in {time.perf_counter() - start:.1f}s")
+
+        table = db.open_table("chat_history")
+        ann_latencies, approx = time_queries(
+            table, queries, nprobes=SEARCH_NPROBES, refine_factor=SEARCH_REFINE_FACTOR
+        )
+        report(f"IVF-PQ (nprobes={SEARCH_NPROBES})", ann_latencies)
+
+        recall = statistics.fmean(len(a & e) / len(e) for a, e in zip(approx, exact))
+        print(f"Recall@3 vs brute force: {recall:.3f}")
+        if recall < args.min_recall:
+            print(
+                f"FAIL: recall@3 {recall:.3f} is below --min-recall {args.min_recall}. "
+                f"Indexed search (nprobes={SEARCH_NPROBES}, refine_factor={SEARCH_REFINE_FACTOR}) "
+                "misses too many of the exact top-3 turns; tune the index or search settings "
+                "in lance_maintenance.py",
+                file=sys.stderr,
+            )
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
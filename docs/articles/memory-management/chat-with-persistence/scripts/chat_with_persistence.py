@@ -1,4 +1,4 @@
-from llama_index.core import VectorStoreIndex, StorageContext, Document
+from llama_index.core import VectorStoreIndex, StorageContext
 from llama_index.core.node_parser import SentenceSplitter
 from llama_index.vector_stores.lancedb import LanceDBVectorStore
 from openai import OpenAI as PerplexityClient
@@ -6,30 +6,71 @@ from llama_index.core.vector_stores import MetadataFilters, MetadataFilter, Filt
 import lancedb
 import pyarrow as pa
 import os
-from datetime import datetime
+import weakref
+from datetime import datetime, timedelta
+from typing import Optional
+
+from local_embeddings import LocalEmbedding
+from context_packer import ContextPacker
+from hybrid_retriever import CrossEncoderReranker, SessionKeywordIndex, load_session_nodes
+from lance_maintenance import SEARCH_NPROBES, SEARCH_REFINE_FACTOR, LanceTableMaintainer, open_or_create_table
+from persistence_engine import ChatPersistenceEngine
 
 # Initialize Perplexity Sonar client
 sonar_client = PerplexityClient(
     api_key=os.environ["PERPLEXITY_API_KEY"],
-    base_url="https://api.perplexity.ai"
+    base_url=os.getenv("PERPLEXITY_BASE_URL", "https://api.perplexity.ai")
 )
 
-# Define explicit schema matching metadata structure
+# Define explicit schema matching the layout LanceDBVectorStore writes
+EMBEDDING_DIM = 768
 schema = pa.schema([
     pa.field("id", pa.string()),
+    pa.field("doc_id", pa.string()),
+    pa.field("vector", pa.list_(pa.float32(), EMBEDDING_DIM)),  # Match your embedding dimension
     pa.field("text", pa.string()),
-    pa.field("metadata", pa.map_(pa.string(), pa.string())),  # Store metadata as key-value map
-    pa.field("embedding", pa.list_(pa.float32(), 768))  # Match your embedding dimension
+    pa.field("metadata", pa.struct([
+        pa.field("role", pa.string()),
+        pa.field("session_id", pa.string()),
+        pa.field("timestamp", pa.string()),
+        # Node bookkeeping fields added by LlamaIndex
+        pa.field("_node_content", pa.string()),
+        pa.field("_node_type", pa.string()),
+        pa.field("document_id", pa.string()),
+        pa.field("doc_id", pa.string()),
+        pa.field("ref_doc_id", pa.string()),
+    ])),
 ])
 
-# Initialize persistent vector store with clean slate
+# Local CPU embeddings: no network round trip per turn, cached by content hash.
+# Set LOCAL_EMBEDDING_MODEL to a local sentence-transformers model directory (768-dim,
+# e.g. all-mpnet-base-v2) for semantic embeddings; otherwise a hashing vectorizer is used.
+embed_model = LocalEmbedding(
+    dim=EMBEDDING_DIM,
+    model_path=os.getenv("LOCAL_EMBEDDING_MODEL"),
+    embed_batch_size=64
+)
+
+# Warm start: open the existing history (validated against the schema) instead of wiping it.
+# Opening reads only the table manifest, so start-up time doesn't grow with history size.
 lancedb_uri = "./lancedb"
-if os.path.exists(lancedb_uri):
-    import shutil
-    shutil.rmtree(lancedb_uri)
-    
 db = lancedb.connect(lancedb_uri)
-vector_store = LanceDBVectorStore(uri=lancedb_uri, table_name="chat_history")
+if os.getenv("CHAT_STORE_RESET") == "1" and "chat_history" in db.table_names():
+    db.drop_table("chat_history")
+chat_table = open_or_create_table(db, "chat_history", schema)
+
+# Compacts and indexes the table after background flushes; on start-up it only
+# builds indexes that are missing
+maintainer = LanceTableMaintainer(db, table_name="chat_history", index_threshold=100_000)
+maintainer.ensure_indexes(chat_table)
+
+# nprobes/refine_factor only apply once the IVF-PQ index exists (see LanceTableMaintainer)
+vector_store = LanceDBVectorStore(
+    uri=lancedb_uri,
+    table=chat_table,
+    nprobes=SEARCH_NPROBES,
+    refine_factor=SEARCH_REFINE_FACTOR
+)
 storage_context = StorageContext.from_defaults(vector_store=vector_store)
 
 # Configure node parser with metadata support
@@ -39,35 +80,91 @@ node_parser = SentenceSplitter(
     include_metadata=True
 )
 
+# BM25 over each session's stored turns, fused with the vector search. Partitions are
+# loaded from the table on a session's first query and then updated on every flush
+keyword_index = SessionKeywordIndex(loader=lambda session_id: load_session_nodes(chat_table, session_id))
+
+# Optional local cross-encoder (e.g. cross-encoder/ms-marco-MiniLM-L-6-v2) to rerank fused results
+reranker = CrossEncoderReranker(os.environ["LOCAL_RERANKER_MODEL"]) if os.getenv("LOCAL_RERANKER_MODEL") else None
+
+# Deduplicates, ranks (relevance + recency) and packs history into a fixed token budget
+context_packer = ContextPacker(token_budget=int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500")))
+
+# Every session index is over the same table, so they share one long-lived persistence
+# engine (retriever + batched writer) and its WAL in ./chat_store; created on first use
+_engine: Optional[ChatPersistenceEngine] = None
+_engines: "weakref.WeakKeyDictionary[VectorStoreIndex, ChatPersistenceEngine]" = weakref.WeakKeyDictionary()
+
 def initialize_chat_session():
     """Create new session with proper schema"""
-    return VectorStoreIndex(
+    global _engine
+    index = VectorStoreIndex(
         [],
         storage_context=storage_context,
-        node_parser=node_parser
+        node_parser=node_parser,
+        embed_model=embed_model
     )
+    if _engine is None:
+        _engine = _create_engine(index)
+    _engines[index] = _engine
+    return index
 
-def chat_with_persistence(user_query: str, index: VectorStoreIndex):
-    # Store user query
-    user_doc = Document(
-        text=user_query,
-        metadata={
-            "role": "user",
-            "timestamp": datetime.now().isoformat()
-        }
+def _create_engine(index: VectorStoreIndex) -> ChatPersistenceEngine:
+    return ChatPersistenceEngine(
+        index,
+        storage_context=storage_context,
+        node_parser=node_parser,
+        embed_model=embed_model,
+        persist_dir="./chat_store",
+        similarity_top_k=3,
+        flush_every_turns=8,
+        flush_interval=5.0,
+        maintainer=maintainer,
+        keyword_index=keyword_index,
+        reranker=reranker,
+        candidate_k=10
     )
-    index.insert_nodes(node_parser.get_nodes_from_documents([user_doc]))
-    
-    # Retrieve context nodes
-    retriever = index.as_retriever(similarity_top_k=3)
-    context_nodes = retriever.retrieve(user_query)
-    
-    # Ensure context relevance by filtering for recent queries
-    context_text = "\n".join([
-        f"{n.metadata['role'].title()}: {n.text}" 
-        for n in context_nodes if n.metadata["role"] == "user"
-    ])
-    
+
+def history_filters(session_id: str, history_window: Optional[timedelta] = None) -> MetadataFilters:
+    """Restrict retrieval to this session's user turns, optionally within a recent time window"""
+    filters = [
+        MetadataFilter(key="session_id", value=session_id, operator=FilterOperator.EQ),
+        MetadataFilter(key="role", value="user", operator=FilterOperator.EQ),
+    ]
+    if history_window is not None:
+        # ISO-8601 timestamps compare correctly as strings
+        cutoff = (datetime.now() - history_window).isoformat()
+        filters.append(MetadataFilter(key="timestamp", value=cutoff, operator=FilterOperator.GTE))
+    return MetadataFilters(filters=filters)
+
+def chat_with_persistence(
+    user_query: str,
+    index: VectorStoreIndex,
+    session_id: str = "default",
+    history_window: Optional[timedelta] = None
+):
+    engine = _engines[index]
+
+    # Retrieve context nodes before storing the query, so it can't match itself.
+    # The session/role/time filters are pushed down into the LanceDB search, and
+    # BM25 matches exact terms (city names, tickers) that embeddings can miss
+    context_nodes = engine.retrieve(user_query, filters=history_filters(session_id, history_window))
+
+    # Turns still buffered in the engine aren't searchable yet, but they're the most recent ones
+    recent_turns = [
+        turn
+        for turn in engine.pending_turns()
+        if turn["metadata"]["session_id"] == session_id and turn["metadata"]["role"] == "user"
+    ]
+    context_text = context_packer.pack(context_nodes, recent_turns)
+
+    # Store user query (inserted and persisted in the background in batches)
+    engine.record(user_query, {
+        "role": "user",
+        "session_id": session_id,
+        "timestamp": datetime.now().isoformat()
+    })
+
     # Generate Sonar API request
     messages = [
         {
@@ -76,30 +173,24 @@ def chat_with_persistence(user_query: str, index: VectorStoreIndex):
         },
         {"role": "user", "content": user_query}
     ]
-    
+
     response = sonar_client.chat.completions.create(
         model="sonar-pro",
         messages=messages,
         temperature=0.3
     )
-    
+
     assistant_response = response.choices[0].message.content
-    
+
     # Store assistant response
-    assistant_doc = Document(
-        text=assistant_response,
-        metadata={
-            "role": "assistant",
-            "timestamp": datetime.now().isoformat()
-        }
-    )
-    index.insert_nodes(node_parser.get_nodes_from_documents([assistant_doc]))
-    
-    # Persist conversation state
-    storage_context.persist(persist_dir="./chat_store")
+    engine.record(assistant_response, {
+        "role": "assistant",
+        "session_id": session_id,
+        "timestamp": datetime.now().isoformat()
+    })
     return assistant_response
 
-# Usage
-index = initialize_chat_session()
-print("Response:", chat_with_persistence("What's the current weather in London?", index))
-print("Follow-up:", chat_with_persistence("What about tomorrow's forecast?", index))
+if __name__ == "__main__":
+    index = initialize_chat_session()
+    print("Response:", chat_with_persistence("What's the current weather in London?", index))
+    print("Follow-up:", chat_with_persistence("What about tomorrow's forecast?", index))
@@ -0,0 +1,122 @@
+import re
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Sequence
+
+from llama_index.core.schema import NodeWithScore
+from llama_index.core.utils import get_tokenizer
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+class ContextPacker:
+    """
+    Builds the conversation-history block of the prompt within a token budget.
+
+    Candidates are retrieved nodes plus turns that are recorded but not yet searchable.
+    They're deduplicated (the splitter's chunk overlap and repeated questions produce
+    near-identical texts), ranked by a mix of retrieval relevance and recency, and added
+    greedily, best first, while they fit in `token_budget`. The selected turns are emitted
+    in chronological order so the model reads them as a conversation.
+
+    Token counts come from the cached tiktoken encoder and are memoized per text, so
+    re-packing the same history across turns doesn't re-tokenize it.
+    """
+
+    def __init__(
+        self,
+        token_budget: int = 1500,
+        recency_weight: float = 0.3,
+        recency_half_life: timedelta = timedelta(hours=6),
+        duplicate_threshold: float = 0.6,
+        shingle_size: int = 3,
+        tokenizer_fn: Optional[Callable[[str], List]] = None,
+        cache_size: int = 10_000,
+    ):
+        self.token_budget = token_budget
+        self.recency_weight = recency_weight
+        self.recency_half_life = recency_half_life
+        self.duplicate_threshold = duplicate_threshold
+        self.shingle_size = shingle_size
+        tokenizer_fn = tokenizer_fn or get_tokenizer()
+        self.count_tokens = lru_cache(maxsize=cache_size)(lambda text: len(tokenizer_fn(text)))
+
+    def pack(self, nodes: Sequence[NodeWithScore], recent_turns: Sequence[Dict] = ()) -> str:
+        """
+        Return history lines ("Role: text") that fit the token budget.
+
+        `recent_turns` are unflushed turns ({"text", "metadata"} dicts); they're the most
+        recent context, so they rank with full relevance.
+        """
+        candidates = [
+            {"text": n.node.get_content(), "metadata": n.node.metadata, "score": n.score or 0.0}
+            for n in nodes
+        ]
+        top_score = max((c["score"] for c in candidates), default=1.0)
+        candidates += [
+            {"text": t["text"], "metadata": t["metadata"], "score": top_score}
+            for t in recent_turns
+        ]
+        if not candidates:
+            return ""
+
+        ranked = sorted(candidates, key=self._rank_key(candidates), reverse=True)
+
+        selected, shingle_sets, used = [], [], 0
+        for c in ranked:
+            shingles = self._shingles(c["text"])
+            if any(self._overlap(shingles, other) >= self.duplicate_threshold for other in shingle_sets):
+                continue
+            line = f"{c['metadata'].get('role', 'user').title()}: {c['text']}"
+            tokens = self.count_tokens(line) + 1  # + newline
+            if used + tokens > self.token_budget:
+                # A shorter, lower-ranked turn may still fit
+                continue
+            used += tokens
+            selected.append((c["metadata"].get("timestamp") or "", line))
+            shingle_sets.append(shingles)
+
+        # ISO-8601 timestamps sort chronologically as strings
+        selected.sort(key=lambda item: item[0])
+        return "\n".join(line for _, line in selected)
+
+    def _rank_key(self, candidates: List[Dict]) -> Callable[[Dict], float]:
+        scores = [c["score"] for c in candidates]
+        low, high = min(scores), max(scores)
+        times = {id(c): self._parse_time(c["metadata"].get("timestamp")) for c in candidates}
+        newest = max((t for t in times.values() if t is not None), default=None)
+        half_life = self.recency_half_life.total_seconds()
+
+        def key(c: Dict) -> float:
+            # Scores are min-max normalized: RRF, cosine and reranker scores have different scales
+            relevance = (c["score"] - low) / (high - low) if high > low else 1.0
+            timestamp = times[id(c)]
+            recency = 0.0
+            if timestamp is not None:
+                recency = 0.5 ** ((newest - timestamp).total_seconds() / half_life)
+            return (1 - self.recency_weight) * relevance + self.recency_weight * recency
+
+        return key
+
+    def _shingles(self, text: str) -> frozenset:
+        words = _WORD_RE.findall(text.lower())
+        n = self.shingle_size
+        if len(words) < n:
+            return frozenset([" ".join(words)])
+        return frozenset(" ".join(words[i:i + n]) for i in range(len(words) - n + 1))
+
+    @staticmethod
+    def _overlap(a: frozenset, b: frozenset) -> float:
+        # Containment rather than Jaccard: an overlapping chunk fully inside a longer one is a duplicate
+        if not a or not b:
+            return 0.0
+        return len(a & b) / min(len(a), len(b))
+
+    @staticmethod
+    def _parse_time(value: Optional[str]) -> Optional[datetime]:
+        if not value:
+            return None
+        try:
+            return datetime.fromisoformat(value)
+        except ValueError:
+            return None
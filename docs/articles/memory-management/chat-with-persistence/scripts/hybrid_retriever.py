@@ -0,0 +1,238 @@
+import heapq
+import math
+import re
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Optional, Sequence
+
+from llama_index.core.schema import NodeWithScore, TextNode
+from llama_index.core.vector_stores import FilterOperator, MetadataFilters
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+# Metadata stored with each chat turn; node bookkeeping fields are left out of keyword results
+CHAT_METADATA_KEYS = ("role", "session_id", "timestamp")
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(text.lower())
+
+
+class BM25Index:
+    """
+    In-memory inverted index with Okapi BM25 scoring.
+
+    Documents are added incrementally: each insert only updates the posting lists of its own
+    terms. A search touches only the posting lists of the query terms, so for a chat session
+    (hundreds to a few thousand turns) it takes well under a millisecond.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, Dict[int, int]] = {}
+        self._nodes: List[TextNode] = []
+        self._lengths: List[int] = []
+        self._positions: Dict[str, int] = {}
+        self._total_length = 0
+
+    def __len__(self) -> int:
+        return len(self._nodes)
+
+    def add(self, node: TextNode) -> None:
+        if node.node_id in self._positions:
+            return
+        doc = len(self._nodes)
+        terms = tokenize(node.get_content())
+        self._positions[node.node_id] = doc
+        self._nodes.append(node)
+        self._lengths.append(len(terms))
+        self._total_length += len(terms)
+        for term in terms:
+            postings = self._postings.setdefault(term, {})
+            postings[doc] = postings.get(doc, 0) + 1
+
+    def search(
+        self,
+        query: str,
+        top_k: int,
+        predicate: Optional[Callable[[Dict], bool]] = None,
+    ) -> List[NodeWithScore]:
+        if not self._nodes:
+            return []
+        n_docs = len(self._nodes)
+        k1, lengths = self.k1, self._lengths
+        # Per-search constants of the length normalization k1 * (1 - b + b * dl / avgdl)
+        base = k1 * (1 - self.b)
+        slope = k1 * self.b * n_docs / self._total_length if self._total_length else 0.0
+        scores: Dict[int, float] = {}
+        for term in set(tokenize(query)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+            weight = idf * (k1 + 1)
+            for doc, tf in postings.items():
+                scores[doc] = scores.get(doc, 0.0) + weight * tf / (tf + base + slope * lengths[doc])
+
+        if predicate is not None:
+            scores = {doc: s for doc, s in scores.items() if predicate(self._nodes[doc].metadata)}
+        best = heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+        return [NodeWithScore(node=self._nodes[doc], score=score) for doc, score in best]
+
+
+def metadata_predicate(filters: Optional[MetadataFilters]) -> Optional[Callable[[Dict], bool]]:
+    """Evaluate (AND-combined) MetadataFilters in Python, for the keyword index."""
+    if filters is None or not filters.filters:
+        return None
+
+    checks = {
+        FilterOperator.EQ: lambda v, f: v == f,
+        FilterOperator.NE: lambda v, f: v != f,
+        FilterOperator.GT: lambda v, f: v is not None and v > f,
+        FilterOperator.GTE: lambda v, f: v is not None and v >= f,
+        FilterOperator.LT: lambda v, f: v is not None and v < f,
+        FilterOperator.LTE: lambda v, f: v is not None and v <= f,
+        FilterOperator.IN: lambda v, f: v in f,
+        FilterOperator.NIN: lambda v, f: v not in f,
+    }
+    conditions = []
+    for f in filters.filters:
+        if f.operator not in checks:
+            raise ValueError(f"Unsupported filter operator for keyword search: {f.operator}")
+        conditions.append((f.key, checks[f.operator], f.value))
+
+    def predicate(metadata: Dict) -> bool:
+        return all(check(metadata.get(key), value) for key, check, value in conditions)
+
+    return predicate
+
+
+def load_session_nodes(table, session_id: str) -> List[TextNode]:
+    """Read one session's stored turns from the LanceDB table (uses the session_id index)."""
+    escaped = session_id.replace("'", "''")
+    rows = (
+        table.search()
+        .where(f"metadata.session_id = '{escaped}'")
+        .select(["id", "text", "metadata"])
+        .limit(None)
+        .to_arrow()
+        .to_pylist()
+    )
+    return [
+        TextNode(
+            id_=row["id"],
+            text=row["text"],
+            metadata={key: row["metadata"].get(key) for key in CHAT_METADATA_KEYS},
+        )
+        for row in rows
+    ]
+
+
+class SessionKeywordIndex:
+    """
+    BM25 indexes partitioned by session, kept in step with the vector store.
+
+    A session's partition is built on its first keyword search, by `loader` (e.g.
+    `load_session_nodes` over the LanceDB table), so start-up doesn't read the stored
+    history. After that, `add_nodes()` indexes each flushed batch incrementally. At most
+    `max_sessions` partitions are kept in memory; evicted ones are reloaded on demand.
+    """
+
+    def __init__(
+        self,
+        loader: Optional[Callable[[str], Iterable[TextNode]]] = None,
+        max_sessions: int = 1024,
+        partition_key: str = "session_id",
+    ):
+        self.loader = loader
+        self.max_sessions = max_sessions
+        self.partition_key = partition_key
+        self._partitions: "OrderedDict[str, BM25Index]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add_nodes(self, nodes: Sequence[TextNode]) -> None:
+        """Index newly inserted nodes. Call after they've been written to the vector store."""
+        with self._lock:
+            for node in nodes:
+                session_id = node.metadata.get(self.partition_key)
+                partition = self._partitions.get(session_id)
+                if partition is None:
+                    if self.loader is not None:
+                        # Not loaded yet; the loader will read this node from the store
+                        continue
+                    partition = self._partitions[session_id] = BM25Index()
+                partition.add(node)
+
+    def search(self, query: str, top_k: int, filters: Optional[MetadataFilters] = None) -> List[NodeWithScore]:
+        session_id = self._session_of(filters)
+        if session_id is None:
+            # Only session-scoped searches are served; whole-corpus search stays vector-only
+            return []
+        with self._lock:
+            partition = self._partition(session_id)
+            return partition.search(query, top_k, predicate=metadata_predicate(filters))
+
+    def _partition(self, session_id: str) -> BM25Index:
+        partition = self._partitions.get(session_id)
+        if partition is None:
+            partition = BM25Index()
+            if self.loader is not None:
+                for node in self.loader(session_id):
+                    partition.add(node)
+            self._partitions[session_id] = partition
+            while len(self._partitions) > self.max_sessions:
+                self._partitions.popitem(last=False)
+        else:
+            self._partitions.move_to_end(session_id)
+        return partition
+
+    def _session_of(self, filters: Optional[MetadataFilters]) -> Optional[str]:
+        if filters is None:
+            return None
+        for f in filters.filters:
+            if f.key == self.partition_key and f.operator == FilterOperator.EQ:
+                return f.value
+        return None
+
+
+def reciprocal_rank_fusion(result_lists: Sequence[List[NodeWithScore]], k: int = 60) -> List[NodeWithScore]:
+    """
+    Merge ranked lists with reciprocal-rank fusion: score(node) = sum(1 / (k + rank)).
+
+    Only ranks are used, so BM25 scores and vector similarities need no normalization.
+    """
+    fused: Dict[str, float] = {}
+    nodes = {}
+    for results in result_lists:
+        for rank, result in enumerate(results, start=1):
+            node_id = result.node.node_id
+            fused[node_id] = fused.get(node_id, 0.0) + 1.0 / (k + rank)
+            nodes.setdefault(node_id, result.node)
+    ranked = sorted(fused.items(), key=lambda item: item[1], reverse=True)
+    return [NodeWithScore(node=nodes[node_id], score=score) for node_id, score in ranked]
+
+
+class CrossEncoderReranker:
+    """
+    Optional reranking stage with a local sentence-transformers cross-encoder.
+
+    Only the few fused candidates are scored, so a small model (e.g. ms-marco-MiniLM-L-6-v2)
+    adds a few milliseconds on CPU. Without `sentence-transformers` the fused order is kept.
+    """
+
+    def __init__(self, model_path: str):
+        self._model = None
+        try:
+            from sentence_transformers import CrossEncoder
+        except ImportError:
+            print("Warning: sentence-transformers is not installed; reranking is disabled.")
+        else:
+            self._model = CrossEncoder(model_path, device="cpu")
+
+    def rerank(self, query: str, results: List[NodeWithScore]) -> List[NodeWithScore]:
+        if self._model is None or len(results) < 2:
+            return results
+        scores = self._model.predict([(query, r.node.get_content()) for r in results])
+        ranked = sorted(zip(results, scores), key=lambda item: item[1], reverse=True)
+        return [NodeWithScore(node=r.node, score=float(score)) for r, score in ranked]
@@ -0,0 +1,187 @@
+import math
+import threading
+from datetime import timedelta
+from typing import Sequence
+
+import lancedb
+import pyarrow as pa
+
+# Search settings for the IVF-PQ index built by LanceTableMaintainer. 48 PQ codes can't
+# rank close neighbours on their own, so the top 3 x 50 candidates are re-scored with
+# exact distances; benchmark_retrieval.py checks the resulting recall
+SEARCH_NPROBES = 20
+SEARCH_REFINE_FACTOR = 50
+
+
+class SchemaMismatchError(ValueError):
+    """Raised when an existing table doesn't match the declared schema."""
+    pass
+
+
+def _schema_problems(expected: pa.Schema, actual: pa.Schema) -> list:
+    problems = []
+    for field in expected:
+        if field.name not in actual.names:
+            problems.append(f"missing column '{field.name}'")
+            continue
+        actual_type = actual.field(field.name).type
+        if pa.types.is_struct(field.type) and pa.types.is_struct(actual_type):
+            # Compare struct children by name; LanceDB may store them in another order
+            actual_children = {child.name: child.type for child in actual_type}
+            for child in field.type:
+                if child.name not in actual_children:
+                    problems.append(f"missing column '{field.name}.{child.name}'")
+                elif actual_children[child.name] != child.type:
+                    problems.append(f"'{field.name}.{child.name}' should be {child.type}")
+        elif actual_type != field.type:
+            problems.append(f"'{field.name}' is {actual_type}, expected {field.type}")
+    return problems
+
+
+def open_or_create_table(db: lancedb.DBConnection, table_name: str, schema: pa.Schema):
+    """
+    Open `table_name` after validating it against `schema`, or create it empty with `schema`.
+
+    Opening only reads the latest manifest; data files are memory-mapped lazily by queries,
+    so this takes the same time whatever the size of the stored history.
+    """
+    if table_name not in db.table_names():
+        return db.create_table(table_name, schema=schema)
+
+    table = db.open_table(table_name)
+    problems = _schema_problems(schema, table.schema)
+    if problems:
+        raise SchemaMismatchError(
+            f"Table '{table_name}' doesn't match the declared schema: {'; '.join(problems)}. "
+            "Migrate it, or drop it to start over (e.g. CHAT_STORE_RESET=1)."
+        )
+    return table
+
+
+class LanceTableMaintainer:
+    """
+    Keeps the chat_history table fast to search as it grows.
+
+    Every LanceDB write creates a new data fragment, transaction and manifest, and search
+    without an index is a brute-force scan over all fragments. `after_write()` is called by
+    the persistence engine after each batch insert (off the request path) and:
+
+    - compacts small fragments and deletes old table versions every `compact_every` writes;
+    - builds BTree indexes on `scalar_columns` as soon as the table exists, so metadata
+      pre-filters (e.g. one session's turns) don't scan the whole table;
+    - builds an IVF-PQ vector index once the table reaches `index_threshold` rows;
+    - folds new rows into the existing index incrementally on every compaction, and retrains
+      it from scratch once the table has grown by `retrain_growth` since the last build, so
+      the IVF partitions keep matching the data distribution.
+    """
+
+    def __init__(
+        self,
+        db: lancedb.DBConnection,
+        table_name: str = "chat_history",
+        vector_column: str = "vector",
+        index_threshold: int = 100_000,
+        compact_every: int = 20,
+        retain_versions_for: timedelta = timedelta(minutes=10),
+        retrain_growth: float = 2.0,
+        metric: str = "cosine",
+        scalar_columns: Sequence[str] = ("metadata.session_id",),
+    ):
+        self.db = db
+        self.table_name = table_name
+        self.vector_column = vector_column
+        self.index_threshold = index_threshold
+        self.compact_every = compact_every
+        self.retain_versions_for = retain_versions_for
+        self.retrain_growth = retrain_growth
+        self.metric = metric
+        self.scalar_columns = list(scalar_columns)
+
+        self._lock = threading.Lock()
+        self._writes_since_compaction = 0
+        self._rows_at_index_build = 0
+        self._scalar_indexes_ready = False
+
+    def after_write(self) -> None:
+        """Record one write and run whatever maintenance is due."""
+        with self._lock:
+            if self.table_name not in self.db.table_names():
+                return
+            table = self.db.open_table(self.table_name)
+            self._writes_since_compaction += 1
+            if self._writes_since_compaction >= self.compact_every:
+                self.compact(table)
+            self._ensure_scalar_indexes(table)
+            self._maybe_index(table)
+
+    def ensure_indexes(self, table=None) -> None:
+        """Build only the indexes that are missing, e.g. on warm start."""
+        with self._lock:
+            if table is None:
+                table = self.db.open_table(self.table_name)
+            self._ensure_scalar_indexes(table)
+            self._maybe_index(table)
+
+    def compact(self, table=None) -> None:
+        """Merge small fragments, update the vector index and drop old versions."""
+        if table is None:
+            table = self.db.open_table(self.table_name)
+        if hasattr(table, "optimize"):
+            # lancedb >= 0.8: compaction, incremental index update and version cleanup in one
+            table.optimize(cleanup_older_than=self.retain_versions_for)
+        else:
+            table.compact_files()
+            table.cleanup_old_versions(older_than=self.retain_versions_for)
+        self._writes_since_compaction = 0
+
+    def build_index(self, table=None) -> None:
+        """(Re)train the IVF-PQ index over the whole table."""
+        if table is None:
+            table = self.db.open_table(self.table_name)
+        rows = table.count_rows()
+        dim = table.schema.field(self.vector_column).type.list_size
+        table.create_index(
+            metric=self.metric,
+            vector_column_name=self.vector_column,
+            # ~4K vectors per partition (IVF training needs a few hundred each), at most sqrt(N)
+            num_partitions=max(1, min(rows // 4096, int(math.sqrt(rows)))),
+            # 16 dimensions per PQ sub-vector; 768 -> 48 sub-vectors
+            num_sub_vectors=max(1, dim // 16),
+            replace=True,
+        )
+        self._rows_at_index_build = rows
+
+    def has_vector_index(self, table=None) -> bool:
+        if table is None:
+            table = self.db.open_table(self.table_name)
+        if hasattr(table, "list_indices"):
+            return self.vector_column in self._indexed_columns(table)
+        # Older lancedb can't list indices; rely on what this process built
+        return self._rows_at_index_build > 0
+
+    def _indexed_columns(self, table) -> set:
+        if not hasattr(table, "list_indices"):
+            return set()
+        return {column for idx in table.list_indices() for column in idx.columns}
+
+    def _ensure_scalar_indexes(self, table) -> None:
+        if not self.scalar_columns or self._scalar_indexes_ready:
+            return
+        indexed = self._indexed_columns(table)
+        for column in self.scalar_columns:
+            if column not in indexed:
+                # Later rows are folded in by `optimize()` during compaction
+                table.create_scalar_index(column)
+        self._scalar_indexes_ready = True
+
+    def _maybe_index(self, table) -> None:
+        rows = table.count_rows()
+        if rows < self.index_threshold:
+            return
+        if not self.has_vector_index(table):
+            self.build_index(table)
+        elif self._rows_at_index_build == 0:
+            # Index built by an earlier process; adopt it as the baseline
+            self._rows_at_index_build = rows
+        elif rows >= self._rows_at_index_build * self.retrain_growth:
+            self.build_index(table)
@@ -0,0 +1,131 @@
+import hashlib
+import re
+import threading
+import zlib
+from collections import OrderedDict
+from typing import List, Optional
+
+import numpy as np
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from pydantic import Field, PrivateAttr
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+class LocalEmbedding(BaseEmbedding):
+    """
+    Offline CPU embeddings for the chat store, cached by content hash.
+
+    With `model_path` set and `sentence-transformers` installed, texts are encoded by that
+    local model. Otherwise a NumPy feature-hashing vectorizer is used: word unigrams and
+    bigrams are hashed into `dim` signed buckets, log-scaled and L2-normalized. It needs no
+    model download and captures the lexical overlap that chat follow-ups mostly rely on.
+
+    Either way, texts are vectorized in batches and every embedding is cached under the
+    SHA-1 of its text, so a repeated message is only embedded once.
+    """
+
+    dim: int = Field(default=768, description="Embedding dimension; must match the table schema")
+    model_path: Optional[str] = Field(default=None, description="Local sentence-transformers model")
+    cache_size: int = Field(default=50_000, description="Maximum number of cached embeddings")
+
+    _model = PrivateAttr(default=None)
+    _cache: "OrderedDict[bytes, np.ndarray]" = PrivateAttr(default_factory=OrderedDict)
+    _cache_lock = PrivateAttr(default_factory=threading.Lock)
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault("model_name", kwargs.get("model_path") or "local-hashing")
+        super().__init__(**kwargs)
+        if self.model_path:
+            try:
+                from sentence_transformers import SentenceTransformer
+            except ImportError:
+                print(
+                    "Warning: sentence-transformers is not installed; "
+                    "falling back to the hashing vectorizer."
+                )
+            else:
+                self._model = SentenceTransformer(self.model_path, device="cpu")
+                model_dim = self._model.get_sentence_embedding_dimension()
+                if model_dim != self.dim:
+                    raise ValueError(
+                        f"Model {self.model_path} produces {model_dim}-dim embeddings, "
+                        f"but the store expects {self.dim}"
+                    )
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "LocalEmbedding"
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        return self._embed([query])[0]
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._embed([text])[0]
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        return self._embed(texts)
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        return self._get_query_embedding(query)
+
+    async def _aget_text_embedding(self, text: str) -> List[float]:
+        return self._get_text_embedding(text)
+
+    def _embed(self, texts: List[str]) -> List[List[float]]:
+        keys = [hashlib.sha1(t.encode("utf-8")).digest() for t in texts]
+        results: List[Optional[np.ndarray]] = [None] * len(texts)
+        missing = {}
+        with self._cache_lock:
+            for i, key in enumerate(keys):
+                cached = self._cache.get(key)
+                if cached is not None:
+                    self._cache.move_to_end(key)
+                    results[i] = cached
+                else:
+                    # Duplicates within the batch are embedded once
+                    missing.setdefault(key, []).append(i)
+
+        if missing:
+            unique_texts = [texts[positions[0]] for positions in missing.values()]
+            vectors = self._vectorize(unique_texts)
+            with self._cache_lock:
+                for (key, positions), vector in zip(missing.items(), vectors):
+                    self._cache[key] = vector
+                    for i in positions:
+                        results[i] = vector
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+
+        return [v.tolist() for v in results]
+
+    def _vectorize(self, texts: List[str]) -> np.ndarray:
+        if self._model is not None:
+            return self._model.encode(
+                texts,
+                batch_size=self.embed_batch_size,
+                normalize_embeddings=True,
+                convert_to_numpy=True,
+            ).astype(np.float32)
+        return self._hash_vectorize(texts)
+
+    def _hash_vectorize(self, texts: List[str]) -> np.ndarray:
+        rows, buckets = [], []
+        for row, text in enumerate(texts):
+            words = _TOKEN_RE.findall(text.lower())
+            features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+            rows.extend([row] * len(features))
+            # crc32 is stable across processes, unlike the salted built-in hash()
+            buckets.extend(zlib.crc32(f.encode("utf-8")) for f in features)
+
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        if buckets:
+            hashes = np.fromiter(buckets, dtype=np.uint32, count=len(buckets))
+            columns = (hashes % self.dim).astype(np.intp)
+            # The top hash bit picks a sign so collisions tend to cancel out
+            signs = np.where(hashes >> 31, -1.0, 1.0).astype(np.float32)
+            np.add.at(matrix, (np.asarray(rows, dtype=np.intp), columns), signs)
+
+        matrix = np.sign(matrix) * np.log1p(np.abs(matrix))
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.maximum(norms, 1e-12)
@@ -0,0 +1,273 @@
+import atexit
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+from llama_index.core import Document, Settings, StorageContext, VectorStoreIndex
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.node_parser import NodeParser
+from llama_index.core.schema import NodeWithScore
+from llama_index.core.vector_stores import MetadataFilters, VectorStoreQuery
+
+from hybrid_retriever import CrossEncoderReranker, SessionKeywordIndex, reciprocal_rank_fusion
+from lance_maintenance import LanceTableMaintainer
+
+
+def _has_table(vector_store) -> bool:
+    try:
+        getattr(vector_store, "table", None)
+    except Exception:
+        # LanceDBVectorStore.table raises TableNotFoundError until the table exists
+        return False
+    return True
+
+
+class ChatPersistenceEngine:
+    """
+    Keeps a long-lived retriever over a chat index and persists new turns in batches.
+
+    `record()` only appends the turn to an in-memory buffer and a write-ahead log (one small
+    file append), so per-turn latency doesn't depend on the size of the store. A background
+    thread flushes the buffer every `flush_every_turns` turns or `flush_interval` seconds:
+    it parses and embeds all buffered turns in one batch, inserts them with a single
+    `insert_nodes` call and truncates the WAL. Vector stores that keep the node text
+    themselves (LanceDB) are durable after the insert, which only adds new data files, so
+    nothing else is rewritten; for stores that don't, the storage context is persisted as
+    well. Turns found in
+    the WAL at start-up (e.g. after a crash) are replayed into the buffer. An optional
+    `maintainer` compacts and indexes the LanceDB table after each flush.
+
+    With a `keyword_index`, filtered retrieval is hybrid: the vector search and a BM25
+    search each return `candidate_k` nodes, the two rankings are merged with reciprocal-rank
+    fusion and, with a `reranker`, the fused candidates are re-scored before the top
+    `similarity_top_k` are returned. Flushed nodes are added to the keyword index as well.
+
+    The WAL and persisted storage live in `persist_dir`, so only one open engine may use a
+    given directory; indexes over the same store should share an engine.
+    """
+
+    # Resolved persist_dirs of engines that haven't been closed
+    _open_dirs: Set[Path] = set()
+    _open_dirs_lock = threading.Lock()
+
+    def __init__(
+        self,
+        index: VectorStoreIndex,
+        storage_context: StorageContext,
+        node_parser: NodeParser,
+        embed_model: Optional[BaseEmbedding] = None,
+        persist_dir: str = "./chat_store",
+        similarity_top_k: int = 3,
+        flush_every_turns: int = 8,
+        flush_interval: float = 5.0,
+        maintainer: Optional[LanceTableMaintainer] = None,
+        keyword_index: Optional[SessionKeywordIndex] = None,
+        reranker: Optional[CrossEncoderReranker] = None,
+        candidate_k: int = 10,
+    ):
+        self.index = index
+        self.storage_context = storage_context
+        self.node_parser = node_parser
+        # The index's own embed model isn't public, so take it explicitly (same default as the index)
+        self.embed_model = embed_model or Settings.embed_model
+        self.persist_dir = Path(persist_dir)
+        self.persist_dir.mkdir(parents=True, exist_ok=True)
+        with self._open_dirs_lock:
+            if self.persist_dir.resolve() in self._open_dirs:
+                raise ValueError(
+                    f"Another ChatPersistenceEngine is using {persist_dir}; share it instead of opening a second one"
+                )
+            self._open_dirs.add(self.persist_dir.resolve())
+        self.flush_every_turns = flush_every_turns
+        self.flush_interval = flush_interval
+        self.similarity_top_k = similarity_top_k
+        self.maintainer = maintainer
+        self.keyword_index = keyword_index
+        self.reranker = reranker
+        self.candidate_k = max(candidate_k, similarity_top_k)
+
+        # Built once; `as_retriever` on every query re-creates the retriever and its settings
+        self.retriever = index.as_retriever(similarity_top_k=similarity_top_k)
+
+        # LanceDB creates its table on the first insert; searching before that fails
+        self._searchable = _has_table(storage_context.vector_store)
+
+        self._wal_path = self.persist_dir / "wal.jsonl"
+        self._lock = threading.Lock()
+        # Serializes index writes against retrieval on the shared vector store
+        self._index_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._pending: List[Dict] = self._replay_wal()
+        self._wal = open(self._wal_path, "a", encoding="utf-8")
+        self._closed = False
+
+        self._thread = threading.Thread(target=self._run, name="chat-persistence", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def record(self, text: str, metadata: Dict[str, str]) -> None:
+        """Buffer one chat turn for insertion and log it to the WAL."""
+        entry = {"text": text, "metadata": metadata}
+        with self._lock:
+            self._wal.write(json.dumps(entry) + "\n")
+            self._wal.flush()
+            self._pending.append(entry)
+            if len(self._pending) >= self.flush_every_turns:
+                self._wakeup.notify()
+
+    def retrieve(self, query: str, filters: Optional[MetadataFilters] = None) -> List[NodeWithScore]:
+        """
+        Retrieve stored nodes similar to the query.
+
+        `filters` are pushed down into the vector store search (LanceDB pre-filters before
+        the vector scan), so the top-k slots are only spent on matching nodes. Session-scoped
+        searches are hybrid when a keyword index is configured.
+        """
+        if filters is None:
+            with self._index_lock:
+                if not self._searchable:
+                    return []
+                try:
+                    return self.retriever.retrieve(query)
+                except Warning:
+                    # LanceDBVectorStore raises Warning when a search returns no rows
+                    return []
+
+        vector_results = self._vector_search(query, filters, self._candidates())
+        if self.keyword_index is None:
+            return vector_results[:self.similarity_top_k]
+
+        keyword_results = self.keyword_index.search(query, self.candidate_k, filters=filters)
+        results = reciprocal_rank_fusion([vector_results, keyword_results])[:self.candidate_k]
+        if self.reranker is not None:
+            results = self.reranker.rerank(query, results)
+        return results[:self.similarity_top_k]
+
+    def _candidates(self) -> int:
+        # Fusion and reranking need a deeper candidate list than the final top-k
+        return self.candidate_k if self.keyword_index is not None else self.similarity_top_k
+
+    def _vector_search(self, query: str, filters: MetadataFilters, top_k: int) -> List[NodeWithScore]:
+        # Query the store directly rather than building a retriever per filter set
+        embedding = self.embed_model.get_query_embedding(query)
+        with self._index_lock:
+            if not self._searchable:
+                return []
+            try:
+                result = self.storage_context.vector_store.query(VectorStoreQuery(
+                    query_embedding=embedding,
+                    similarity_top_k=top_k,
+                    filters=filters,
+                ))
+            except Warning:
+                return []
+        return [
+            NodeWithScore(node=node, score=score)
+            for node, score in zip(result.nodes, result.similarities or [])
+        ]
+
+    def pending_turns(self) -> List[Dict]:
+        """Turns recorded but not yet inserted into the index, oldest first."""
+        with self._lock:
+            return list(self._pending)
+
+    def flush(self) -> None:
+        """Insert and persist all buffered turns now."""
+        with self._flush_lock:
+            self._flush()
+
+    def _flush(self) -> None:
+        with self._lock:
+            batch = list(self._pending)
+        if not batch:
+            return
+
+        documents = [
+            # Metadata is for filtering only; keep it out of the embedded and LLM text
+            Document(
+                text=e["text"],
+                metadata=e["metadata"],
+                excluded_embed_metadata_keys=list(e["metadata"]),
+                excluded_llm_metadata_keys=list(e["metadata"]),
+            )
+            for e in batch
+        ]
+        nodes = self.node_parser.get_nodes_from_documents(documents)
+        # Embed outside the index lock so retrieval isn't blocked by the embedding call
+        embeddings = self.embed_model.get_text_embedding_batch(
+            [n.get_content(metadata_mode="embed") for n in nodes]
+        )
+        for node, embedding in zip(nodes, embeddings):
+            node.embedding = embedding
+
+        with self._index_lock:
+            self.index.insert_nodes(nodes)
+            self._searchable = True
+            if self.keyword_index is not None:
+                self.keyword_index.add_nodes(nodes)
+            if not self.storage_context.vector_store.stores_text:
+                # The docstore holds the node text, so it has to be saved too
+                self.storage_context.persist(persist_dir=str(self.persist_dir))
+
+        with self._lock:
+            # Drop what was flushed; turns recorded meanwhile stay buffered and in the WAL
+            self._pending = self._pending[len(batch):]
+            self._rewrite_wal_locked()
+
+        if self.maintainer is not None:
+            try:
+                self.maintainer.after_write()
+            except Exception as e:
+                # The turns are already stored; maintenance is retried after the next flush
+                print(f"Warning: LanceDB table maintenance failed: {e}")
+
+    def close(self) -> None:
+        """Flush remaining turns and stop the background thread."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._wakeup.notify()
+        atexit.unregister(self.close)
+        self._thread.join()
+        try:
+            self.flush()
+        finally:
+            self._wal.close()
+            with self._open_dirs_lock:
+                self._open_dirs.discard(self.persist_dir.resolve())
+
+    def _run(self) -> None:
+        while True:
+            with self._lock:
+                if len(self._pending) < self.flush_every_turns and not self._closed:
+                    self._wakeup.wait(timeout=self.flush_interval)
+                if self._closed:
+                    return
+            try:
+                self.flush()
+            except Exception as e:
+                # Turns stay in the buffer and WAL and are retried on the next flush
+                print(f"Warning: failed to persist chat turns: {e}")
+
+    def _replay_wal(self) -> List[Dict]:
+        entries = []
+        if self._wal_path.exists():
+            with open(self._wal_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entries.append(json.loads(line))
+                    except ValueError:
+                        break
+        return entries
+
+    def _rewrite_wal_locked(self) -> None:
+        self._wal.close()
+        tmp_path = self._wal_path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.writelines(json.dumps(e) + "\n" for e in self._pending)
+        os.replace(tmp_path, self._wal_path)
+        self._wal = open(self._wal_path, "a", encoding="utf-8")
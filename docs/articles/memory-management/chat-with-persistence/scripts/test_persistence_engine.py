@@ -0,0 +1,108 @@
+"""Tests for ChatPersistenceEngine. Run with: python -m pytest test_persistence_engine.py"""
+
+import gc
+import weakref
+
+import pytest
+from llama_index.core import StorageContext, VectorStoreIndex
+from llama_index.core.embeddings import MockEmbedding
+from llama_index.core.node_parser import SentenceSplitter
+
+from persistence_engine import ChatPersistenceEngine
+
+
+def make_engine(persist_dir, **kwargs):
+    embed_model = MockEmbedding(embed_dim=8)
+    storage_context = StorageContext.from_defaults()
+    index = VectorStoreIndex([], storage_context=storage_context, embed_model=embed_model)
+    kwargs.setdefault("flush_every_turns", 100)
+    kwargs.setdefault("flush_interval", 60.0)
+    return ChatPersistenceEngine(
+        index,
+        storage_context=storage_context,
+        node_parser=SentenceSplitter(),
+        embed_model=embed_model,
+        persist_dir=str(persist_dir),
+        **kwargs,
+    )
+
+
+def turn(text, session_id="s1"):
+    return text, {"role": "user", "session_id": session_id, "timestamp": "2025-01-01T00:00:00"}
+
+
+def wal_lines(persist_dir):
+    return (persist_dir / "wal.jsonl").read_text(encoding="utf-8").splitlines()
+
+
+def test_second_engine_on_same_persist_dir_is_refused(tmp_path):
+    first = make_engine(tmp_path)
+    try:
+        first.record(*turn("hello"))
+        with pytest.raises(ValueError):
+            make_engine(tmp_path)
+        # The refused engine didn't touch the first one's WAL
+        assert len(wal_lines(tmp_path)) == 1
+        assert len(first.pending_turns()) == 1
+    finally:
+        first.close()
+
+
+def test_persist_dir_can_be_reused_after_close(tmp_path):
+    first = make_engine(tmp_path)
+    first.record(*turn("hello"))
+    first.close()
+    assert wal_lines(tmp_path) == []
+
+    second = make_engine(tmp_path)
+    try:
+        # Flushed turns aren't replayed again
+        assert second.pending_turns() == []
+    finally:
+        second.close()
+
+
+def test_unflushed_turns_are_replayed_once(tmp_path):
+    first = make_engine(tmp_path)
+    first.record(*turn("one"))
+    first.record(*turn("two"))
+    # Simulate a crash: keep the WAL, skip the final flush
+    first._closed = True
+    with first._lock:
+        first._wakeup.notify()
+    first._thread.join()
+    first._wal.close()
+    ChatPersistenceEngine._open_dirs.discard(tmp_path.resolve())
+
+    second = make_engine(tmp_path)
+    try:
+        assert [t["text"] for t in second.pending_turns()] == ["one", "two"]
+        second.flush()
+        assert second.pending_turns() == []
+        assert wal_lines(tmp_path) == []
+    finally:
+        second.close()
+
+
+def test_engines_in_separate_dirs_keep_separate_wals(tmp_path):
+    a = make_engine(tmp_path / "a")
+    b = make_engine(tmp_path / "b")
+    try:
+        a.record(*turn("from a"))
+        b.record(*turn("from b"))
+        a.flush()
+        # Flushing one engine doesn't drop the other's buffered turns
+        assert len(wal_lines(tmp_path / "b")) == 1
+        assert [t["text"] for t in b.pending_turns()] == ["from b"]
+    finally:
+        a.close()
+        b.close()
+
+
+def test_closed_engine_can_be_garbage_collected(tmp_path):
+    engine = make_engine(tmp_path)
+    engine.close()
+    ref = weakref.ref(engine)
+    del engine
+    gc.collect()
+    assert ref() is None
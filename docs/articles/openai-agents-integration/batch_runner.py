@@ -0,0 +1,163 @@
+"""
+Run many agent tasks concurrently against the Sonar API.
+
+All runs share the agent and the AsyncOpenAI client (and its connection pool) defined in
+pplx_openai.py. A semaphore caps how many runs are in flight; a new task is only created
+once a slot is free, so memory stays flat for inputs of any size. Results are yielded as
+soon as each run finishes, with its latency and token usage.
+
+Usage:
+    python batch_runner.py prompts.txt --concurrency 64 --output results.jsonl
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+from dataclasses import asdict, dataclass
+from typing import AsyncIterator, Iterable, Optional
+
+from agents import Agent, Runner
+
+from pplx_openai import MAX_CONCURRENCY, create_agent
+
+
+@dataclass
+class TaskResult:
+    """Outcome of one agent run."""
+    index: int
+    input: str
+    output: Optional[str]
+    latency: float
+    requests: int = 0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    total_tokens: int = 0
+    error: Optional[str] = None
+
+
+async def run_batch(
+    agent: Agent,
+    inputs: Iterable[str],
+    concurrency: int = MAX_CONCURRENCY,
+    timeout: Optional[float] = None,
+    max_turns: int = 10,
+) -> AsyncIterator[TaskResult]:
+    """
+    Run `agent` on every input with at most `concurrency` runs in flight.
+
+    Yields a TaskResult per input in completion order (use `index` to map it back).
+    A failed or timed-out run yields a result with `error` set instead of raising.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    finished: asyncio.Queue = asyncio.Queue()
+    running = set()
+
+    async def run_one(index: int, text: str) -> None:
+        start = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(
+                Runner.run(agent, text, max_turns=max_turns), timeout=timeout
+            )
+            usage = result.context_wrapper.usage
+            task_result = TaskResult(
+                index=index,
+                input=text,
+                output=str(result.final_output),
+                latency=time.perf_counter() - start,
+                requests=usage.requests,
+                input_tokens=usage.input_tokens,
+                output_tokens=usage.output_tokens,
+                total_tokens=usage.total_tokens,
+            )
+        except Exception as e:
+            task_result = TaskResult(
+                index=index,
+                input=text,
+                output=None,
+                latency=time.perf_counter() - start,
+                error=f"{type(e).__name__}: {e}",
+            )
+        finally:
+            semaphore.release()
+        finished.put_nowait(task_result)
+
+    async def launch() -> int:
+        count = 0
+        for count, text in enumerate(inputs, start=1):
+            await semaphore.acquire()
+            task = asyncio.create_task(run_one(count - 1, text))
+            # Keep a reference so the task isn't garbage-collected while running
+            running.add(task)
+            task.add_done_callback(running.discard)
+        return count
+
+    launcher = asyncio.create_task(launch())
+    yielded = 0
+    try:
+        while not launcher.done():
+            get = asyncio.ensure_future(finished.get())
+            done, _ = await asyncio.wait({get, launcher}, return_when=asyncio.FIRST_COMPLETED)
+            if get in done:
+                yielded += 1
+                yield get.result()
+            else:
+                get.cancel()
+        # Re-raises errors from iterating `inputs`
+        total = launcher.result()
+        while yielded < total:
+            yielded += 1
+            yield await finished.get()
+    finally:
+        launcher.cancel()
+        for task in list(running):
+            task.cancel()
+
+
+def percentile(values, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="Run an agent over many prompts concurrently.")
+    parser.add_argument("prompts", help="File with one prompt per line ('-' for stdin)")
+    parser.add_argument("--concurrency", type=int, default=MAX_CONCURRENCY,
+                        help=f"Maximum runs in flight (default: {MAX_CONCURRENCY})")
+    parser.add_argument("--timeout", type=float, default=None, help="Per-run timeout in seconds")
+    parser.add_argument("--output", default="-", help="JSONL output file ('-' for stdout)")
+    args = parser.parse_args()
+
+    source = sys.stdin if args.prompts == "-" else open(args.prompts, "r", encoding="utf-8")
+    output = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    prompts = (line.strip() for line in source if line.strip())
+
+    agent = create_agent()
+    latencies, tokens, errors = [], 0, 0
+    start = time.perf_counter()
+    async for result in run_batch(agent, prompts, concurrency=args.concurrency, timeout=args.timeout):
+        output.write(json.dumps(asdict(result), ensure_ascii=False) + "\n")
+        output.flush()
+        latencies.append(result.latency)
+        tokens += result.total_tokens
+        errors += result.error is not None
+    elapsed = time.perf_counter() - start
+
+    if output is not sys.stdout:
+        output.close()
+    if source is not sys.stdin:
+        source.close()
+
+    print(
+        f"{len(latencies)} runs in {elapsed:.1f}s ({len(latencies) / elapsed if elapsed else 0:.1f}/s), "
+        f"{errors} errors, {tokens} tokens | latency p50 {percentile(latencies, 50):.2f}s "
+        f"p95 {percentile(latencies, 95):.2f}s p99 {percentile(latencies, 99):.2f}s",
+        file=sys.stderr,
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
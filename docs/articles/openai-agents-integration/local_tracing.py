@@ -0,0 +1,213 @@
+"""
+Local tracing for agent runs, without the OpenAI platform tracing backend.
+
+`enable_local_tracing()` replaces the SDK's default trace processors (which export to the
+OpenAI platform and need an OpenAI key) with `JSONLSpanExporter`. It writes one JSON line
+per finished span: model calls (generation/response spans with token usage), tool calls
+(function spans), handoffs, agent spans and any others, with their timings and errors.
+`retry_event_hook` attributes OpenAI client retries to the model span that made them.
+
+Ending a span only builds a small dict and puts it on a queue; a background thread
+writes the lines in batches, so tracing can stay on in production.
+
+Summarize a trace file with p50/p95/p99 latency per span type:
+    python local_tracing.py traces/spans.jsonl [--by-name]
+"""
+
+import argparse
+import json
+import queue
+import sys
+import threading
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from agents import set_trace_processors, set_tracing_disabled
+from agents.tracing import Span, Trace, TracingProcessor, get_current_span
+
+
+class JSONLSpanExporter(TracingProcessor):
+    """Trace processor that appends finished spans to a local JSONL file."""
+
+    def __init__(self, path: str = "traces/spans.jsonl", batch_size: int = 256, flush_interval: float = 1.0):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: "queue.Queue" = queue.Queue()
+        # Retries seen by the HTTP client, keyed by the span that was current at the time
+        self._retries: Dict[str, int] = defaultdict(int)
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+        self._thread.start()
+
+    def note_retry(self, span_id: str) -> None:
+        self._retries[span_id] += 1
+
+    def on_trace_start(self, trace: Trace) -> None:
+        pass
+
+    def on_trace_end(self, trace: Trace) -> None:
+        pass
+
+    def on_span_start(self, span: Span[Any]) -> None:
+        pass
+
+    def on_span_end(self, span: Span[Any]) -> None:
+        data = span.span_data
+        record = {
+            "trace_id": span.trace_id,
+            "span_id": span.span_id,
+            "parent_id": span.parent_id,
+            "type": data.type,
+            "name": _span_name(data),
+            "started_at": span.started_at,
+            "ended_at": span.ended_at,
+        }
+        usage = getattr(data, "usage", None)
+        if usage:
+            record["input_tokens"] = usage.get("input_tokens")
+            record["output_tokens"] = usage.get("output_tokens")
+        retries = self._retries.pop(span.span_id, 0)
+        if retries:
+            record["retries"] = retries
+        if span.error:
+            record["error"] = span.error.get("message")
+        self._queue.put(record)
+
+    def force_flush(self) -> None:
+        """Block until every span ended so far has been written."""
+        if self._closed:
+            return
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait()
+
+    def shutdown(self) -> None:
+        if self._closed:
+            return
+        self.force_flush()
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self) -> None:
+        batch = []
+        with open(self.path, "a", encoding="utf-8") as f:
+            while True:
+                try:
+                    item = self._queue.get(timeout=self.flush_interval if batch else None)
+                except queue.Empty:
+                    item = "timeout"
+
+                if isinstance(item, dict):
+                    batch.append(_with_duration(item))
+                    if len(batch) < self.batch_size:
+                        continue
+
+                if batch:
+                    f.writelines(json.dumps(r, separators=(",", ":")) + "\n" for r in batch)
+                    f.flush()
+                    batch = []
+
+                if isinstance(item, threading.Event):
+                    item.set()
+                elif item is None:
+                    return
+
+
+def _span_name(data: Any) -> Optional[str]:
+    if data.type == "handoff":
+        return f"{data.from_agent} -> {data.to_agent}"
+    if data.type == "generation":
+        return data.model
+    return getattr(data, "name", None)
+
+
+def _with_duration(record: Dict[str, Any]) -> Dict[str, Any]:
+    # Parsing timestamps happens on the writer thread, off the request path
+    if record["started_at"] and record["ended_at"]:
+        elapsed = datetime.fromisoformat(record["ended_at"]) - datetime.fromisoformat(record["started_at"])
+        record["duration_ms"] = round(elapsed.total_seconds() * 1000, 3)
+    return record
+
+
+_exporter: Optional[JSONLSpanExporter] = None
+
+
+def enable_local_tracing(path: str = "traces/spans.jsonl") -> JSONLSpanExporter:
+    """Send all agent spans to a local JSONL file instead of the OpenAI tracing backend."""
+    global _exporter
+    _exporter = JSONLSpanExporter(path)
+    set_trace_processors([_exporter])
+    set_tracing_disabled(disabled=False)
+    return _exporter
+
+
+async def retry_event_hook(request) -> None:
+    """
+    httpx request hook that counts OpenAI client retries for the current model span.
+
+    The OpenAI client sends `x-stainless-retry-count` with every attempt; attempts after
+    the first are retries. Register it on the client's httpx client, e.g.
+    `DefaultAsyncHttpxClient(event_hooks={"request": [retry_event_hook]})`.
+    """
+    if _exporter is None:
+        return
+    if int(request.headers.get("x-stainless-retry-count", "0")) > 0:
+        span = get_current_span()
+        if span is not None:
+            _exporter.note_retry(span.span_id)
+
+
+def percentile(values, pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def summarize(path: str, by_name: bool = False) -> None:
+    groups = defaultdict(list)
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            key = (record["type"], record.get("name") if by_name else None)
+            groups[key].append(record)
+
+    header = f"{'span':<40} {'count':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7} {'retries':>8} {'tokens in/out':>16}"
+    print(header)
+    print("-" * len(header))
+    for (span_type, name), records in sorted(groups.items(), key=lambda item: (item[0][0], str(item[0][1]))):
+        durations = [r["duration_ms"] for r in records if "duration_ms" in r]
+        if not durations:
+            continue
+        label = f"{span_type}:{name}" if by_name else span_type
+        errors = sum(1 for r in records if r.get("error"))
+        retries = sum(r.get("retries", 0) for r in records)
+        tokens_in = sum(r.get("input_tokens") or 0 for r in records)
+        tokens_out = sum(r.get("output_tokens") or 0 for r in records)
+        print(
+            f"{label[:40]:<40} {len(records):>7} {percentile(durations, 50):>9.1f} "
+            f"{percentile(durations, 95):>9.1f} {percentile(durations, 99):>9.1f} "
+            f"{errors:>7} {retries:>8} {f'{tokens_in}/{tokens_out}':>16}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Summarize span latencies from a local trace file.")
+    parser.add_argument("path", nargs="?", default="traces/spans.jsonl", help="JSONL trace file")
+    parser.add_argument("--by-name", action="store_true",
+                        help="Group by span name (model, tool, agent) as well as type")
+    args = parser.parse_args()
+    if not Path(args.path).exists():
+        print(f"Error: trace file not found: {args.path}", file=sys.stderr)
+        sys.exit(1)
+    summarize(args.path, by_name=args.by_name)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,17 +2,28 @@
 import asyncio  # For running asynchronous code
 import os       # To access environment variables
 
-# Import AsyncOpenAI for creating an async client
-from openai import AsyncOpenAI
+# Import AsyncOpenAI for creating an async client, and the httpx client it uses for connection pooling
+import httpx
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
 
 # Import custom classes and functions from the agents package.
 # These handle agent creation, model interfacing, running agents, and more.
 from agents import Agent, OpenAIChatCompletionsModel, Runner, function_tool, set_tracing_disabled
 
+# Runs tool calls from one model turn concurrently and caches their results
+from tool_execution import concurrent_tool
+
+# Records spans to a local JSONL file instead of the OpenAI tracing backend
+from local_tracing import enable_local_tracing, retry_event_hook
+
 # Retrieve configuration from environment variables or use defaults
 BASE_URL = os.getenv("EXAMPLE_BASE_URL") or "https://api.perplexity.ai"
 API_KEY = os.getenv("EXAMPLE_API_KEY") 
 MODEL_NAME = os.getenv("EXAMPLE_MODEL_NAME") or "sonar-pro"
+# Upper bound on concurrent requests; also sizes the client's connection pool
+MAX_CONCURRENCY = int(os.getenv("EXAMPLE_MAX_CONCURRENCY") or 64)
+# Local span file; set EXAMPLE_TRACE_FILE="" to turn tracing off
+TRACE_FILE = os.getenv("EXAMPLE_TRACE_FILE", "traces/spans.jsonl")
 
 # Validate that all required configuration variables are set
 if not BASE_URL or not API_KEY or not MODEL_NAME:
@@ -25,15 +36,31 @@ This example illustrates how to use a custom provider with a specific agent:
 1. We create an asynchronous OpenAI client configured to interact with the Perplexity Sonar API.
 2. We define a custom model using this client.
 3. We set up an Agent with our custom model and attach function tools.
-Note: Tracing is disabled in this example. If you have an OpenAI platform API key,
-you can enable tracing by setting the environment variable OPENAI_API_KEY or using set_tracing_export_api_key().
+Note: Spans are written to a local JSONL file (see local_tracing.py) rather than the OpenAI
+platform, so tracing doesn't need an OpenAI API key. Summarize them with
+`python local_tracing.py traces/spans.jsonl`.
 """
 
 # Initialize the custom OpenAI async client with the specified BASE_URL and API_KEY.
-client = AsyncOpenAI(base_url=BASE_URL, api_key=API_KEY)
+# One client is shared by every agent run, so all requests reuse its keep-alive connections.
+client = AsyncOpenAI(
+    base_url=BASE_URL,
+    api_key=API_KEY,
+    http_client=DefaultAsyncHttpxClient(
+        limits=httpx.Limits(
+            max_connections=MAX_CONCURRENCY,
+            max_keepalive_connections=MAX_CONCURRENCY,
+        ),
+        # Counts client retries on the model span that made them
+        event_hooks={"request": [retry_event_hook]},
+    ),
+)
 
-# Disable tracing to avoid using a platform tracing key; adjust as needed.
-set_tracing_disabled(disabled=True)
+# Trace locally instead of using a platform tracing key; adjust as needed.
+if TRACE_FILE:
+    enable_local_tracing(TRACE_FILE)
+else:
+    set_tracing_disabled(disabled=True)
 
 # (Alternate approach example, commented out)
 # PROVIDER = OpenAIProvider(openai_client=client)
@@ -42,7 +69,9 @@ set_tracing_disabled(disabled=True)
 
 # Define a function tool that the agent can call.
 # The decorator registers this function as a tool in the agents framework.
+# concurrent_tool runs it on a thread pool and caches each city's result for 5 minutes.
 @function_tool
+@concurrent_tool(ttl=300)
 def get_weather(city: str):
     """
     Simulate fetching weather data for a given city.
@@ -56,31 +85,34 @@ def get_weather(city: str):
     print(f"[debug] getting weather for {city}")
     return f"The weather in {city} is sunny."
 
-# Import nest_asyncio to support nested event loops (helpful in interactive environments like Jupyter)
-import nest_asyncio
-
-# Apply the nest_asyncio patch to enable running asyncio.run() even if an event loop is already running.
-nest_asyncio.apply()
-
-async def main():
+def create_agent():
     """
-    Main asynchronous function to set up and run the agent.
-    
-    This function creates an Agent with a custom model and function tools,
-    then runs a query to get the weather in Tokyo.
+    Create an Agent with a custom model and function tools.
+
+    The agent only holds configuration, so one instance can serve any number of
+    concurrent runs (see batch_runner.py).
     """
     # Create an Agent instance with:
     # - A name ("Assistant")
     # - Custom instructions ("Be precise and concise.")
     # - A model built from OpenAIChatCompletionsModel using our client and model name.
     # - A list of tools; here, only get_weather is provided.
-    agent = Agent(
+    return Agent(
         name="Assistant",
         instructions="Be precise and concise.",
         model=OpenAIChatCompletionsModel(model=MODEL_NAME, openai_client=client),
         tools=[get_weather],
     )
 
+async def main():
+    """
+    Main asynchronous function to set up and run the agent.
+
+    This function creates the agent, then runs a query to get the weather in Tokyo.
+    In Jupyter, which already runs an event loop, use `await main()` instead of asyncio.run().
+    """
+    agent = create_agent()
+
     # Execute the agent with the sample query.
     result = await Runner.run(agent, "What's the weather in Tokyo?")
     
@@ -0,0 +1,101 @@
+"""
+Concurrent, cached execution for agent function tools.
+
+When the model asks for several tools in one turn, the Agents SDK awaits the tool calls
+together. A synchronous tool that does I/O blocks the event loop while it runs, so those
+calls still happen one after another. `concurrent_tool` makes each call awaitable:
+
+- synchronous tools run on a shared thread pool, asynchronous tools run natively on the loop;
+- results are memoized per argument set for `ttl` seconds (LRU-bounded by `maxsize`);
+- identical calls made while one is already running wait for that call instead of repeating it.
+
+A turn with several tool calls then takes about as long as the slowest one, and repeated
+calls (the same city across a batch of prompts) cost nothing.
+
+Usage:
+    @function_tool
+    @concurrent_tool(ttl=300)
+    def get_weather(city: str): ...
+"""
+
+import asyncio
+import functools
+import inspect
+import json
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from agents import RunContextWrapper
+
+# Shared by all synchronous tools; sized for I/O-bound work
+TOOL_EXECUTOR = ThreadPoolExecutor(
+    max_workers=int(os.getenv("EXAMPLE_TOOL_THREADS") or 32),
+    thread_name_prefix="agent-tool",
+)
+
+
+def _cache_key(args: tuple, kwargs: Dict[str, Any]) -> str:
+    # The run context differs per run and doesn't change what the tool returns
+    args = [a for a in args if not isinstance(a, RunContextWrapper)]
+    return json.dumps([args, kwargs], sort_keys=True, default=repr)
+
+
+def concurrent_tool(
+    ttl: float = 60.0,
+    maxsize: int = 1024,
+    executor: Optional[Executor] = None,
+) -> Callable:
+    """
+    Decorator that makes a tool function awaitable, concurrent and memoized.
+
+    Apply it below `@function_tool`: it keeps the wrapped function's signature and
+    docstring, so the generated tool schema is unchanged. Set `ttl=0` to disable caching
+    (concurrent identical calls are still shared). Exceptions are never cached.
+    """
+    def decorator(func: Callable) -> Callable:
+        is_async = inspect.iscoroutinefunction(func)
+        cache: "OrderedDict[str, tuple]" = OrderedDict()
+        in_flight: Dict[str, asyncio.Future] = {}
+
+        async def call(*args, **kwargs):
+            if is_async:
+                return await func(*args, **kwargs)
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                executor or TOOL_EXECUTOR, functools.partial(func, *args, **kwargs)
+            )
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            key = _cache_key(args, kwargs)
+            entry = cache.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > time.monotonic():
+                    cache.move_to_end(key)
+                    return value
+                del cache[key]
+
+            future = in_flight.get(key)
+            if future is None:
+                future = asyncio.ensure_future(call(*args, **kwargs))
+                in_flight[key] = future
+
+                def store(done: asyncio.Future) -> None:
+                    in_flight.pop(key, None)
+                    if ttl > 0 and not done.cancelled() and done.exception() is None:
+                        cache[key] = (time.monotonic() + ttl, done.result())
+                        while len(cache) > maxsize:
+                            cache.popitem(last=False)
+
+                future.add_done_callback(store)
+            # Shield so one cancelled caller doesn't cancel the call others are waiting on
+            return await asyncio.shield(future)
+
+        wrapper.cache_clear = cache.clear
+        return wrapper
+
+    return decorator
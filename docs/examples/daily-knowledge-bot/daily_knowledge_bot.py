@@ -18,6 +18,8 @@ import json
 import logging
 import sys
 import random
+import time
+from contextlib import nullcontext
 from datetime import datetime
 from pathlib import Path
 from typing import Dict, List, Optional, Union
@@ -25,6 +27,16 @@ from typing import Dict, List, Optional, Union
 import requests
 from dotenv import load_dotenv
 
+try:
+    import usage_ledger
+except ImportError:
+    usage_ledger = None
+
+try:
+    import sonar_metrics
+except ImportError:
+    sonar_metrics = None
+
 
 # Configure logging
 logging.basicConfig(
@@ -46,7 +58,9 @@ class ConfigurationError(Exception):
 class PerplexityClient:
     """Client for interacting with the Perplexity API."""
     
-    BASE_URL = "https://api.perplexity.ai/chat/completions"
+    BASE_URL = os.environ.get("PERPLEXITY_BASE_URL", "https://api.perplexity.ai").rstrip("/") + "/chat/completions"
+    # Name used for this client in the usage ledger
+    USAGE_CLIENT = "daily_knowledge_bot"
     
     def __init__(self, api_key: str):
         """
@@ -63,6 +77,7 @@ class PerplexityClient:
             "Authorization": f"Bearer {api_key}",
             "Content-Type": "application/json"
         }
+        self.ledger = usage_ledger.UsageLedger.from_env() if usage_ledger else None
     
     def get_fact(self, topic: str, max_tokens: int = 150, temperature: float = 0.7) -> str:
         """
@@ -78,9 +93,11 @@ class PerplexityClient:
             
         Raises:
             requests.exceptions.RequestException: If API request fails
+            BudgetExceeded: If usage tracking is on and today's budget is used up
         """
+        model = self.ledger.select_model(self.USAGE_CLIENT, "sonar") if self.ledger else "sonar"
         data = {
-            "model": "sonar",
+            "model": model,
             "messages": [
                 {
                     "role": "system",
@@ -95,10 +112,14 @@ class PerplexityClient:
             "temperature": temperature
         }
         
-        response = requests.post(self.BASE_URL, headers=self.headers, json=data, timeout=30)
-        response.raise_for_status()
+        start = time.monotonic()
+        with sonar_metrics.track_request(self.USAGE_CLIENT, model) if sonar_metrics else nullcontext():
+            response = requests.post(self.BASE_URL, headers=self.headers, json=data, timeout=30)
+            response.raise_for_status()
         
         result = response.json()
+        if self.ledger:
+            self.ledger.record(self.USAGE_CLIENT, model, result.get("usage"), time.monotonic() - start)
         return result["choices"][0]["message"]["content"]
 
 
@@ -219,7 +240,9 @@ class DailyFactService:
             logger.error(f"API request error: {e}")
             raise
         except Exception as e:
-            logger.error(f"Unexpected error: {e}")
+            # A used-up budget is reported by main()
+            if not (usage_ledger and isinstance(e, usage_ledger.BudgetExceeded)):
+                logger.error(f"Unexpected error: {e}")
             raise
 
 
@@ -254,6 +277,10 @@ def main():
     try:
         # Load configuration
         config = load_config()
+
+        # Serve /metrics if METRICS_PORT is set (useful when the bot runs as a long-lived process)
+        if sonar_metrics and sonar_metrics.serve_from_env():
+            logger.info(f"Serving metrics on port {os.environ['METRICS_PORT']} at /metrics")
         
         # Validate API key
         if not config["api_key"]:
@@ -288,6 +315,9 @@ def main():
         logger.error(f"API communication error: {e}")
         sys.exit(2)
     except Exception as e:
+        if usage_ledger and isinstance(e, usage_ledger.BudgetExceeded):
+            logger.error(f"No fact today: {e}")
+            sys.exit(4)
         logger.error(f"Unhandled error: {e}")
         sys.exit(3)
 
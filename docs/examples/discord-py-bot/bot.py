@@ -6,6 +6,20 @@ import openai
 from dotenv import load_dotenv
 import logging
 import re
+import time
+from contextlib import nullcontext
+
+from routing import ModelRouter, hedged_completion
+
+try:
+    import usage_ledger
+except ImportError:
+    usage_ledger = None
+
+try:
+    import sonar_metrics
+except ImportError:
+    sonar_metrics = None
 
 # Basic logging
 logging.basicConfig(level=logging.INFO)
@@ -15,17 +29,68 @@ logger = logging.getLogger(__name__)
 load_dotenv()
 DISCORD_TOKEN = os.getenv("DISCORD_TOKEN")
 PERPLEXITY_API_KEY = os.getenv("PERPLEXITY_API_KEY")
+# Target answer latency in seconds, and whether slow requests are hedged with a faster model
+LATENCY_SLO_SECONDS = float(os.getenv("LATENCY_SLO_SECONDS", "10"))
+HEDGE_REQUESTS = os.getenv("HEDGE_REQUESTS", "true").lower() not in ("0", "false", "no")
 
 # Bot setup
 intents = discord.Intents.default()
 intents.message_content = True
 bot = commands.Bot(command_prefix="!", intents=intents)
 
-# Perplexity client
-perplexity_client = openai.OpenAI(
+# Perplexity client (async, so a slow answer does not block the bot's event loop)
+perplexity_client = openai.AsyncOpenAI(
     api_key=PERPLEXITY_API_KEY,
-    base_url="https://api.perplexity.ai"
+    base_url=os.getenv("PERPLEXITY_BASE_URL", "https://api.perplexity.ai")
 ) if PERPLEXITY_API_KEY else None
+router = ModelRouter(slo_seconds=LATENCY_SLO_SECONDS)
+ledger = usage_ledger.UsageLedger.from_env() if usage_ledger else None
+
+def count_hedge(primary: str, backup: str):
+    """Count a hedged backup request in the metrics"""
+    sonar_metrics.RETRIES.labels("discord_bot", "hedge").inc()
+
+async def get_answer(question: str) -> str:
+    """Ask Perplexity on the routed model, hedging slow requests, and format the answer for Discord"""
+    async def create(model: str):
+        start = time.monotonic()
+        with sonar_metrics.track_request("discord_bot", model) if sonar_metrics else nullcontext():
+            response = await perplexity_client.chat.completions.create(
+                model=model,
+                messages=[
+                    {
+                        "role": "system", 
+                        "content": "You are a helpful AI assistant. Provide clear, accurate answers with citations."
+                    },
+                    {"role": "user", "content": question}
+                ],
+                max_tokens=2000,
+                temperature=0.2
+            )
+        if ledger:
+            usage = response.usage.model_dump() if response.usage else None
+            ledger.record("discord_bot", model, usage, time.monotonic() - start)
+        return response
+
+    try:
+        with sonar_metrics.QUEUE_DEPTH.labels("discord_bot", "questions").track_inprogress() if sonar_metrics else nullcontext():
+            response, model = await hedged_completion(
+                router, create, question, hedge=HEDGE_REQUESTS, on_hedge=count_hedge if sonar_metrics else None,
+                select_model=(lambda model: ledger.select_model("discord_bot", model)) if ledger else None,
+            )
+    except Exception as e:
+        if ledger and isinstance(e, usage_ledger.BudgetExceeded):
+            return f"⏳ {e}"
+        raise
+    logger.info(f"Answered with {model}")
+
+    answer = response.choices[0].message.content
+    formatted_answer = format_citations(answer, response)
+    
+    # Truncate if too long
+    if len(formatted_answer) > 2000:
+        formatted_answer = formatted_answer[:1997] + "..."
+    return formatted_answer
 
 @bot.event
 async def on_ready():
@@ -45,26 +110,7 @@ async def ask(interaction: discord.Interaction, question: str):
     await interaction.response.defer()
     
     try:
-        response = perplexity_client.chat.completions.create(
-            model="sonar-pro",
-            messages=[
-                {
-                    "role": "system", 
-                    "content": "You are a helpful AI assistant. Provide clear, accurate answers with citations."
-                },
-                {"role": "user", "content": question}
-            ],
-            max_tokens=2000,
-            temperature=0.2
-        )
-        
-        answer = response.choices[0].message.content
-        formatted_answer = format_citations(answer, response)
-        
-        # Truncate if too long
-        if len(formatted_answer) > 2000:
-            formatted_answer = formatted_answer[:1997] + "..."
-        
+        formatted_answer = await get_answer(question)
         await interaction.followup.send(formatted_answer)
         
     except Exception as e:
@@ -88,26 +134,7 @@ async def on_message(message):
         
         async with message.channel.typing():
             try:
-                response = perplexity_client.chat.completions.create(
-                    model="sonar-pro",
-                    messages=[
-                        {
-                            "role": "system", 
-                            "content": "You are a helpful AI assistant. Provide clear, accurate answers with citations."
-                        },
-                        {"role": "user", "content": content}
-                    ],
-                    max_tokens=2000,
-                    temperature=0.2
-                )
-                
-                answer = response.choices[0].message.content
-                formatted_answer = format_citations(answer, response)
-                
-                # Truncate if too long
-                if len(formatted_answer) > 2000:
-                    formatted_answer = formatted_answer[:1997] + "..."
-                
+                formatted_answer = await get_answer(content)
                 await message.reply(formatted_answer)
                 
             except Exception as e:
@@ -178,4 +205,6 @@ if __name__ == "__main__":
     if not DISCORD_TOKEN or not PERPLEXITY_API_KEY:
         print("❌ Missing DISCORD_TOKEN or PERPLEXITY_API_KEY in .env file")
     else:
+        if sonar_metrics and sonar_metrics.serve_from_env():
+            logger.info(f"Serving metrics on port {os.environ['METRICS_PORT']} at /metrics")
         bot.run(DISCORD_TOKEN)
\ No newline at end of file
@@ -0,0 +1,184 @@
+"""
+Model routing and hedged requests for the Discord bot.
+
+`ModelRouter` picks a model for each question from its length and a latency SLO, using
+the p95 latency it has observed for each model. `hedged_completion()` sends the question
+to that model and, if no answer has arrived by the model's p95, fires a backup request to
+a faster model; whichever answers first is used and the other request is cancelled.
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ModelProfile:
+    name: str
+    # p95 latency in seconds assumed until enough requests have been observed
+    prior_p95: float
+    # Longest question (in estimated tokens) this model is preferred for; None means no limit
+    max_query_tokens: Optional[int] = None
+
+
+# Fastest first. Short questions go to sonar, longer ones to sonar-pro.
+DEFAULT_MODELS = [
+    ModelProfile("sonar", prior_p95=4.0, max_query_tokens=60),
+    ModelProfile("sonar-pro", prior_p95=8.0),
+]
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about 4 characters per token)."""
+    return (len(text) + 3) // 4
+
+
+class ModelRouter:
+    """Chooses models by question size and latency SLO, and tracks their observed latency."""
+
+    def __init__(
+        self,
+        models: List[ModelProfile] = DEFAULT_MODELS,
+        slo_seconds: float = 10.0,
+        window: int = 200,
+        min_samples: int = 20,
+        max_hedge_ratio: float = 0.1,
+        min_hedge_delay: float = 0.5,
+    ):
+        """
+        Args:
+            models: Candidate models, fastest first
+            slo_seconds: Latency target for an answer
+            window: Number of recent latencies kept per model
+            min_samples: Samples needed before observed latency replaces the prior
+            max_hedge_ratio: Maximum fraction of requests that may send a backup request
+            min_hedge_delay: Shortest wait before a backup request is sent
+        """
+        self.models = list(models)
+        self.slo_seconds = slo_seconds
+        self.min_samples = min_samples
+        self.max_hedge_ratio = max_hedge_ratio
+        self.min_hedge_delay = min_hedge_delay
+        self.window = window
+        self._latencies: Dict[str, Deque[float]] = {m.name: deque(maxlen=window) for m in self.models}
+        self._requests = 0
+        self._hedges = 0
+
+    def p95(self, model: str) -> float:
+        """Observed p95 latency of a model, or its prior until there are enough samples."""
+        samples = self._latencies[model]
+        if len(samples) < self.min_samples:
+            return next(m.prior_p95 for m in self.models if m.name == model)
+        ordered = sorted(samples)
+        return ordered[int(0.95 * (len(ordered) - 1))]
+
+    def record(self, model: str, seconds: float) -> None:
+        # A model picked outside the router (e.g. a cheaper one under a budget) is tracked too
+        self._latencies.setdefault(model, deque(maxlen=self.window)).append(seconds)
+
+    def route(self, query: str, slo_seconds: Optional[float] = None) -> str:
+        """Pick the model for a question: by size first, then the fastest one that meets the SLO."""
+        slo = self.slo_seconds if slo_seconds is None else slo_seconds
+        tokens = estimate_tokens(query)
+        index = next(
+            (i for i, m in enumerate(self.models) if m.max_query_tokens is None or tokens <= m.max_query_tokens),
+            len(self.models) - 1,
+        )
+        # Step down to faster models while the preferred one is too slow for the SLO
+        while index > 0 and self.p95(self.models[index].name) > slo:
+            index -= 1
+        return self.models[index].name
+
+    def backup_for(self, model: str) -> str:
+        """The model used for a hedged request: the next faster one, or the same model if it is the fastest."""
+        names = [m.name for m in self.models]
+        return names[max(names.index(model) - 1, 0)]
+
+    def hedge_delay(self, model: str) -> float:
+        return max(self.p95(model), self.min_hedge_delay)
+
+    def start_request(self) -> None:
+        self._requests += 1
+
+    def allow_hedge(self) -> bool:
+        """Whether a backup request may be sent, keeping hedges to `max_hedge_ratio` of requests."""
+        if self._hedges + 1 > self.max_hedge_ratio * self._requests + 1:
+            return False
+        self._hedges += 1
+        return True
+
+
+async def _timed(create: Callable[[str], Awaitable[Any]], model: str) -> Tuple[Any, float]:
+    start = time.monotonic()
+    response = await create(model)
+    return response, time.monotonic() - start
+
+
+async def hedged_completion(
+    router: ModelRouter,
+    create: Callable[[str], Awaitable[Any]],
+    query: str,
+    slo_seconds: Optional[float] = None,
+    hedge: bool = True,
+    on_hedge: Optional[Callable[[str, str], None]] = None,
+    select_model: Optional[Callable[[str], str]] = None,
+) -> Tuple[Any, str]:
+    """
+    Run `create(model)` on the routed model, hedging with a backup request if it is slow.
+    `on_hedge(primary, backup)` is called when a backup request is sent.
+
+    `select_model(model)` can replace a routed model with the one actually called, such as
+    a cheaper model under a budget. It is applied to the primary and backup models before
+    any request is sent, so an error it raises propagates without a backup being fired, and
+    latency is recorded under the model that served each request.
+
+    Returns the first successful response and the model that produced it. If every
+    request fails, the primary request's error is raised.
+    """
+    routed = router.route(query, slo_seconds)
+    primary, backup = routed, router.backup_for(routed)
+    if select_model:
+        primary, backup = select_model(primary), select_model(backup)
+    router.start_request()
+    # task -> (model, start time)
+    tasks: Dict[asyncio.Task, Tuple[str, float]] = {}
+
+    def launch(model: str) -> None:
+        tasks[asyncio.create_task(_timed(create, model))] = (model, time.monotonic())
+
+    launch(primary)
+    errors = []
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=router.hedge_delay(routed))
+        if not done or next(iter(done)).exception() is not None:
+            # Slow or failed: send a backup request (at once if the primary already failed)
+            if hedge and router.allow_hedge():
+                logger.info(f"Hedging {primary} request with {backup}")
+                if on_hedge:
+                    on_hedge(primary, backup)
+                launch(backup)
+
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                model = tasks[task][0]
+                if task.exception() is not None:
+                    errors.append((model, task.exception()))
+                    continue
+                response, seconds = task.result()
+                router.record(model, seconds)
+                return response, model
+    finally:
+        for task, (model, start) in tasks.items():
+            if not task.done():
+                task.cancel()
+                # The loser took at least this long; recording it keeps the p95 from drifting
+                # down to only the requests that happened to win
+                router.record(model, time.monotonic() - start)
+    raise next((e for model, e in errors if model == primary), errors[0][1])
@@ -0,0 +1,111 @@
+"""Tests for model routing and hedged requests. Run with: python -m pytest test_routing.py"""
+
+import asyncio
+
+import pytest
+
+from routing import ModelProfile, ModelRouter, hedged_completion
+
+
+def make_router(**kwargs):
+    kwargs.setdefault("min_hedge_delay", 0.05)
+    kwargs.setdefault("max_hedge_ratio", 1.0)
+    # Zero priors pin the hedge delay to min_hedge_delay
+    models = [ModelProfile("sonar", prior_p95=0.0, max_query_tokens=60), ModelProfile("sonar-pro", prior_p95=0.0)]
+    return ModelRouter(models, **kwargs)
+
+
+class FakeAPI:
+    """Answers after a per-model delay, optionally failing, and records what happened."""
+
+    def __init__(self, delays, failures=()):
+        self.delays = delays
+        self.failures = set(failures)
+        self.started = []
+        self.cancelled = []
+
+    async def create(self, model):
+        self.started.append(model)
+        try:
+            await asyncio.sleep(self.delays[model])
+        except asyncio.CancelledError:
+            self.cancelled.append(model)
+            raise
+        if model in self.failures:
+            raise RuntimeError(f"{model} failed")
+        return f"answer from {model}"
+
+
+LONG_QUESTION = "x" * 400  # Routed to sonar-pro; its backup is sonar
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_fast_primary_wins_without_hedging():
+    api = FakeAPI({"sonar-pro": 0.01, "sonar": 0.01})
+    response, model = run(hedged_completion(make_router(), api.create, LONG_QUESTION))
+    assert (response, model) == ("answer from sonar-pro", "sonar-pro")
+    assert api.started == ["sonar-pro"]
+
+
+def test_slow_primary_is_hedged_and_cancelled():
+    api = FakeAPI({"sonar-pro": 1.0, "sonar": 0.01})
+    hedges = []
+    router = make_router()
+    response, model = run(hedged_completion(
+        router, api.create, LONG_QUESTION, on_hedge=lambda primary, backup: hedges.append((primary, backup))
+    ))
+    assert (response, model) == ("answer from sonar", "sonar")
+    assert hedges == [("sonar-pro", "sonar")]
+    assert api.cancelled == ["sonar-pro"]
+    # The loser's time so far is recorded too, so its p95 doesn't drift down
+    assert len(router._latencies["sonar-pro"]) == 1
+
+
+def test_failed_primary_is_hedged_at_once():
+    api = FakeAPI({"sonar-pro": 0.0, "sonar": 0.01}, failures={"sonar-pro"})
+    response, model = run(hedged_completion(make_router(min_hedge_delay=5.0), api.create, LONG_QUESTION))
+    assert model == "sonar"
+
+
+def test_primary_error_is_raised_when_every_request_fails():
+    api = FakeAPI({"sonar-pro": 0.0, "sonar": 0.0}, failures={"sonar-pro", "sonar"})
+    with pytest.raises(RuntimeError, match="sonar-pro failed"):
+        run(hedged_completion(make_router(), api.create, LONG_QUESTION))
+
+
+def test_no_hedge_when_disabled():
+    api = FakeAPI({"sonar-pro": 0.1, "sonar": 0.01})
+    response, model = run(hedged_completion(make_router(), api.create, LONG_QUESTION, hedge=False))
+    assert model == "sonar-pro"
+    assert api.started == ["sonar-pro"]
+
+
+def test_select_model_error_sends_nothing():
+    api = FakeAPI({"sonar-pro": 0.01, "sonar": 0.01})
+
+    def over_budget(model):
+        raise LookupError("budget used up")
+
+    with pytest.raises(LookupError):
+        run(hedged_completion(make_router(), api.create, LONG_QUESTION, select_model=over_budget))
+    assert api.started == []
+
+
+def test_latency_is_recorded_under_the_selected_model():
+    api = FakeAPI({"sonar-pro": 0.01, "sonar": 0.01, "sonar-cheap": 0.01})
+    router = make_router()
+    _, model = run(hedged_completion(
+        router, api.create, LONG_QUESTION, select_model=lambda m: "sonar-cheap" if m == "sonar-pro" else m
+    ))
+    assert model == "sonar-cheap"
+    assert len(router._latencies["sonar-cheap"]) == 1
+    assert len(router._latencies["sonar-pro"]) == 0
+
+
+def test_hedges_are_capped_by_ratio():
+    router = make_router(max_hedge_ratio=0.0)
+    assert router.allow_hedge()  # The first hedge is always allowed
+    assert not router.allow_hedge()
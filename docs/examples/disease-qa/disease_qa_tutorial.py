@@ -7,18 +7,28 @@
 # 1. Setup and Dependencies
 # ------------------------
 
+import asyncio
 import requests
 import json
-import pandas as pd
-from IPython.display import HTML, display, IFrame
 import os
 import webbrowser
+from contextlib import nullcontext
 from pathlib import Path
 import logging
 from dotenv import load_dotenv
-from typing import Dict, List, Optional, Union, Any
+from typing import Dict, List, Optional, Union, Any, Tuple
 import sys
 
+try:
+    import sonar_metrics
+except ImportError:
+    sonar_metrics = None
+
+try:
+    import routing
+except ImportError:
+    routing = None
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -38,7 +48,7 @@ load_dotenv()
 
 # Get API key from environment variable or use a placeholder
 API_KEY = os.environ.get('PERPLEXITY_API_KEY', 'API_KEY')
-API_ENDPOINT = 'https://api.perplexity.ai/chat/completions'
+API_ENDPOINT = os.environ.get('PERPLEXITY_BASE_URL', 'https://api.perplexity.ai').rstrip('/') + '/chat/completions'
 
 class ApiError(Exception):
     """Custom exception for API-related errors."""
@@ -96,13 +106,14 @@ Now answer this question:
         }
         
         logger.info(f"Sending request to Perplexity API for question: '{question}'")
-        response = requests.post(API_ENDPOINT, headers=headers, json=payload, timeout=30)
+        with sonar_metrics.track_request("disease_qa", model) if sonar_metrics else nullcontext():
+            response = requests.post(API_ENDPOINT, headers=headers, json=payload, timeout=30)
         
-        # Check for HTTP errors
-        if response.status_code != 200:
-            error_msg = f"API request failed with status code {response.status_code}: {response.text}"
-            logger.error(error_msg)
-            raise ApiError(error_msg)
+            # Check for HTTP errors
+            if response.status_code != 200:
+                error_msg = f"API request failed with status code {response.status_code}: {response.text}"
+                logger.error(error_msg)
+                raise ApiError(error_msg)
         
         result = response.json()
         
@@ -140,6 +151,49 @@ Now answer this question:
         logger.error(f"Unexpected error: {str(e)}")
         raise ApiError(f"Unexpected error: {str(e)}")
 
+# 3b. Model Routing and Hedged Requests (for interactive use)
+# -----------------------------------------------------------
+
+# The Discord bot's router (discord-py-bot/routing.py): sonar for short questions, sonar-pro
+# for longer ones, with slow requests hedged on the faster model
+disease_router = routing.ModelRouter() if routing else None
+
+async def ask_disease_question_routed(
+    question: str,
+    api_key: str = API_KEY,
+    slo_seconds: Optional[float] = None,
+    hedge: bool = True,
+) -> Tuple[Optional[Dict[str, Any]], str]:
+    """
+    Ask a disease question on the model the router picks, hedging it if the answer is slow.
+
+    Each request runs `ask_disease_question` in a worker thread. A `requests` call can't be
+    interrupted, so a losing request finishes in the background and its answer is discarded.
+    Without routing.py on the Python path, the question goes to sonar-pro.
+
+    Returns:
+        The parsed answer and the model that produced it
+
+    Raises:
+        ApiError: If every request failed
+    """
+    if routing is None:
+        return await asyncio.to_thread(ask_disease_question, question, api_key), "sonar-pro"
+
+    async def create(model: str) -> Dict[str, Any]:
+        answer = await asyncio.to_thread(ask_disease_question, question, api_key, model)
+        if answer is None:
+            # An unparseable answer counts as a failure, so the backup request can win
+            raise ApiError(f"No usable answer from {model}")
+        return answer
+
+    def count_hedge(primary: str, backup: str) -> None:
+        sonar_metrics.RETRIES.labels("disease_qa", "hedge").inc()
+
+    return await routing.hedged_completion(
+        disease_router, create, question, slo_seconds, hedge, on_hedge=count_hedge if sonar_metrics else None
+    )
+
 # 4. Create HTML UI File
 # ----------------------
 
@@ -360,7 +414,7 @@ def create_html_ui(api_key: str, output_path: str = "disease_qa.html") -> str:
     // API key from Python notebook
     const API_KEY = '{api_key}';
     // API endpoint as per Perplexity's documentation
-    const API_ENDPOINT = 'https://api.perplexity.ai/chat/completions';
+    const API_ENDPOINT = '{API_ENDPOINT}';
     
     // Cache for previously asked questions
     const questionCache = new Map();
@@ -553,6 +607,10 @@ def display_results(data: Optional[Dict[str, Any]]) -> None:
         logger.warning("No data to display.")
         print("No data to display.")
         return
+
+    # Notebook-only dependencies are imported on first use to keep CLI start-up fast
+    import pandas as pd
+    from IPython.display import display
     
     # Create a DataFrame for the main knowledge card
     df = pd.DataFrame({
@@ -647,6 +705,7 @@ def launch_browser_app():
         
         # Show a preview in the notebook (not all notebook environments support this)
         try:
+            from IPython.display import HTML, IFrame, display
             display(HTML(f'<p>Preview of UI (may not work in all environments):</p>'))
             display(IFrame(path, width='100%', height=600))
         except Exception as e:
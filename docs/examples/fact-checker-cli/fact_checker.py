@@ -10,13 +10,23 @@ import json
 import os
 import re
 import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
 from pathlib import Path
-from typing import Dict, List, Optional, Any
+from typing import Dict, Iterator, List, Optional, Any, Tuple
 
 import requests
-from pydantic import BaseModel, Field
-from newspaper import Article, ArticleException
-from requests.exceptions import RequestException
+from pydantic import BaseModel, Field, ValidationError
+
+try:
+    from orjson import loads
+except ImportError:  # Optional: fall back to the standard library parser
+    from json import loads
+
+try:
+    import usage_ledger
+except ImportError:
+    usage_ledger = None
 
 
 class Claim(BaseModel):
@@ -37,20 +47,33 @@ class FactCheckResult(BaseModel):
 class FactChecker:
     """A class to interact with Perplexity Sonar API for fact checking."""
 
-    API_URL = "https://api.perplexity.ai/chat/completions"
+    API_URL = os.environ.get("PERPLEXITY_BASE_URL", "https://api.perplexity.ai").rstrip("/") + "/chat/completions"
     DEFAULT_MODEL = "sonar-pro"
     PROMPT_FILE = "system_prompt.md"
+    # Name used for this client in the usage ledger
+    USAGE_CLIENT = "fact_checker"
     
     # Models that support structured outputs (ensure your tier has access)
     STRUCTURED_OUTPUT_MODELS = ["sonar", "sonar-pro", "sonar-reasoning", "sonar-reasoning-pro"]
 
-    def __init__(self, api_key: Optional[str] = None, prompt_file: Optional[str] = None):
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        prompt_file: Optional[str] = None,
+        max_chunk_tokens: int = 3000,
+        chunk_overlap_tokens: int = 200,
+        max_concurrent_chunks: int = 8,
+    ):
         """
         Initialize the FactChecker with API key and system prompt.
 
         Args:
             api_key: Perplexity API key. If None, will try to read from file or environment.
             prompt_file: Path to file containing the system prompt. If None, uses default.
+            max_chunk_tokens: Longer texts are split into chunks of about this many tokens.
+            chunk_overlap_tokens: Tokens repeated between neighbouring chunks, so claims
+                spanning a chunk boundary are seen whole.
+            max_concurrent_chunks: Chunks of one text that are fact checked at once.
         """
         self.api_key = api_key or self._get_api_key()
         if not self.api_key:
@@ -59,6 +82,37 @@ class FactChecker:
             )
         
         self.system_prompt = self._load_system_prompt(prompt_file or self.PROMPT_FILE)
+        self.ledger = usage_ledger.UsageLedger.from_env() if usage_ledger else None
+        self.max_chunk_tokens = max_chunk_tokens
+        self.chunk_overlap_tokens = chunk_overlap_tokens
+        self.max_concurrent_chunks = max_concurrent_chunks
+        self.headers = {
+            "accept": "application/json",
+            "content-type": "application/json",
+            "Authorization": f"Bearer {self.api_key}"
+        }
+        # (model, structured) -> serialized request body around the user message
+        self._templates: Dict[Tuple[str, bool], List[str]] = {}
+
+    def _request_body(self, model: str, structured: bool, user_prompt: str) -> bytes:
+        # Long prompt files and the claim schema are encoded once per (model, structured);
+        # each chunk then only pays for encoding its own text
+        template = self._templates.get((model, structured))
+        if template is None:
+            payload = {
+                "model": model,
+                "messages": [
+                    {"role": "system", "content": self.system_prompt},
+                    {"role": "user", "content": "\x00"}
+                ]
+            }
+            if structured:
+                payload["response_format"] = {
+                    "type": "json_schema",
+                    "json_schema": {"schema": FactCheckResult.model_json_schema()},
+                }
+            template = self._templates[(model, structured)] = json.dumps(payload).split(json.dumps("\x00"))
+        return (template[0] + json.dumps(user_prompt) + template[1]).encode("utf-8")
 
     def _get_api_key(self) -> str:
         """
@@ -119,33 +173,53 @@ class FactChecker:
         """
         if not text or not text.strip():
             return {"error": "Input text is empty. Cannot perform fact check."}
-        user_prompt = f"Fact check the following text and identify any false or misleading claims:\n\n{text}"
 
-        headers = {
-            "accept": "application/json",
-            "content-type": "application/json",
-            "Authorization": f"Bearer {self.api_key}"
-        }
+        chunks = split_into_chunks(text, self.max_chunk_tokens, self.chunk_overlap_tokens)
+        if len(chunks) == 1:
+            return self._check_text(text, model, use_structured_output)
+
+        # Long texts: check the chunks concurrently, so latency doesn't grow with length
+        with ThreadPoolExecutor(max_workers=min(self.max_concurrent_chunks, len(chunks))) as pool:
+            results = list(pool.map(
+                lambda part: self._check_text(
+                    part[1], model, use_structured_output, part=(part[0] + 1, len(chunks))
+                ),
+                enumerate(chunks),
+            ))
+        return merge_results(results)
+
+    def _check_text(
+        self,
+        text: str,
+        model: str = DEFAULT_MODEL,
+        use_structured_output: bool = False,
+        part: Optional[Tuple[int, int]] = None,
+    ) -> Dict[str, Any]:
+        """Fact check one piece of text with a single API call; `part` is (index, total) for chunks."""
+        if part:
+            user_prompt = (
+                f"Fact check the following text (part {part[0]} of {part[1]} of a longer article) "
+                f"and identify any false or misleading claims:\n\n{text}"
+            )
+        else:
+            user_prompt = f"Fact check the following text and identify any false or misleading claims:\n\n{text}"
 
-        data = {
-            "model": model,
-            "messages": [
-                {"role": "system", "content": self.system_prompt},
-                {"role": "user", "content": user_prompt}
-            ]
-        }
+        if self.ledger:
+            try:
+                model = self.ledger.select_model(self.USAGE_CLIENT, model)
+            except usage_ledger.BudgetExceeded as e:
+                return {"error": str(e)}
 
         can_use_structured_output = model in self.STRUCTURED_OUTPUT_MODELS and use_structured_output
-        if can_use_structured_output:
-            data["response_format"] = {
-                "type": "json_schema",
-                "json_schema": {"schema": FactCheckResult.model_json_schema()},
-            }
+        body = self._request_body(model, can_use_structured_output, user_prompt)
 
         try:
-            response = requests.post(self.API_URL, headers=headers, json=data)
+            start = time.monotonic()
+            response = requests.post(self.API_URL, headers=self.headers, data=body)
             response.raise_for_status()
-            result = response.json()
+            result = loads(response.content)
+            if self.ledger:
+                self.ledger.record(self.USAGE_CLIENT, model, result.get("usage"), time.monotonic() - start)
             
             citations = result.get("citations", [])
             
@@ -154,11 +228,11 @@ class FactChecker:
                 
                 if can_use_structured_output:
                     try:
-                        parsed = json.loads(content)
+                        parsed = FactCheckResult.model_validate_json(content).model_dump()
                         if citations and "citations" not in parsed:
                             parsed["citations"] = citations
                         return parsed
-                    except json.JSONDecodeError as e:
+                    except ValidationError as e:
                         return {"error": f"Failed to parse structured output: {str(e)}", "raw_response": content, "citations": citations}
                 else:
                     parsed = self._parse_response(content)
@@ -189,12 +263,11 @@ class FactChecker:
         try:
             if "```json" in content:
                 json_content = content.split("```json")[1].split("```")[0].strip()
-                return json.loads(json_content)
             elif "```" in content:
                 json_content = content.split("```")[1].split("```")[0].strip()
-                return json.loads(json_content)
             else:
-                return json.loads(content)
+                json_content = content
+            return loads(json_content)
         except (json.JSONDecodeError, IndexError):
             citations = re.findall(r"Sources?:\s*(.+)", content)
             return {
@@ -203,6 +276,140 @@ class FactChecker:
             }
 
 
+_SENTENCE_RE = re.compile(r"[^.!?\n]*(?:[.!?]+|\n+|$)\s*")
+_WORD_RE = re.compile(r"\w+")
+
+OVERALL_RATINGS = ["MOSTLY_TRUE", "MIXED", "MOSTLY_FALSE"]
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about 4 characters per token for English text)."""
+    return (len(text) + 3) // 4
+
+
+def split_into_chunks(text: str, max_tokens: int, overlap_tokens: int = 0) -> List[str]:
+    """
+    Split text into chunks of at most about `max_tokens`, on sentence boundaries.
+
+    Each chunk starts with the last `overlap_tokens` worth of sentences of the previous
+    chunk. Sentences longer than a whole chunk are cut at the last space that fits.
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return [text]
+
+    max_chars = max_tokens * 4
+    sentences = []
+    for sentence in filter(None, _SENTENCE_RE.findall(text)):
+        while len(sentence) > max_chars:
+            cut = sentence.rfind(" ", 0, max_chars) + 1 or max_chars
+            sentences.append(sentence[:cut])
+            sentence = sentence[cut:]
+        sentences.append(sentence)
+
+    chunks, current, size = [], [], 0
+    for sentence in sentences:
+        tokens = estimate_tokens(sentence)
+        if current and size + tokens > max_tokens:
+            chunks.append("".join(current).strip())
+            # Carry the tail of this chunk over into the next one
+            overlap, overlap_size = [], 0
+            for previous in reversed(current):
+                overlap_size += estimate_tokens(previous)
+                if overlap_size > overlap_tokens or overlap_size + tokens > max_tokens:
+                    break
+                overlap.insert(0, previous)
+            current, size = overlap, sum(estimate_tokens(s) for s in overlap)
+        current.append(sentence)
+        size += tokens
+    if current:
+        chunks.append("".join(current).strip())
+    return chunks
+
+
+def _claim_key(claim: str) -> frozenset:
+    return frozenset(_WORD_RE.findall(claim.lower()))
+
+
+def _is_duplicate(a: frozenset, b: frozenset, threshold: float = 0.8) -> bool:
+    if not a or not b:
+        return a == b
+    return len(a & b) / len(a | b) >= threshold
+
+
+def merge_results(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Merge the fact check results of an article's chunks into one result.
+
+    Claims found in several chunks (e.g. in the overlap) are kept once, with their
+    sources combined. Citation markers like "[2]" in sources, explanations and summaries
+    refer to each chunk's own citation list, so they are renumbered against the merged list.
+    """
+    succeeded = [r for r in results if "error" not in r]
+    if not succeeded:
+        return results[0]
+
+    merged: Dict[str, Any] = {"chunks": len(results)}
+    citations: List[str] = []
+    claims: List[Dict[str, Any]] = []
+    claim_keys: List[frozenset] = []
+    ratings, summaries, raw_responses = [], [], []
+
+    def renumber(source: str, chunk_citations: List[str]) -> str:
+        match = re.fullmatch(r"\[(\d+)\]", source.strip())
+        if not match or not 0 < int(match.group(1)) <= len(chunk_citations):
+            return source
+        url = chunk_citations[int(match.group(1)) - 1]
+        if url not in citations:
+            citations.append(url)
+        return f"[{citations.index(url) + 1}]"
+
+    def renumber_text(text: str, chunk_citations: List[str]) -> str:
+        return re.sub(r"\[\d+\]", lambda m: renumber(m.group(0), chunk_citations), text)
+
+    for result in succeeded:
+        chunk_citations = result.get("citations", [])
+        for url in chunk_citations:
+            if url not in citations:
+                citations.append(url)
+        if result.get("overall_rating") in OVERALL_RATINGS:
+            ratings.append(result["overall_rating"])
+        summary = renumber_text(result.get("summary") or "", chunk_citations)
+        if summary and summary not in summaries:
+            summaries.append(summary)
+        if "raw_response" in result:
+            raw_responses.append(result["raw_response"])
+
+        for claim in result.get("claims", []):
+            claim = dict(
+                claim,
+                explanation=renumber_text(claim.get("explanation", ""), chunk_citations),
+                sources=[renumber(s, chunk_citations) for s in claim.get("sources", [])],
+            )
+            key = _claim_key(claim.get("claim", ""))
+            for kept, kept_key in zip(claims, claim_keys):
+                if _is_duplicate(key, kept_key):
+                    kept["sources"] += [s for s in claim["sources"] if s not in kept["sources"]]
+                    break
+            else:
+                claims.append(claim)
+                claim_keys.append(key)
+
+    if ratings:
+        # Chunks that agree keep their rating; an article with true and false parts is MIXED
+        merged["overall_rating"] = ratings[0] if len(set(ratings)) == 1 else "MIXED"
+    if summaries:
+        merged["summary"] = " ".join(summaries)
+    if claims or ratings:
+        merged["claims"] = claims
+    if raw_responses:
+        merged["raw_response"] = "\n\n".join(raw_responses)
+    if citations:
+        merged["citations"] = citations
+    if len(succeeded) < len(results):
+        merged["chunk_errors"] = [r["error"] for r in results if "error" in r]
+    return merged
+
+
 def display_results(results: Dict[str, Any], format_json: bool = False):
     """
     Display the fact checking results in a human-readable format.
@@ -287,6 +494,45 @@ def display_results(results: Dict[str, Any], format_json: bool = False):
             print(f"  - {citation}")
 
 
+def check_urls(
+    fact_checker: FactChecker,
+    urls: List[str],
+    model: str = FactChecker.DEFAULT_MODEL,
+    use_structured_output: bool = False,
+    concurrency: int = 8,
+    extract_workers: Optional[int] = None,
+    cache=None,
+) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Fact check many articles, yielding (url, results) in completion order.
+
+    Articles are fact checked as soon as they are extracted, so Sonar calls overlap with
+    fetching and parsing the remaining URLs.
+    """
+    from url_ingestion import ingest_urls
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        pending = set()
+
+        def check(article):
+            return article.url, fact_checker.check_claim(
+                article.text, model=model, use_structured_output=use_structured_output
+            )
+
+        for article in ingest_urls(urls, fetch_workers=2 * concurrency, extract_workers=extract_workers, cache=cache):
+            if article.error:
+                yield article.url, {"error": article.error}
+                continue
+            pending.add(pool.submit(check, article))
+            # Hand back finished checks, and stop ingesting while too many are queued
+            done, pending = wait(pending, timeout=0 if len(pending) < 2 * concurrency else None,
+                                 return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+        for future in as_completed(pending):
+            yield future.result()
+
+
 def main():
     """Main entry point for the fact checker CLI."""
     parser = argparse.ArgumentParser(
@@ -296,7 +542,8 @@ def main():
     input_group = parser.add_mutually_exclusive_group(required=True)
     input_group.add_argument("-t", "--text", type=str, help="Text to fact check")
     input_group.add_argument("-f", "--file", type=str, help="Path to file containing text to fact check")
-    input_group.add_argument("-u", "--url", type=str, help="URL of the article to fact check")
+    input_group.add_argument("-u", "--url", type=str, nargs="+", help="URL(s) of articles to fact check")
+    input_group.add_argument("--url-file", type=str, help="File with one article URL per line ('-' for stdin)")
     
     parser.add_argument(
         "-m",
@@ -328,11 +575,42 @@ def main():
         action="store_true", 
         help="Enable structured output format (default is non-structured output)"
     )
+    parser.add_argument(
+        "--max-chunk-tokens",
+        type=int,
+        default=3000,
+        help="Split texts longer than this many tokens into chunks checked concurrently (default: 3000)"
+    )
+    parser.add_argument(
+        "-c",
+        "--concurrency",
+        type=int,
+        default=8,
+        help="Concurrent fact checks when checking several URLs (default: 8)"
+    )
+    parser.add_argument(
+        "--extract-workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Processes used to extract article text from URLs (default: CPU count)"
+    )
+    parser.add_argument(
+        "--cache-dir",
+        type=str,
+        help="Directory for cached article HTML, revalidated with ETag/Last-Modified (default: ~/.cache/fact_checker/html)"
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Do not cache fetched article HTML"
+    )
     
     args = parser.parse_args()
     
     try:
-        fact_checker = FactChecker(api_key=args.api_key, prompt_file=args.prompt_file)
+        fact_checker = FactChecker(
+            api_key=args.api_key, prompt_file=args.prompt_file, max_chunk_tokens=args.max_chunk_tokens
+        )
         
         if args.file:
             try:
@@ -341,28 +619,49 @@ def main():
             except Exception as e:
                 print(f"Error reading file: {e}", file=sys.stderr)
                 return 1
-        elif args.url:
-            try:
-                print(f"Fetching content from URL: {args.url}", file=sys.stderr)
-                response = requests.get(args.url, timeout=15) # Add a timeout
-                response.raise_for_status() # Raise HTTPError for bad responses (4xx or 5xx)
-                
-                article = Article(url=args.url)
-                article.download(input_html=response.text)
-                article.parse()
-                text = article.text
-                if not text:
-                    print(f"Error: Could not extract text from URL: {args.url}", file=sys.stderr)
+        elif args.url or args.url_file:
+            # Imported here so --text and --file runs don't pay for it
+            from url_ingestion import DEFAULT_CACHE_DIR, HTMLCache, ingest_urls
+
+            if args.url_file:
+                try:
+                    with (sys.stdin if args.url_file == "-" else open(args.url_file, "r", encoding="utf-8")) as f:
+                        urls = [line.strip() for line in f if line.strip() and not line.startswith("#")]
+                except Exception as e:
+                    print(f"Error reading URL file: {e}", file=sys.stderr)
                     return 1
-            except RequestException as e:
-                print(f"Error fetching URL: {e}", file=sys.stderr)
-                return 1
-            except ArticleException as e:
-                 print(f"Error parsing article content: {e}", file=sys.stderr)
-                 return 1
-            except Exception as e: # Catch other potential errors during fetch/parse
-                print(f"An unexpected error occurred while processing the URL: {e}", file=sys.stderr)
-                return 1
+            else:
+                urls = args.url
+            cache = None if args.no_cache else HTMLCache(Path(args.cache_dir) if args.cache_dir else DEFAULT_CACHE_DIR)
+
+            if len(urls) == 1:
+                print(f"Fetching content from URL: {urls[0]}", file=sys.stderr)
+                article = next(ingest_urls(urls, extract_workers=1, cache=cache))
+                if article.error:
+                    print(f"Error: {article.error}", file=sys.stderr)
+                    return 1
+                text = article.text
+            else:
+                print(f"Fact checking {len(urls)} URLs...", file=sys.stderr)
+                failures = 0
+                for url, results in check_urls(
+                    fact_checker,
+                    urls,
+                    model=args.model,
+                    use_structured_output=args.structured_output,
+                    concurrency=args.concurrency,
+                    extract_workers=min(args.extract_workers, len(urls)),
+                    cache=cache,
+                ):
+                    failures += "error" in results
+                    if args.json:
+                        # One JSON object per line, in completion order
+                        print(json.dumps({"url": url, **results}), flush=True)
+                    else:
+                        print(f"\n===== {url} =====")
+                        display_results(results)
+                print(f"Checked {len(urls)} URLs, {failures} failed", file=sys.stderr)
+                return 1 if failures else 0
         else: # This corresponds to args.text
             text = args.text
 
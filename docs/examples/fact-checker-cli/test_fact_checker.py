@@ -0,0 +1,60 @@
+"""Tests for merging chunk results. Run with: python -m pytest test_fact_checker.py"""
+
+from fact_checker import merge_results
+
+A, B, C = "https://a.example", "https://b.example", "https://c.example"
+
+
+def claim(text, sources, explanation=""):
+    return {"claim": text, "rating": "FALSE", "explanation": explanation, "sources": sources}
+
+
+def test_citations_are_renumbered_against_the_merged_list():
+    merged = merge_results([
+        {"overall_rating": "MOSTLY_FALSE", "summary": "First chunk [2].", "citations": [A, B],
+         "claims": [claim("The budget was 4.2 billion dollars", ["[1]", "[2]"])]},
+        {"overall_rating": "MOSTLY_FALSE", "summary": "Second chunk [1][2].", "citations": [C, A],
+         "claims": [claim("The mayor resigned in March", ["[1]"], explanation="See [2] and [1].")]},
+    ])
+    assert merged["citations"] == [A, B, C]
+    assert merged["summary"] == "First chunk [2]. Second chunk [3][1]."
+    assert merged["claims"][0]["sources"] == ["[1]", "[2]"]
+    assert merged["claims"][1]["sources"] == ["[3]"]
+    assert merged["claims"][1]["explanation"] == "See [1] and [3]."
+    assert merged["overall_rating"] == "MOSTLY_FALSE"
+    assert merged["chunks"] == 2
+
+
+def test_duplicate_claims_are_kept_once_with_combined_sources():
+    merged = merge_results([
+        {"overall_rating": "MOSTLY_FALSE", "citations": [A, B],
+         "claims": [claim("The city budget was 4.2 billion dollars.", ["[1]"])]},
+        {"overall_rating": "MOSTLY_FALSE", "citations": [B, C],
+         "claims": [claim("the city budget was 4.2 billion dollars", ["[1]", "[2]"]),
+                    claim("Unemployment fell to 3 percent", ["[2]"])]},
+    ])
+    assert [c["claim"] for c in merged["claims"]] == [
+        "The city budget was 4.2 billion dollars.", "Unemployment fell to 3 percent",
+    ]
+    # B is [2] in the merged list, C is [3]
+    assert merged["claims"][0]["sources"] == ["[1]", "[2]", "[3]"]
+
+
+def test_out_of_range_markers_are_left_alone():
+    merged = merge_results([{"citations": [A], "claims": [claim("x", ["[1]", "[7]", "Reuters"])]}])
+    assert merged["claims"][0]["sources"] == ["[1]", "[7]", "Reuters"]
+
+
+def test_disagreeing_chunks_are_mixed_and_errors_are_kept():
+    merged = merge_results([
+        {"overall_rating": "MOSTLY_TRUE", "citations": [], "claims": []},
+        {"error": "timeout"},
+        {"overall_rating": "MOSTLY_FALSE", "citations": [], "claims": []},
+    ])
+    assert merged["overall_rating"] == "MIXED"
+    assert merged["chunk_errors"] == ["timeout"]
+    assert merged["chunks"] == 3
+
+
+def test_all_failed_chunks_return_the_first_error():
+    assert merge_results([{"error": "first"}, {"error": "second"}]) == {"error": "first"}
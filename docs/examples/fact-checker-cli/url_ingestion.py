@@ -0,0 +1,182 @@
+"""
+URL ingestion for the fact checker: concurrent fetching with conditional-GET caching,
+and article text extraction on a process pool.
+
+`ingest_urls()` yields articles as soon as they are extracted, so callers can start
+fact checking the first articles while later URLs are still being fetched and parsed.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from concurrent.futures import FIRST_COMPLETED, Executor, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, Iterator, Optional, Tuple
+
+import requests
+from requests.exceptions import RequestException
+
+DEFAULT_CACHE_DIR = Path.home() / ".cache" / "fact_checker" / "html"
+
+
+@dataclass
+class IngestedArticle:
+    """Extracted text for one URL, or the reason it could not be extracted."""
+    url: str
+    text: str = ""
+    error: Optional[str] = None
+    from_cache: bool = False
+
+
+class HTMLCache:
+    """
+    On-disk cache of fetched pages with their ETag / Last-Modified validators.
+
+    Cached pages are revalidated with a conditional GET; a 304 response reuses the
+    stored HTML without downloading it again.
+    """
+
+    def __init__(self, directory: Path = DEFAULT_CACHE_DIR):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def _paths(self, url: str) -> Tuple[Path, Path]:
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        return self.directory / f"{key}.json", self.directory / f"{key}.html"
+
+    def validators(self, url: str) -> dict:
+        """Conditional request headers for a cached URL (empty if not cached)."""
+        meta_path, html_path = self._paths(url)
+        try:
+            meta = json.loads(meta_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return {}
+        if not html_path.exists():
+            return {}
+        headers = {}
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+        return headers
+
+    def load(self, url: str) -> str:
+        return self._paths(url)[1].read_text(encoding="utf-8")
+
+    def store(self, url: str, response: requests.Response) -> None:
+        etag, last_modified = response.headers.get("ETag"), response.headers.get("Last-Modified")
+        if not etag and not last_modified:
+            return  # Nothing to revalidate with
+        meta_path, html_path = self._paths(url)
+        meta = {"url": url, "etag": etag, "last_modified": last_modified}
+        # Write to temp files and rename, so concurrent readers never see partial files
+        for path, content in ((html_path, response.text), (meta_path, json.dumps(meta))):
+            fd, tmp = tempfile.mkstemp(dir=self.directory)
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(content)
+            os.replace(tmp, path)
+
+
+_local = threading.local()
+
+
+def _session() -> requests.Session:
+    # One session per fetch thread, so connections to the same host are reused
+    if not hasattr(_local, "session"):
+        _local.session = requests.Session()
+    return _local.session
+
+
+def fetch_html(url: str, cache: Optional[HTMLCache] = None, timeout: float = 15) -> Tuple[str, bool]:
+    """Fetch a page, revalidating a cached copy if there is one. Returns (html, from_cache)."""
+    headers = cache.validators(url) if cache else {}
+    response = _session().get(url, headers=headers, timeout=timeout)
+    if response.status_code == 304:
+        if not headers:
+            # Only a conditional GET may be answered with 304; there is no page to use or cache
+            raise requests.HTTPError(f"304 Not Modified for an unconditional request: {url}", response=response)
+        return cache.load(url), True
+    response.raise_for_status()
+    if cache:
+        cache.store(url, response)
+    return response.text, False
+
+
+def extract_text(url: str, html: str) -> str:
+    """Extract the article text from a page (runs in a worker process)."""
+    from newspaper import Article
+
+    article = Article(url=url)
+    article.download(input_html=html)
+    article.parse()
+    return article.text
+
+
+def ingest_urls(
+    urls: Iterable[str],
+    fetch_workers: int = 16,
+    extract_workers: Optional[int] = None,
+    cache: Optional[HTMLCache] = None,
+    timeout: float = 15,
+) -> Iterator[IngestedArticle]:
+    """
+    Fetch and extract articles concurrently, yielding them in completion order.
+
+    Pages are fetched on a thread pool and parsed on a process pool of `extract_workers`
+    processes (default: one per CPU; 0 or 1 parses in a thread instead, which is cheaper
+    for a handful of URLs). Only a bounded number of URLs are in flight at a time, so a
+    slow consumer holds back fetching instead of piling up pages in memory.
+    """
+    if extract_workers is None:
+        extract_workers = os.cpu_count() or 1
+    window = fetch_workers + 2 * max(extract_workers, 1)
+    pending_urls = iter(urls)
+
+    extract_pool: Executor = (
+        ProcessPoolExecutor(extract_workers) if extract_workers > 1 else ThreadPoolExecutor(1)
+    )
+    with ThreadPoolExecutor(fetch_workers) as fetch_pool, extract_pool:
+        fetching, extracting = {}, {}
+
+        def refill() -> None:
+            while len(fetching) + len(extracting) < window:
+                url = next(pending_urls, None)
+                if url is None:
+                    return
+                fetching[fetch_pool.submit(fetch_html, url, cache, timeout)] = url
+
+        refill()
+        while fetching or extracting:
+            done, _ = wait([*fetching, *extracting], return_when=FIRST_COMPLETED)
+            for future in done:
+                if future in fetching:
+                    url = fetching.pop(future)
+                    try:
+                        html, from_cache = future.result()
+                    except RequestException as e:
+                        yield IngestedArticle(url, error=f"Could not fetch URL: {e}")
+                        continue
+                    except Exception as e:
+                        # E.g. a bad URL or a cache write error: report it for this URL only
+                        yield IngestedArticle(url, error=f"Could not fetch URL: {type(e).__name__}: {e}")
+                        continue
+                    try:
+                        extracting[extract_pool.submit(extract_text, url, html)] = (url, from_cache)
+                    except Exception as e:
+                        # A crashed worker breaks the process pool; report the URL instead of stopping
+                        yield IngestedArticle(url, error=f"Could not parse article content: {e}")
+                else:
+                    url, from_cache = extracting.pop(future)
+                    try:
+                        text = future.result()
+                    except Exception as e:
+                        yield IngestedArticle(url, error=f"Could not parse article content: {e}")
+                        continue
+                    if not text:
+                        yield IngestedArticle(url, error=f"Could not extract text from URL: {url}")
+                    else:
+                        yield IngestedArticle(url, text=text, from_cache=from_cache)
+            refill()
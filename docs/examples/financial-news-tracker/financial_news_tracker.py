@@ -8,12 +8,23 @@ import argparse
 import json
 import os
 import sys
+import time
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Tuple
 
 import requests
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, ValidationError
+
+try:
+    from orjson import loads
+except ImportError:  # Optional: fall back to the standard library parser
+    from json import loads
+
+try:
+    import usage_ledger
+except ImportError:
+    usage_ledger = None
 
 
 class NewsItem(BaseModel):
@@ -46,12 +57,18 @@ class FinancialNewsResult(BaseModel):
 class FinancialNewsTracker:
     """A class to interact with Perplexity Sonar API for financial news tracking."""
 
-    API_URL = "https://api.perplexity.ai/chat/completions"
+    API_URL = os.environ.get("PERPLEXITY_BASE_URL", "https://api.perplexity.ai").rstrip("/") + "/chat/completions"
     DEFAULT_MODEL = "sonar-pro"
+    # Name used for this client in the usage ledger
+    USAGE_CLIENT = "financial_news_tracker"
     
     # Models that support structured outputs
     STRUCTURED_OUTPUT_MODELS = ["sonar", "sonar-pro", "sonar-reasoning", "sonar-reasoning-pro"]
 
+    SYSTEM_PROMPT = """You are a professional financial analyst with expertise in market research and news analysis. 
+        Your task is to provide comprehensive financial news updates and market analysis. 
+        Focus on accuracy, relevance, and actionable insights. Always cite recent sources and provide balanced analysis."""
+
     def __init__(self, api_key: Optional[str] = None):
         """
         Initialize the FinancialNewsTracker with API key.
@@ -64,6 +81,32 @@ class FinancialNewsTracker:
             raise ValueError(
                 "API key not found. Please provide via argument or environment variable PPLX_API_KEY."
             )
+        self.headers = {
+            "accept": "application/json",
+            "content-type": "application/json",
+            "Authorization": f"Bearer {self.api_key}"
+        }
+        self.ledger = usage_ledger.UsageLedger.from_env() if usage_ledger else None
+        self._templates: Dict[Tuple[str, bool], List[str]] = {}
+
+    def _request_body(self, model: str, structured: bool, user_prompt: str) -> bytes:
+        # FinancialNewsResult's schema is large; serialize it with the fixed prompt once per model
+        template = self._templates.get((model, structured))
+        if template is None:
+            payload = {
+                "model": model,
+                "messages": [
+                    {"role": "system", "content": self.SYSTEM_PROMPT},
+                    {"role": "user", "content": "\x00"}
+                ]
+            }
+            if structured:
+                payload["response_format"] = {
+                    "type": "json_schema",
+                    "json_schema": {"schema": FinancialNewsResult.model_json_schema()},
+                }
+            template = self._templates[(model, structured)] = json.dumps(payload).split(json.dumps("\x00"))
+        return (template[0] + json.dumps(user_prompt) + template[1]).encode("utf-8")
 
     def _get_api_key(self) -> str:
         """
@@ -108,10 +151,6 @@ class FinancialNewsTracker:
         if not query or not query.strip():
             return {"error": "Query is empty. Please provide a financial topic to search."}
 
-        system_prompt = """You are a professional financial analyst with expertise in market research and news analysis. 
-        Your task is to provide comprehensive financial news updates and market analysis. 
-        Focus on accuracy, relevance, and actionable insights. Always cite recent sources and provide balanced analysis."""
-
         time_context = self._get_time_context(time_range)
         
         user_prompt = f"""Provide a comprehensive financial news update and analysis for: {query}
@@ -127,31 +166,22 @@ Please include:
 
 Focus on the most significant and recent developments."""
 
-        headers = {
-            "accept": "application/json",
-            "content-type": "application/json",
-            "Authorization": f"Bearer {self.api_key}"
-        }
-
-        data = {
-            "model": model,
-            "messages": [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ]
-        }
+        if self.ledger:
+            try:
+                model = self.ledger.select_model(self.USAGE_CLIENT, model)
+            except usage_ledger.BudgetExceeded as e:
+                return {"error": str(e)}
 
         can_use_structured_output = model in self.STRUCTURED_OUTPUT_MODELS and use_structured_output
-        if can_use_structured_output:
-            data["response_format"] = {
-                "type": "json_schema",
-                "json_schema": {"schema": FinancialNewsResult.model_json_schema()},
-            }
+        body = self._request_body(model, can_use_structured_output, user_prompt)
 
         try:
-            response = requests.post(self.API_URL, headers=headers, json=data)
+            start = time.monotonic()
+            response = requests.post(self.API_URL, headers=self.headers, data=body)
             response.raise_for_status()
-            result = response.json()
+            result = loads(response.content)
+            if self.ledger:
+                self.ledger.record(self.USAGE_CLIENT, model, result.get("usage"), time.monotonic() - start)
             
             citations = result.get("citations", [])
             
@@ -160,11 +190,11 @@ Focus on the most significant and recent developments."""
                 
                 if can_use_structured_output:
                     try:
-                        parsed = json.loads(content)
+                        parsed = FinancialNewsResult.model_validate_json(content).model_dump()
                         if citations and "citations" not in parsed:
                             parsed["citations"] = citations
                         return parsed
-                    except json.JSONDecodeError as e:
+                    except ValidationError as e:
                         return {"error": f"Failed to parse structured output: {str(e)}", "raw_response": content, "citations": citations}
                 else:
                     parsed = self._parse_response(content)
@@ -218,13 +248,12 @@ Focus on the most significant and recent developments."""
             # Try to extract JSON if present
             if "```json" in content:
                 json_content = content.split("```json")[1].split("```")[0].strip()
-                return json.loads(json_content)
             elif "```" in content:
                 json_content = content.split("```")[1].split("```")[0].strip()
-                return json.loads(json_content)
             else:
                 # Fallback to returning raw content
                 return {"raw_response": content}
+            return loads(json_content)
         except (json.JSONDecodeError, IndexError):
             return {"raw_response": content}
 
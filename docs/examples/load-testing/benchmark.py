@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+"""
+End-to-end benchmark for the cookbook clients against the local fake Sonar server.
+
+Each scenario drives one example's entry point (the CLI `main()` functions, the chat
+memory functions and the disease Q&A function) at a fixed concurrency, in its own
+subprocess so peak RSS and import time belong to that example alone. Results are
+written as JSON, keyed by git commit, so runs can be compared across commits:
+
+  python benchmark.py --requests 500 --concurrency 32 --latency fixed:50
+  python benchmark.py --compare benchmark-results/<baseline>.json --max-regression 10
+
+Examples whose dependencies are not installed are reported as skipped.
+"""
+
+import argparse
+import importlib
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from fake_sonar_server import FIXTURES_DIR, FakeSonarServer, LatencyDistribution, ServerConfig, load_fixtures
+
+DOCS_DIR = Path(__file__).resolve().parents[2]
+BENCHMARK_API_KEY = "benchmark-key"
+
+QUESTIONS = [
+    "What's the current weather in London?",
+    "What about tomorrow's forecast?",
+    "Which museums are open on Sunday?",
+    "How do I get from Heathrow to the city centre?",
+]
+
+
+def _cli_main(*args: str) -> Callable[[Any], Callable[[int], bool]]:
+    """Call a CLI module's `main()` with fixed arguments; success is a zero exit code."""
+    def setup(module):
+        # Every call parses the same argv, so threads can share it
+        sys.argv = [f"{module.__name__}.py", *args]
+
+        def call(i: int) -> bool:
+            try:
+                code = module.main()
+            except SystemExit as e:
+                code = e.code
+            return not code
+        return call
+    return setup
+
+
+def _chat_with_memory(module):
+    def call(i: int) -> bool:
+        return bool(module.chat_with_memory(QUESTIONS[i % len(QUESTIONS)], session_id=f"bench-{i % 64}"))
+    return call
+
+
+def _chat_with_persistence(module):
+    index = module.initialize_chat_session()
+
+    def call(i: int) -> bool:
+        return bool(module.chat_with_persistence(QUESTIONS[i % len(QUESTIONS)], index, session_id=f"bench-{i % 64}"))
+    return call
+
+
+def _disease_qa(module):
+    def call(i: int) -> bool:
+        return module.ask_disease_question("What is diabetes?", api_key=BENCHMARK_API_KEY) is not None
+    return call
+
+
+@dataclass
+class Scenario:
+    directory: str
+    module: str
+    setup: Callable[[Any], Callable[[int], bool]]
+
+
+SCENARIOS: Dict[str, Scenario] = {
+    "fact_checker": Scenario(
+        "examples/fact-checker-cli", "fact_checker", _cli_main("--text", "The Earth is flat", "--json")
+    ),
+    "financial_news_tracker": Scenario(
+        "examples/financial-news-tracker", "financial_news_tracker", _cli_main("tech stocks", "--json")
+    ),
+    "research_finder": Scenario(
+        "examples/research-finder", "research_finder", _cli_main("quantum computing advances", "--json")
+    ),
+    "daily_knowledge_bot": Scenario(
+        "examples/daily-knowledge-bot", "daily_knowledge_bot", _cli_main()
+    ),
+    "chat_with_memory": Scenario(
+        "articles/memory-management/chat-summary-memory-buffer/scripts", "chat_memory_buffer", _chat_with_memory
+    ),
+    "chat_with_persistence": Scenario(
+        "articles/memory-management/chat-with-persistence/scripts", "chat_with_persistence", _chat_with_persistence
+    ),
+    "disease_qa": Scenario(
+        "examples/disease-qa", "disease_qa_tutorial", _disease_qa
+    ),
+}
+
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def peak_rss_mb() -> Optional[float]:
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def run_worker(name: str, requests: int, concurrency: int, warmup: int) -> Dict[str, Any]:
+    """Run one scenario in this process (called in a subprocess by `run_scenario`)."""
+    scenario = SCENARIOS[name]
+    sys.path.insert(0, str(DOCS_DIR / scenario.directory))
+    try:
+        module = importlib.import_module(scenario.module)
+        call = scenario.setup(module)
+    except ImportError as e:
+        return {"skipped": f"{type(e).__name__}: {e}"}
+
+    for i in range(warmup):
+        call(i)
+
+    def timed(i: int):
+        start = time.perf_counter()
+        try:
+            ok = call(i)
+        except Exception:
+            ok = False
+        return time.perf_counter() - start, ok
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        outcomes = list(pool.map(timed, range(requests)))
+    elapsed = time.perf_counter() - start
+
+    latencies = [seconds * 1000 for seconds, _ in outcomes]
+    return {
+        "requests": requests,
+        "errors": sum(1 for _, ok in outcomes if not ok),
+        "duration_s": round(elapsed, 3),
+        "throughput_rps": round(requests / elapsed, 2),
+        "latency_ms": {
+            "mean": round(statistics.fmean(latencies), 2),
+            "p50": round(percentile(latencies, 50), 2),
+            "p90": round(percentile(latencies, 90), 2),
+            "p95": round(percentile(latencies, 95), 2),
+            "p99": round(percentile(latencies, 99), 2),
+            "max": round(max(latencies), 2),
+        },
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def measure_import(scenario: Scenario, env: Dict[str, str], cwd: str, runs: int) -> Optional[float]:
+    """Median cold import time in ms, each run in a fresh interpreter."""
+    code = (
+        "import sys, time; sys.path.insert(0, sys.argv[1]); start = time.perf_counter(); "
+        f"import {scenario.module}; print((time.perf_counter() - start) * 1000)"
+    )
+    timings = []
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, "-c", code, str(DOCS_DIR / scenario.directory)],
+            env=env, cwd=cwd, capture_output=True, text=True,
+        )
+        if result.returncode != 0:
+            return None
+        timings.append(float(result.stdout.strip().splitlines()[-1]))
+    return round(statistics.median(timings), 1)
+
+
+def run_scenario(name: str, args: argparse.Namespace, base_url: str) -> Dict[str, Any]:
+    env = dict(
+        os.environ,
+        PERPLEXITY_BASE_URL=base_url,
+        PPLX_API_KEY=BENCHMARK_API_KEY,
+        PERPLEXITY_API_KEY=BENCHMARK_API_KEY,
+    )
+    # Scenarios write logs, facts and chat stores to their working directory
+    with tempfile.TemporaryDirectory() as cwd:
+        out = Path(cwd) / "result.json"
+        command = [
+            sys.executable, str(Path(__file__).resolve()), "--worker", name, "--worker-output", str(out),
+            "--requests", str(args.requests), "--concurrency", str(args.concurrency), "--warmup", str(args.warmup),
+        ]
+        try:
+            proc = subprocess.run(
+                command, env=env, cwd=cwd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                text=True, timeout=args.timeout,
+            )
+        except subprocess.TimeoutExpired:
+            return {"error": f"timed out after {args.timeout}s"}
+        if proc.returncode != 0 or not out.exists():
+            return {"error": (proc.stderr.strip().splitlines() or ["worker failed"])[-1]}
+        result = json.loads(out.read_text())
+        if "skipped" not in result:
+            result["import_ms"] = measure_import(SCENARIOS[name], env, cwd, args.import_runs)
+        return result
+
+
+def git_info() -> Dict[str, Any]:
+    def git(*cmd: str) -> str:
+        return subprocess.run(["git", *cmd], cwd=DOCS_DIR, capture_output=True, text=True).stdout.strip()
+    try:
+        return {"commit": git("rev-parse", "HEAD") or None, "dirty": bool(git("status", "--porcelain"))}
+    except OSError:
+        return {"commit": None, "dirty": None}
+
+
+def print_results(results: Dict[str, Dict[str, Any]]) -> None:
+    header = f"{'scenario':<24} {'rps':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7} {'rss MB':>8} {'import ms':>10}"
+    print(header)
+    print("-" * len(header))
+    for name, result in results.items():
+        if "latency_ms" not in result:
+            print(f"{name:<24} {result.get('skipped') or result.get('error')}")
+            continue
+        latency = result["latency_ms"]
+        print(
+            f"{name:<24} {result['throughput_rps']:>8.1f} {latency['p50']:>9.1f} {latency['p95']:>9.1f} "
+            f"{latency['p99']:>9.1f} {result['errors']:>7} {result['peak_rss_mb'] or 0:>8.1f} "
+            f"{result['import_ms'] or 0:>10.1f}"
+        )
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], max_regression: float) -> bool:
+    """Print changes against a baseline run; returns False if any metric regressed too much."""
+    # (metric, getter, higher is better)
+    metrics = [
+        ("throughput_rps", lambda r: r["throughput_rps"], True),
+        ("p95 ms", lambda r: r["latency_ms"]["p95"], False),
+        ("peak_rss_mb", lambda r: r["peak_rss_mb"], False),
+        ("import_ms", lambda r: r["import_ms"], False),
+    ]
+    print(f"\nCompared with {baseline.get('commit') or 'baseline'}:")
+    ok = True
+    for name, result in current["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(name, {})
+        if "latency_ms" not in result or "latency_ms" not in before:
+            continue
+        for metric, get, higher_is_better in metrics:
+            old, new = get(before), get(result)
+            if not old or new is None:
+                continue
+            change = (new - old) / old * 100
+            regressed = (-change if higher_is_better else change) > max_regression
+            ok = ok and not regressed
+            flag = "  REGRESSION" if regressed else ""
+            print(f"  {name:<24} {metric:<15} {old:>10.1f} -> {new:>10.1f} ({change:+.1f}%){flag}")
+    return ok
+
+
+def main():
+    """Main entry point for the benchmark."""
+    parser = argparse.ArgumentParser(description="Benchmark the cookbook clients against a local fake Sonar server")
+    parser.add_argument("scenarios", nargs="*", help=f"Scenarios to run (default: all of {', '.join(SCENARIOS)})")
+    parser.add_argument("-n", "--requests", type=int, default=200, help="Requests per scenario (default: 200)")
+    parser.add_argument("-c", "--concurrency", type=int, default=16, help="Concurrent callers (default: 16)")
+    parser.add_argument("--warmup", type=int, default=2, help="Untimed calls before measuring (default: 2)")
+    parser.add_argument("--latency", default="fixed:50",
+                        help="Fake server time to first byte, see fake_sonar_server.py (default: fixed:50)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fake server injected error rate")
+    parser.add_argument("--import-runs", type=int, default=3, help="Cold imports timed per scenario (default: 3)")
+    parser.add_argument("--timeout", type=float, default=600, help="Seconds before a scenario is abandoned")
+    parser.add_argument("-o", "--output", help="Results file (default: benchmark-results/<commit>.json)")
+    parser.add_argument("--compare", help="Baseline results file to compare against")
+    parser.add_argument("--max-regression", type=float, default=10.0,
+                        help="Percent change that fails --compare (default: 10)")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    parser.add_argument("--worker-output", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        result = run_worker(args.worker, args.requests, args.concurrency, args.warmup)
+        Path(args.worker_output).write_text(json.dumps(result))
+        return 0
+
+    unknown = [name for name in args.scenarios if name not in SCENARIOS]
+    if unknown:
+        print(f"Error: unknown scenario(s) {', '.join(unknown)}; choose from {', '.join(SCENARIOS)}", file=sys.stderr)
+        return 1
+
+    baseline = None
+    if args.compare:
+        # Read it before running, since the new results may be written to the same file
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    config = ServerConfig(
+        latency=LatencyDistribution(args.latency),
+        error_rate=args.error_rate,
+        fixtures=load_fixtures(FIXTURES_DIR),
+        seed=0,
+    )
+    results = {}
+    with FakeSonarServer(config) as server:
+        for name in args.scenarios or SCENARIOS:
+            print(f"Running {name}...", file=sys.stderr)
+            results[name] = run_scenario(name, args, server.base_url)
+
+    run = {
+        **git_info(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "warmup": args.warmup,
+            "latency": args.latency,
+            "error_rate": args.error_rate,
+        },
+        "scenarios": results,
+    }
+    print_results(results)
+
+    output = Path(args.output or f"benchmark-results/{(run['commit'] or 'unknown')[:12]}.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(run, indent=2) + "\n")
+    print(f"\nResults saved to {output}", file=sys.stderr)
+
+    if baseline is not None:
+        if baseline.get("config") != run["config"]:
+            print("Warning: baseline was run with a different configuration", file=sys.stderr)
+        if not compare(run, baseline, args.max_regression):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,468 @@
+#!/usr/bin/env python3
+"""
+Record and replay HTTP traffic of the requests-based clients for offline performance tuning.
+
+A cassette hooks into the `requests` transport (`HTTPAdapter.send`), so FactChecker,
+ResearchAssistant and the other requests-based clients need no changes. Recording
+captures every request/response pair with its time to first byte and the arrival time
+of each body chunk (which preserves the cadence of SSE streams) into a gzip-compressed
+JSON Lines file. Replay serves the recorded responses at their original pace, or
+faster, so parsing, rendering and concurrency can be profiled deterministically offline.
+
+  python cassette.py record slow-article.cassette.gz fact_checker -- --url https://example.com/story
+  python cassette.py replay slow-article.cassette.gz fact_checker --speed 10 --profile -- --url https://example.com/story
+  python cassette.py info slow-article.cassette.gz
+
+Authorization and cookie headers are never written to a cassette.
+"""
+
+import argparse
+import base64
+import cProfile
+import gzip
+import hashlib
+import importlib
+import json
+import os
+import pstats
+import statistics
+import sys
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple, Union
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+EXAMPLES_DIR = Path(__file__).resolve().parent.parent
+CASSETTE_VERSION = 1
+
+# Never written to a cassette
+REDACTED_HEADERS = {"authorization", "proxy-authorization", "cookie", "set-cookie", "x-api-key"}
+# Recorded bodies are stored decoded, so these no longer describe them
+DECODED_BODY_HEADERS = {"content-encoding", "transfer-encoding", "content-length"}
+
+
+class CassetteMiss(requests.exceptions.ConnectionError):
+    """A replayed request has no recorded response."""
+    pass
+
+
+@dataclass
+class Target:
+    directory: str
+    module: str
+
+
+TARGETS: Dict[str, Target] = {
+    "fact_checker": Target("fact-checker-cli", "fact_checker"),
+    "research_finder": Target("research-finder", "research_finder"),
+    "financial_news_tracker": Target("financial-news-tracker", "financial_news_tracker"),
+    "daily_knowledge_bot": Target("daily-knowledge-bot", "daily_knowledge_bot"),
+}
+
+
+def _encode(data: bytes) -> Union[str, Dict[str, str]]:
+    try:
+        return data.decode("utf-8")
+    except UnicodeDecodeError:
+        return {"b64": base64.b64encode(data).decode("ascii")}
+
+
+def _decode(value: Union[str, Dict[str, str]]) -> bytes:
+    return value.encode("utf-8") if isinstance(value, str) else base64.b64decode(value["b64"])
+
+
+def _body_bytes(body: Union[bytes, str, None]) -> bytes:
+    if body is None:
+        return b""
+    return body.encode("utf-8") if isinstance(body, str) else bytes(body)
+
+
+def _request_key(method: str, url: str, body: bytes) -> Tuple[str, str, str]:
+    return method, url, hashlib.sha256(body).hexdigest()
+
+
+def _wait_until(deadline: float) -> None:
+    remaining = deadline - time.perf_counter()
+    if remaining > 0:
+        time.sleep(remaining)
+
+
+class _RecordingBody:
+    """Wraps a live response body and timestamps each chunk as the client reads it."""
+
+    def __init__(self, raw, start: float, on_done):
+        self._raw = raw
+        self._start = start
+        self._on_done = on_done
+        self._chunks: List[list] = []
+        self._done = False
+
+    def _add(self, data: bytes) -> bytes:
+        if data:
+            self._chunks.append([round(time.perf_counter() - self._start, 6), _encode(data)])
+        return data
+
+    def _finish(self) -> None:
+        if not self._done:
+            self._done = True
+            self._on_done(self._chunks)
+
+    def stream(self, amt: Optional[int] = None, decode_content: Optional[bool] = None) -> Iterator[bytes]:
+        # Chunked (e.g. SSE) responses yield one HTTP chunk at a time, so their cadence is kept
+        for data in self._raw.stream(amt, decode_content=True):
+            yield self._add(data)
+        self._finish()
+
+    def read(self, amt: Optional[int] = None, *args, **kwargs) -> bytes:
+        data = self._add(self._raw.read(amt, decode_content=True))
+        if not data and amt != 0:
+            self._finish()
+        return data
+
+    def close(self) -> None:
+        self._finish()
+        self._raw.close()
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+
+class _ReplayBody:
+    """Serves recorded body chunks at their recorded times, scaled by the replay speed."""
+
+    _original_response = None  # No cookies to extract
+
+    def __init__(self, chunks: List[list], start: float, speed: float):
+        self._chunks = deque(chunks)
+        self._start = start
+        self._speed = speed
+        self._buffer = b""
+        self.closed = False
+
+    def _next_chunk(self) -> bytes:
+        at, value = self._chunks.popleft()
+        if self._speed:
+            _wait_until(self._start + at / self._speed)
+        return _decode(value)
+
+    def stream(self, amt: Optional[int] = None, decode_content: Optional[bool] = None) -> Iterator[bytes]:
+        if self._buffer:
+            data, self._buffer = self._buffer, b""
+            yield data
+        while self._chunks:
+            yield self._next_chunk()
+
+    def read(self, amt: Optional[int] = None, *args, **kwargs) -> bytes:
+        while self._chunks and (amt is None or len(self._buffer) < amt):
+            self._buffer += self._next_chunk()
+        if amt is None:
+            amt = len(self._buffer)
+        data, self._buffer = self._buffer[:amt], self._buffer[amt:]
+        return data
+
+    def close(self) -> None:
+        self.closed = True
+
+    def release_conn(self) -> None:
+        pass
+
+
+class Cassette:
+    """
+    A set of recorded HTTP interactions.
+
+    In record mode, `send()` passes requests through to the network and records them; in
+    replay mode it answers them from the recording. Use `use_cassette()` to route all
+    `requests` traffic through a cassette.
+    """
+
+    def __init__(self, path: Union[str, Path], mode: str = "replay", speed: float = 1.0, strict: bool = True):
+        """
+        Args:
+            path: Cassette file (gzip-compressed JSON Lines)
+            mode: "record" or "replay"
+            speed: Replay speed: 1 replays at the recorded pace, 10 ten times faster,
+                0 without any waiting
+            strict: In replay mode, only answer requests whose method, URL and body match
+                a recording. Otherwise fall back to the next recording for the same
+                method and URL path.
+        """
+        if mode not in ("record", "replay"):
+            raise ValueError(f"mode must be 'record' or 'replay', got {mode!r}")
+        self.path = Path(path)
+        self.mode = mode
+        self.speed = speed
+        self.strict = strict
+        self.metadata: Dict[str, Any] = {}
+        self.interactions: List[Dict[str, Any]] = []
+        self.replayed = 0
+        self._lock = threading.Lock()
+        self._t0 = time.perf_counter()
+        self._by_key: Dict[Tuple[str, str, str], Deque[Dict[str, Any]]] = defaultdict(deque)
+        self._by_path: Dict[Tuple[str, str], Deque[Dict[str, Any]]] = defaultdict(deque)
+        if mode == "replay":
+            self._load()
+
+    def _load(self) -> None:
+        with gzip.open(self.path, "rt", encoding="utf-8") as f:
+            self.metadata = json.loads(f.readline())
+            if self.metadata.get("version") != CASSETTE_VERSION:
+                raise ValueError(f"{self.path}: unsupported cassette version {self.metadata.get('version')}")
+            self.interactions = [json.loads(line) for line in f if line.strip()]
+        for entry in self.interactions:
+            request = entry["request"]
+            self._by_key[(request["method"], request["url"], request["body_sha256"])].append(entry)
+            self._by_path[(request["method"], request["url"].split("?")[0])].append(entry)
+
+    def save(self, **metadata: Any) -> None:
+        """Write the recorded interactions, in the order the requests were sent."""
+        self.metadata = {
+            "version": CASSETTE_VERSION,
+            "recorded_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "interactions": len(self.interactions),
+            **metadata,
+        }
+        with self._lock:
+            entries = sorted(self.interactions, key=lambda e: e["started"])
+        with gzip.open(self.path, "wt", encoding="utf-8") as f:
+            f.write(json.dumps(self.metadata) + "\n")
+            for entry in entries:
+                f.write(json.dumps(entry) + "\n")
+
+    def send(self, real_send, adapter: HTTPAdapter, request: requests.PreparedRequest, **kwargs) -> requests.Response:
+        if self.mode == "record":
+            return self._record(real_send, adapter, request, **kwargs)
+        return self._replay(adapter, request)
+
+    def _record(self, real_send, adapter, request, **kwargs) -> requests.Response:
+        start = time.perf_counter()
+        body = _body_bytes(request.body)
+        entry: Dict[str, Any] = {
+            "started": round(start - self._t0, 6),
+            "request": {
+                "method": request.method,
+                "url": request.url,
+                "headers": {k: v for k, v in request.headers.items() if k.lower() not in REDACTED_HEADERS},
+                "body": _encode(body),
+                "body_sha256": hashlib.sha256(body).hexdigest(),
+            },
+        }
+        try:
+            response = real_send(adapter, request, **kwargs)
+        except requests.exceptions.RequestException as e:
+            entry["error"] = {"type": type(e).__name__, "message": str(e), "after": round(time.perf_counter() - start, 6)}
+            with self._lock:
+                self.interactions.append(entry)
+            raise
+
+        entry["response"] = {
+            "status": response.status_code,
+            "reason": response.reason,
+            "headers": {
+                k: v for k, v in response.headers.items()
+                if k.lower() not in REDACTED_HEADERS and k.lower() not in DECODED_BODY_HEADERS
+            },
+            "ttfb": round(time.perf_counter() - start, 6),
+        }
+
+        def done(chunks: List[list]) -> None:
+            entry["response"]["chunks"] = chunks
+            with self._lock:
+                self.interactions.append(entry)
+
+        response.raw = _RecordingBody(response.raw, start, done)
+        return response
+
+    def _match(self, request: requests.PreparedRequest) -> Optional[Dict[str, Any]]:
+        body = _body_bytes(request.body)
+        with self._lock:
+            queue = self._by_key.get(_request_key(request.method, request.url, body))
+            if not queue and not self.strict:
+                queue = self._by_path.get((request.method, request.url.split("?")[0]))
+            if not queue:
+                return None
+            entry = queue[0]
+            # Each recording is answered once, whichever way it was matched
+            self._discard(entry)
+            self.replayed += 1
+            return entry
+
+    def _discard(self, entry: Dict[str, Any]) -> None:
+        request = entry["request"]
+        for queue in (
+            self._by_key[(request["method"], request["url"], request["body_sha256"])],
+            self._by_path[(request["method"], request["url"].split("?")[0])],
+        ):
+            try:
+                queue.remove(entry)
+            except ValueError:
+                pass
+
+    def _replay(self, adapter: HTTPAdapter, request: requests.PreparedRequest) -> requests.Response:
+        start = time.perf_counter()
+        entry = self._match(request)
+        if entry is None:
+            raise CassetteMiss(f"No recorded response for {request.method} {request.url}", request=request)
+
+        if "error" in entry:
+            if self.speed:
+                _wait_until(start + entry["error"]["after"] / self.speed)
+            error_class = getattr(requests.exceptions, entry["error"]["type"], requests.exceptions.ConnectionError)
+            raise error_class(entry["error"]["message"], request=request)
+
+        recorded = entry["response"]
+        if self.speed:
+            _wait_until(start + recorded["ttfb"] / self.speed)
+        response = requests.Response()
+        response.status_code = recorded["status"]
+        response.reason = recorded["reason"]
+        response.headers = CaseInsensitiveDict(recorded["headers"])
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.raw = _ReplayBody(recorded.get("chunks", []), start, self.speed)
+        response.url = request.url
+        response.request = request
+        response.connection = adapter
+        return response
+
+
+@contextmanager
+def use_cassette(path: Union[str, Path], mode: str = "replay", speed: float = 1.0, strict: bool = True, **metadata: Any):
+    """Route all `requests` traffic through a cassette; a recording is saved on exit."""
+    cassette = Cassette(path, mode, speed, strict)
+    real_send = HTTPAdapter.send
+
+    def send(adapter, request, **kwargs):
+        return cassette.send(real_send, adapter, request, **kwargs)
+
+    HTTPAdapter.send = send
+    try:
+        yield cassette
+    finally:
+        HTTPAdapter.send = real_send
+        if mode == "record":
+            cassette.save(**metadata)
+
+
+def run_target(name: str, args: List[str]) -> int:
+    """Run an example CLI's `main()` in this process with the given arguments."""
+    target = TARGETS[name]
+    sys.path.insert(0, str(EXAMPLES_DIR / target.directory))
+    module = importlib.import_module(target.module)
+    sys.argv = [f"{target.module}.py", *args]
+    try:
+        code = module.main()
+    except SystemExit as e:
+        code = e.code
+    return code if isinstance(code, int) else (0 if code is None else 1)
+
+
+def _duration(entry: dict) -> float:
+    """Seconds from sending a recorded request until its last body chunk (or its error)."""
+    if "response" not in entry:
+        return entry["error"]["after"]
+    response = entry["response"]
+    return response["chunks"][-1][0] if response.get("chunks") else response["ttfb"]
+
+
+def describe(cassette: Cassette) -> None:
+    """Print a summary of a cassette's contents."""
+    print(f"Cassette:     {cassette.path}")
+    for key in ("recorded_at", "target", "args"):
+        if key in cassette.metadata:
+            print(f"{key.replace('_', ' ').capitalize() + ':':<13} {cassette.metadata[key]}")
+    entries = cassette.interactions
+    responses = [e["response"] for e in entries if "response" in e]
+    print(f"Interactions: {len(entries)} ({len(entries) - len(responses)} errors)")
+    if not responses:
+        return
+    # Wall time runs from the first request starting to the last one finishing, errors included
+    span = max(e["started"] + _duration(e) for e in entries) - min(e["started"] for e in entries)
+    ttfb = sorted(r["ttfb"] for r in responses)
+    totals = sorted(_duration(e) for e in entries if "response" in e)
+    print(f"Wall time:    {span:.2f} s")
+    print(f"TTFB:         p50 {statistics.median(ttfb) * 1000:.0f} ms, max {ttfb[-1] * 1000:.0f} ms")
+    print(f"Complete:     p50 {statistics.median(totals) * 1000:.0f} ms, max {totals[-1] * 1000:.0f} ms")
+    print(f"Body chunks:  {sum(len(r.get('chunks', [])) for r in responses)}")
+    by_url: Dict[str, int] = defaultdict(int)
+    for entry in entries:
+        by_url[f"{entry['request']['method']} {entry['request']['url'].split('?')[0]}"] += 1
+    for url, count in sorted(by_url.items(), key=lambda item: -item[1]):
+        print(f"  {count:>5}  {url}")
+
+
+def main():
+    """Main entry point for the cassette CLI."""
+    parser = argparse.ArgumentParser(
+        description="Record and replay the HTTP traffic of an example CLI",
+        epilog="Arguments after -- are passed to the example, e.g. record run.cassette.gz fact_checker -- --text '...'",
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    record = commands.add_parser("record", help="Run an example against the live API and record its traffic")
+    replay = commands.add_parser("replay", help="Run an example against a recording")
+    for sub in (record, replay):
+        sub.add_argument("cassette", type=Path, help="Cassette file (e.g. run.cassette.gz)")
+        sub.add_argument("target", choices=sorted(TARGETS), help="Example to run")
+    replay.add_argument("-s", "--speed", type=float, default=1.0, help="Replay speed; 0 means no waiting (default: 1)")
+    replay.add_argument("--loose", action="store_true", help="Match requests by method and URL path only if the body differs")
+    replay.add_argument("--profile", nargs="?", const="-", metavar="FILE",
+                        help="Profile the run with cProfile; print the top functions, or save stats to FILE")
+
+    info = commands.add_parser("info", help="Summarize a cassette")
+    info.add_argument("cassette", type=Path, help="Cassette file")
+    # Everything after "--" is passed to the example
+    argv = sys.argv[1:]
+    target_args = argv[argv.index("--") + 1:] if "--" in argv else []
+    args = parser.parse_args(argv[:argv.index("--")] if "--" in argv else argv)
+
+    if args.command == "info":
+        describe(Cassette(args.cassette))
+        return 0
+
+    if args.command == "record":
+        with use_cassette(args.cassette, "record", target=args.target, args=target_args) as cassette:
+            code = run_target(args.target, target_args)
+        print(f"\nRecorded {len(cassette.interactions)} interactions to {args.cassette}", file=sys.stderr)
+        return code
+
+    # Clients refuse to start without an API key; replay never sends it anywhere
+    for name in ("PPLX_API_KEY", "PERPLEXITY_API_KEY"):
+        os.environ.setdefault(name, "replay-key")
+    profiler = cProfile.Profile() if args.profile else None
+    with use_cassette(args.cassette, "replay", speed=args.speed, strict=not args.loose) as cassette:
+        wall, cpu = time.perf_counter(), time.process_time()
+        if profiler:
+            profiler.enable()
+        try:
+            code = run_target(args.target, target_args)
+        finally:
+            if profiler:
+                profiler.disable()
+        wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+
+    print(
+        f"\nReplayed {cassette.replayed}/{len(cassette.interactions)} interactions at "
+        f"{'full speed' if not args.speed else f'{args.speed:g}x'}: {wall:.2f} s wall, {cpu:.2f} s CPU (all threads)",
+        file=sys.stderr,
+    )
+    if profiler:
+        if args.profile == "-":
+            # cProfile only sees the main thread; worker-thread time shows up as waiting
+            pstats.Stats(profiler, stream=sys.stderr).sort_stats("cumulative").print_stats(20)
+        else:
+            profiler.dump_stats(args.profile)
+            print(f"Profile saved to {args.profile} (main thread only)", file=sys.stderr)
+    return code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
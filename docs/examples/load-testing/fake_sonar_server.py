@@ -0,0 +1,469 @@
+#!/usr/bin/env python3
+"""
+Fake Sonar API Server - A local stand-in for https://api.perplexity.ai for offline
+load and regression testing of the cookbook clients.
+
+Implements POST /chat/completions (also under /v1) with:
+  - `citations`, `search_results` and `usage` blocks like the real API
+  - SSE streaming (`"stream": true`) with configurable chunk cadence
+  - `response_format` json_schema: content is generated to match the schema
+  - canned fixtures matched against the request (see fixtures/)
+  - configurable latency distributions and error injection
+
+Only the standard library is used, and all connections are served from one asyncio loop
+with HTTP/1.1 keep-alive, so thousands of concurrent clients cost no threads.
+
+Usage:
+  python fake_sonar_server.py --port 8000 --latency lognormal:300,0.5 --error-rate 0.02
+  export PERPLEXITY_BASE_URL=<the URL printed at start-up>
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+FIXTURES_DIR = Path(__file__).parent / "fixtures"
+
+DEFAULT_CONTENT = (
+    "Here is a concise answer based on recent sources [1]. Independent reporting confirms "
+    "the main points [2], while some details remain under discussion [3]."
+)
+
+DEFAULT_SEARCH_RESULTS = [
+    {"title": "Example Source One", "url": "https://example.com/source-1", "date": "2025-01-15"},
+    {"title": "Example Source Two", "url": "https://example.org/source-2", "date": "2025-02-03"},
+    {"title": "Example Source Three", "url": "https://example.net/source-3", "date": "2025-03-21"},
+]
+
+HTTP_REASONS = {
+    200: "OK", 400: "Bad Request", 401: "Unauthorized", 404: "Not Found",
+    405: "Method Not Allowed", 429: "Too Many Requests", 500: "Internal Server Error",
+    502: "Bad Gateway", 503: "Service Unavailable",
+}
+
+
+class LatencyDistribution:
+    """
+    Samples a delay in seconds from a spec string (values in milliseconds):
+    "fixed:200", "uniform:100,500", "normal:300,50", "lognormal:300,0.5"
+    (median 300 ms, sigma 0.5) or "none".
+    """
+
+    def __init__(self, spec: str = "none"):
+        self.spec = spec
+        kind, _, params = spec.partition(":")
+        self.kind = kind.strip().lower()
+        self.params = [float(p) for p in params.split(",") if p.strip()]
+        expected = {"none": 0, "fixed": 1, "uniform": 2, "normal": 2, "lognormal": 2}
+        if self.kind not in expected or len(self.params) != expected[self.kind]:
+            raise ValueError(f"Invalid latency spec '{spec}'")
+
+    def sample(self) -> float:
+        if self.kind == "none":
+            return 0.0
+        if self.kind == "fixed":
+            ms = self.params[0]
+        elif self.kind == "uniform":
+            ms = random.uniform(*self.params)
+        elif self.kind == "normal":
+            ms = random.gauss(*self.params)
+        else:
+            median, sigma = self.params
+            ms = random.lognormvariate(math.log(median), sigma)
+        return max(ms, 0.0) / 1000
+
+
+@dataclass
+class ServerConfig:
+    """Behaviour of the fake server."""
+    latency: LatencyDistribution = field(default_factory=LatencyDistribution)
+    stream_interval: LatencyDistribution = field(default_factory=lambda: LatencyDistribution("fixed:20"))
+    words_per_chunk: int = 3
+    error_rate: float = 0.0
+    error_statuses: Tuple[int, ...] = (429, 500, 503)
+    # Fraction of requests that never get a response (exercises client timeouts)
+    hang_rate: float = 0.0
+    require_api_key: bool = False
+    fixtures: List[Dict[str, Any]] = field(default_factory=list)
+    seed: Optional[int] = None
+
+
+def load_fixtures(directory: Path) -> List[Dict[str, Any]]:
+    """
+    Load fixture files (JSON lists of fixture objects) from a directory.
+
+    A fixture matches when its "match" regex is found in the concatenated request messages
+    (and its optional "model" equals the requested model, and its optional "structured"
+    flag matches whether a json_schema response_format was requested). Its "content" and
+    "search_results" replace the defaults; citations are the search result URLs.
+    """
+    fixtures = []
+    for path in sorted(Path(directory).glob("*.json")):
+        with open(path, "r", encoding="utf-8") as f:
+            for fixture in json.load(f):
+                fixture["_pattern"] = re.compile(fixture.get("match", ""), re.IGNORECASE | re.DOTALL)
+                fixtures.append(fixture)
+    return fixtures
+
+
+def _resolve(schema: Dict[str, Any], root: Dict[str, Any]) -> Dict[str, Any]:
+    while "$ref" in schema:
+        # Local references only, e.g. "#/$defs/Claim"
+        node = root
+        for part in schema["$ref"].lstrip("#/").split("/"):
+            node = node[part]
+        schema = node
+    if "allOf" in schema and len(schema["allOf"]) == 1:
+        return _resolve(schema["allOf"][0], root)
+    if "anyOf" in schema:
+        options = [s for s in schema["anyOf"] if s.get("type") != "null"]
+        return _resolve(options[0] if options else schema["anyOf"][0], root)
+    return schema
+
+
+def generate_from_schema(schema: Dict[str, Any], root: Optional[Dict[str, Any]] = None, name: str = "value") -> Any:
+    """Generate a small instance that validates against a (pydantic-style) JSON schema."""
+    root = root or schema
+    schema = _resolve(schema, root)
+    if "enum" in schema:
+        return schema["enum"][0]
+    if "const" in schema:
+        return schema["const"]
+    kind = schema.get("type", "object")
+    if kind == "object":
+        properties = schema.get("properties", {})
+        return {key: generate_from_schema(sub, root, key) for key, sub in properties.items()}
+    if kind == "array":
+        count = max(schema.get("minItems", 2), 1)
+        return [generate_from_schema(schema.get("items", {}), root, name) for _ in range(count)]
+    if kind == "integer":
+        return int(schema.get("minimum", 1))
+    if kind == "number":
+        return float(schema.get("minimum", 1.0))
+    if kind == "boolean":
+        return True
+    description = schema.get("description", "")
+    # Rating-like fields documented as "A, B, or C" get their first allowed value
+    options = re.findall(r"\b[A-Z][A-Z_]{2,}\b", description)
+    if options:
+        return options[0]
+    if "url" in name.lower() or "source" in name.lower():
+        return "https://example.com/source-1"
+    return f"Sample {name.replace('_', ' ')} [1]"
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, int(len(text.split()) * 1.3))
+
+
+class FakeSonarServer:
+    """
+    Asyncio HTTP/1.1 server imitating the Sonar chat completions API.
+
+    Run it from the command line, or in-process (e.g. from a benchmark) with
+    `start()` / `stop()`, which serve from a background thread:
+
+        with FakeSonarServer(ServerConfig(latency=LatencyDistribution("fixed:50"))) as server:
+            os.environ["PERPLEXITY_BASE_URL"] = server.base_url
+    """
+
+    def __init__(self, config: Optional[ServerConfig] = None, host: str = "127.0.0.1", port: int = 0):
+        self.config = config or ServerConfig()
+        self.host = host
+        self.port = port
+        self.stats = {"requests": 0, "streamed": 0, "errors_injected": 0, "hangs_injected": 0, "in_flight": 0}
+        self._random = random.Random(self.config.seed)
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    async def serve(self) -> None:
+        """Serve until cancelled."""
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port, backlog=4096)
+        self.port = self._server.sockets[0].getsockname()[1]
+        async with self._server:
+            await self._server.serve_forever()
+
+    def start(self) -> "FakeSonarServer":
+        """Start serving on a background thread; returns once the port is bound."""
+        ready = threading.Event()
+
+        def run() -> None:
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            self._server = self._loop.run_until_complete(
+                asyncio.start_server(self._handle_connection, self.host, self.port, backlog=4096)
+            )
+            self.port = self._server.sockets[0].getsockname()[1]
+            ready.set()
+            self._loop.run_forever()
+            self._server.close()
+            # Cancel open keep-alive connections (and hung requests) before closing the loop
+            pending = asyncio.all_tasks(self._loop)
+            for task in pending:
+                task.cancel()
+            self._loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+            self._loop.close()
+
+        self._thread = threading.Thread(target=run, name="fake-sonar-server", daemon=True)
+        self._thread.start()
+        ready.wait()
+        return self
+
+    def stop(self) -> None:
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop = None
+
+    def __enter__(self) -> "FakeSonarServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    key, _, value = line.decode("latin-1").partition(":")
+                    headers[key.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+
+                keep_alive = headers.get("connection", "").lower() != "close"
+                await self._dispatch(method, path.split("?", 1)[0], headers, body, writer)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        except asyncio.CancelledError:
+            # Server shutdown; swallowed so asyncio doesn't log it as a handler failure
+            pass
+        finally:
+            writer.close()
+
+    async def _dispatch(self, method: str, path: str, headers: Dict[str, str], body: bytes, writer) -> None:
+        if method == "OPTIONS":
+            # CORS preflight, so browser UIs (e.g. the disease Q&A page) can call the server
+            writer.write(
+                b"HTTP/1.1 204 No Content\r\n"
+                b"Access-Control-Allow-Origin: *\r\n"
+                b"Access-Control-Allow-Methods: GET, POST, OPTIONS\r\n"
+                b"Access-Control-Allow-Headers: *\r\n"
+                b"Content-Length: 0\r\n\r\n"
+            )
+            return await writer.drain()
+        if path == "/health":
+            return await self._send_json(writer, 200, {"status": "ok"})
+        if path == "/stats":
+            return await self._send_json(writer, 200, self.stats)
+        if path not in ("/chat/completions", "/v1/chat/completions"):
+            return await self._send_json(writer, 404, {"error": {"message": f"Unknown path {path}"}})
+        if method != "POST":
+            return await self._send_json(writer, 405, {"error": {"message": "Use POST"}})
+
+        self.stats["requests"] += 1
+        self.stats["in_flight"] += 1
+        try:
+            await self._chat_completions(headers, body, writer)
+        finally:
+            self.stats["in_flight"] -= 1
+
+    async def _chat_completions(self, headers: Dict[str, str], body: bytes, writer) -> None:
+        config = self.config
+        if config.require_api_key and not headers.get("authorization", "").startswith("Bearer "):
+            return await self._send_json(writer, 401, {"error": {"message": "Missing API key", "type": "unauthorized"}})
+        try:
+            request = json.loads(body or b"{}")
+            messages = request["messages"]
+        except (ValueError, KeyError):
+            return await self._send_json(writer, 400, {"error": {"message": "Invalid request body", "type": "invalid_request"}})
+
+        await asyncio.sleep(config.latency.sample())
+
+        roll = self._random.random()
+        if roll < config.hang_rate:
+            self.stats["hangs_injected"] += 1
+            await asyncio.sleep(3600)
+            return
+        if roll < config.hang_rate + config.error_rate:
+            self.stats["errors_injected"] += 1
+            status = self._random.choice(config.error_statuses)
+            extra = {"retry-after": "1"} if status == 429 else {}
+            return await self._send_json(
+                writer, status, {"error": {"message": "Injected error", "type": "injected", "code": status}}, extra
+            )
+
+        model = request.get("model", "sonar")
+        content, search_results = self._answer(request, messages)
+        prompt_tokens = sum(estimate_tokens(str(m.get("content") or "")) for m in messages)
+        completion_tokens = estimate_tokens(content)
+        response = {
+            "id": str(uuid.uuid4()),
+            "model": model,
+            "created": int(time.time()),
+            "object": "chat.completion",
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+                "search_context_size": "low",
+            },
+            "citations": [r["url"] for r in search_results],
+            "search_results": search_results,
+        }
+
+        if request.get("stream"):
+            self.stats["streamed"] += 1
+            return await self._stream(writer, response, content)
+
+        response["choices"] = [{
+            "index": 0,
+            "finish_reason": "stop",
+            "message": {"role": "assistant", "content": content},
+        }]
+        await self._send_json(writer, 200, response)
+
+    def _answer(self, request: Dict[str, Any], messages: List[Dict[str, Any]]) -> Tuple[str, List[Dict[str, Any]]]:
+        text = "\n".join(str(m.get("content") or "") for m in messages)
+        model = request.get("model")
+        response_format = request.get("response_format") or {}
+        structured = response_format.get("type") == "json_schema"
+        for fixture in self.config.fixtures:
+            if fixture.get("model") not in (None, model):
+                continue
+            if fixture.get("structured", structured) != structured:
+                continue
+            if fixture["_pattern"].search(text):
+                content = fixture.get("content", DEFAULT_CONTENT)
+                if not isinstance(content, str):
+                    content = json.dumps(content)
+                return content, fixture.get("search_results", DEFAULT_SEARCH_RESULTS)
+
+        if structured:
+            schema = response_format.get("json_schema", {}).get("schema", {})
+            return json.dumps(generate_from_schema(schema)), DEFAULT_SEARCH_RESULTS
+        return DEFAULT_CONTENT, DEFAULT_SEARCH_RESULTS
+
+    async def _stream(self, writer, response: Dict[str, Any], content: str) -> None:
+        writer.write(
+            b"HTTP/1.1 200 OK\r\n"
+            b"Content-Type: text/event-stream\r\n"
+            b"Access-Control-Allow-Origin: *\r\n"
+            b"Cache-Control: no-cache\r\n"
+            b"Transfer-Encoding: chunked\r\n\r\n"
+        )
+        base = {k: response[k] for k in ("id", "model", "created", "citations", "search_results")}
+        base["object"] = "chat.completion.chunk"
+
+        words = re.findall(r"\S+\s*", content)
+        step = max(1, self.config.words_per_chunk)
+        for i in range(0, len(words), step):
+            delta = {"content": "".join(words[i:i + step])}
+            if i == 0:
+                delta["role"] = "assistant"
+            chunk = dict(base, choices=[{"index": 0, "delta": delta, "finish_reason": None}])
+            await self._write_event(writer, json.dumps(chunk))
+            await asyncio.sleep(self.config.stream_interval.sample())
+
+        final = dict(base, usage=response["usage"], choices=[{"index": 0, "delta": {}, "finish_reason": "stop"}])
+        await self._write_event(writer, json.dumps(final))
+        await self._write_event(writer, "[DONE]")
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+    @staticmethod
+    async def _write_event(writer, data: str) -> None:
+        payload = f"data: {data}\n\n".encode("utf-8")
+        writer.write(f"{len(payload):x}\r\n".encode("ascii") + payload + b"\r\n")
+        await writer.drain()
+
+    @staticmethod
+    async def _send_json(writer, status: int, payload: Dict[str, Any], extra_headers: Optional[Dict[str, str]] = None) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        head = [
+            f"HTTP/1.1 {status} {HTTP_REASONS.get(status, 'Error')}",
+            "Content-Type: application/json",
+            "Access-Control-Allow-Origin: *",
+            f"Content-Length: {len(body)}",
+        ]
+        head += [f"{k}: {v}" for k, v in (extra_headers or {}).items()]
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+        await writer.drain()
+
+
+def main():
+    """Main entry point for the fake Sonar server."""
+    parser = argparse.ArgumentParser(
+        description="Fake Sonar API Server - local stand-in for api.perplexity.ai"
+    )
+    parser.add_argument("--host", default="127.0.0.1", help="Interface to bind (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8000, help="Port to listen on (default: 8000)")
+    parser.add_argument("--latency", default="none",
+                        help="Time to first byte in ms: none, fixed:200, uniform:100,500, normal:300,50, lognormal:300,0.5")
+    parser.add_argument("--stream-interval", default="fixed:20",
+                        help="Delay between SSE chunks in ms, same format as --latency (default: fixed:20)")
+    parser.add_argument("--words-per-chunk", type=int, default=3, help="Words per SSE chunk (default: 3)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with an error")
+    parser.add_argument("--error-statuses", default="429,500,503",
+                        help="Comma-separated HTTP statuses used for injected errors (default: 429,500,503)")
+    parser.add_argument("--hang-rate", type=float, default=0.0,
+                        help="Fraction of requests that never get a response")
+    parser.add_argument("--fixtures", default=str(FIXTURES_DIR),
+                        help="Directory of JSON fixture files ('' to disable)")
+    parser.add_argument("--require-api-key", action="store_true", help="Reject requests without a Bearer token")
+    parser.add_argument("--seed", type=int, help="Random seed for reproducible error injection")
+    args = parser.parse_args()
+
+    try:
+        config = ServerConfig(
+            latency=LatencyDistribution(args.latency),
+            stream_interval=LatencyDistribution(args.stream_interval),
+            words_per_chunk=args.words_per_chunk,
+            error_rate=args.error_rate,
+            error_statuses=tuple(int(s) for s in args.error_statuses.split(",") if s.strip()),
+            hang_rate=args.hang_rate,
+            require_api_key=args.require_api_key,
+            fixtures=load_fixtures(Path(args.fixtures)) if args.fixtures else [],
+            seed=args.seed,
+        )
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+    if args.seed is not None:
+        random.seed(args.seed)
+    server = FakeSonarServer(config, host=args.host, port=args.port)
+    print(f"Fake Sonar API listening on http://{args.host}:{args.port}", file=sys.stderr)
+    print(f"  export PERPLEXITY_BASE_URL=http://{args.host}:{args.port}", file=sys.stderr)
+    try:
+        asyncio.run(server.serve())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
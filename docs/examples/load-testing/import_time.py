@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Start-up guard for the cookbook CLIs, based on `python -X importtime`.
+
+Imports each CLI module in a fresh interpreter several times, takes the median cumulative
+import time, and fails when it exceeds the CLI's budget or when a module that should only
+be loaded lazily (newspaper, pandas, IPython, ...) shows up in the import tree.
+
+  python import_time.py                 # check every CLI
+  python import_time.py fact_checker -v # also list the slowest imports
+
+Exits with status 1 if any check fails, so it can run in CI or before cron deploys.
+"""
+
+import argparse
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+EXAMPLES_DIR = Path(__file__).resolve().parent.parent
+
+
+@dataclass
+class ImportBudget:
+    directory: str
+    module: str
+    budget_ms: float
+    # Top-level packages that must not be imported at start-up
+    lazy: Tuple[str, ...] = ()
+    # Optional dependencies: if one is not installed, the CLI is skipped instead of failing
+    optional: Tuple[str, ...] = ()
+
+
+BUDGETS: Dict[str, ImportBudget] = {
+    "fact_checker": ImportBudget("fact-checker-cli", "fact_checker", 450, lazy=("newspaper", "lxml", "nltk")),
+    "financial_news_tracker": ImportBudget("financial-news-tracker", "financial_news_tracker", 450),
+    "research_finder": ImportBudget("research-finder", "research_finder", 250),
+    "daily_knowledge_bot": ImportBudget("daily-knowledge-bot", "daily_knowledge_bot", 250),
+    "disease_qa": ImportBudget("disease-qa", "disease_qa_tutorial", 300, lazy=("pandas", "IPython", "numpy")),
+}
+
+
+class ImportFailed(RuntimeError):
+    """The CLI module could not be imported."""
+
+    def __init__(self, message: str, missing: Optional[str] = None):
+        super().__init__(message)
+        # Top-level package named in a ModuleNotFoundError, if that was the cause
+        self.missing = missing
+
+
+def profile_import(budget: ImportBudget) -> List[Tuple[str, int, int]]:
+    """Import the module in a fresh interpreter; returns (module, self us, cumulative us) rows."""
+    code = f"import sys; sys.path.insert(0, sys.argv[1]); import {budget.module}"
+    # Some modules create log files on import, so keep them out of the caller's directory
+    with tempfile.TemporaryDirectory() as cwd:
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", code, str(EXAMPLES_DIR / budget.directory)],
+            capture_output=True, text=True, cwd=cwd,
+        )
+    if result.returncode != 0:
+        error = result.stderr.strip().splitlines()[-1]
+        missing = re.match(r"ModuleNotFoundError: No module named '([^'.]+)", error)
+        raise ImportFailed(error, missing.group(1) if missing else None)
+
+    rows = []
+    for line in result.stderr.splitlines():
+        # "import time:       self [us] |  cumulative | imported package"
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    # Drop interpreter start-up (everything up to and including `site`)
+    names = [row[0] for row in rows]
+    start = len(names) - names[::-1].index("site") if "site" in names else 0
+    return rows[start:]
+
+
+def check(name: str, budget: ImportBudget, runs: int, verbose: bool) -> bool:
+    try:
+        profiles = [profile_import(budget) for _ in range(runs)]
+    except ImportFailed as e:
+        if e.missing in budget.optional:
+            print(f"{name:<24} SKIP  optional dependency not installed: {e.missing}")
+            return True
+        print(f"{name:<24} FAIL  could not import: {e}")
+        return False
+
+    totals = [next(cum for mod, _, cum in rows if mod == budget.module) / 1000 for rows in profiles]
+    median_ms = statistics.median(totals)
+    loaded = {mod for mod, _, _ in profiles[0]}
+    eager = sorted(pkg for pkg in budget.lazy if pkg in loaded)
+
+    ok = median_ms <= budget.budget_ms and not eager
+    print(f"{name:<24} {'OK  ' if ok else 'FAIL'}  {median_ms:7.1f} ms (budget {budget.budget_ms:.0f} ms)")
+    if eager:
+        print(f"{'':<30}imported at start-up but should be lazy: {', '.join(eager)}")
+    if verbose or not ok:
+        # Top-level packages by cumulative time, the usual suspects for slow start-up
+        top_level = sorted(
+            ((mod, cum) for mod, _, cum in profiles[0] if "." not in mod and mod != budget.module),
+            key=lambda row: row[1], reverse=True,
+        )
+        for mod, cum in top_level[:8]:
+            print(f"{'':<30}{cum / 1000:7.1f} ms  {mod}")
+    return ok
+
+
+def main():
+    """Main entry point for the import-time guard."""
+    parser = argparse.ArgumentParser(description="Check CLI start-up import time against budgets")
+    parser.add_argument("clis", nargs="*", help=f"CLIs to check (default: all of {', '.join(BUDGETS)})")
+    parser.add_argument("-r", "--runs", type=int, default=5, help="Fresh imports per CLI (default: 5)")
+    parser.add_argument("-v", "--verbose", action="store_true", help="List the slowest imports for every CLI")
+    args = parser.parse_args()
+
+    unknown = [name for name in args.clis if name not in BUDGETS]
+    if unknown:
+        print(f"Error: unknown CLI(s) {', '.join(unknown)}; choose from {', '.join(BUDGETS)}", file=sys.stderr)
+        return 1
+
+    results = [check(name, BUDGETS[name], args.runs, args.verbose) for name in args.clis or BUDGETS]
+    return 0 if all(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
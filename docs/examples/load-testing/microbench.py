@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark of the client-side CPU cost per request for the structured-output clients.
+
+Encoding: compares building each request the way the clients used to (a fresh headers
+dict, `model_json_schema()` and a full `json.dumps` of the payload, system prompt
+included) with the cached request templates they use now.
+
+Decoding: compares the old two-step `json.loads` of the response envelope and of the
+model output (no validation) with the orjson envelope parse plus a single-pass
+`model_validate_json` into the result model, as the clients do for structured output.
+
+Both report microseconds per request and the rate one core could sustain.
+
+  python microbench.py --iterations 20000
+"""
+
+import argparse
+import json
+import os
+import sys
+import timeit
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+EXAMPLES_DIR = Path(__file__).resolve().parent.parent
+sys.path[:0] = [str(EXAMPLES_DIR / "fact-checker-cli"), str(EXAMPLES_DIR / "financial-news-tracker")]
+os.environ.setdefault("PPLX_API_KEY", "benchmark-key")
+
+import fact_checker  # noqa: E402
+import financial_news_tracker  # noqa: E402
+
+ARTICLE = " ".join(
+    "The city council approved a budget of 4.2 billion dollars, a 12 percent increase over last year."
+    for _ in range(40)
+)
+
+
+def uncached_request(api_key: str, model: str, system_prompt: str, user_prompt: str, schema_model) -> bytes:
+    """Build a request the way the clients did before templates (what `requests.post(json=...)` encodes)."""
+    headers = {
+        "accept": "application/json",
+        "content-type": "application/json",
+        "Authorization": f"Bearer {api_key}"
+    }
+    data = {
+        "model": model,
+        "messages": [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ]
+    }
+    if schema_model is not None:
+        data["response_format"] = {
+            "type": "json_schema",
+            "json_schema": {"schema": schema_model.model_json_schema()},
+        }
+    return json.dumps(data, allow_nan=False).encode("utf-8")
+
+
+def uncached_decode(body: bytes) -> Dict[str, Any]:
+    """Decode a response the way the clients did before (`response.json()`, then the content)."""
+    result = json.loads(body)
+    parsed = json.loads(result["choices"][0]["message"]["content"])
+    parsed["citations"] = result["citations"]
+    return parsed
+
+
+def validated_decode(module, result_model) -> Callable[[bytes], Dict[str, Any]]:
+    """Decode a structured-output response the way the clients do now, validating into the result model."""
+    def decode(body: bytes) -> Dict[str, Any]:
+        result = module.loads(body)
+        parsed = result_model.model_validate_json(result["choices"][0]["message"]["content"]).model_dump()
+        parsed["citations"] = result["citations"]
+        return parsed
+    return decode
+
+
+def response_body(result: Dict[str, Any]) -> bytes:
+    """A chat completion response carrying `result` as structured output."""
+    citations = [f"https://example.com/source/{i}" for i in range(1, 9)]
+    return json.dumps({
+        "id": "benchmark",
+        "model": "sonar-pro",
+        "object": "chat.completion",
+        "choices": [{
+            "index": 0,
+            "finish_reason": "stop",
+            "message": {"role": "assistant", "content": json.dumps(result)},
+        }],
+        "citations": citations,
+        "usage": {"prompt_tokens": 1200, "completion_tokens": 900, "total_tokens": 2100},
+    }).encode("utf-8")
+
+
+def decode_cases() -> List[Tuple[str, Callable[[], Any], Callable[[], Any]]]:
+    fact_result = {
+        "overall_rating": "MIXED",
+        "summary": "Several figures are accurate, but the budget increase is overstated [1][2].",
+        "claims": [
+            {
+                "claim": f"Claim {i}: the city council approved a budget of 4.2 billion dollars.",
+                "rating": ["TRUE", "FALSE", "MISLEADING", "UNVERIFIABLE"][i % 4],
+                "explanation": "Council minutes and local reporting confirm the vote, but not the increase. " * 3,
+                "sources": [f"[{i % 8 + 1}]", f"[{(i + 3) % 8 + 1}]"],
+            }
+            for i in range(12)
+        ],
+    }
+    news_result = {
+        "query_topic": "tech stocks",
+        "time_period": "Last 24 hours",
+        "summary": "Technology shares rallied on strong earnings and easing rate expectations [1]. " * 3,
+        "news_items": [
+            {
+                "headline": f"Headline {i}: chipmakers extend gains after earnings beat",
+                "summary": "Shares rose after quarterly revenue topped analyst estimates. " * 2,
+                "impact": ["HIGH", "MEDIUM", "LOW", "NEUTRAL"][i % 4],
+                "sectors_affected": ["Semiconductors", "Cloud", "Consumer electronics"],
+                "source": f"[{i % 8 + 1}]",
+            }
+            for i in range(10)
+        ],
+        "market_analysis": {
+            "market_sentiment": "BULLISH",
+            "key_drivers": ["Earnings", "Rate expectations", "AI spending"],
+            "risks": ["Valuations", "Regulation"],
+            "opportunities": ["Cloud infrastructure", "Edge devices"],
+        },
+        "recommendations": ["Diversify within the sector", "Watch guidance in upcoming calls"],
+    }
+
+    result = []
+    for name, module, result_model, sample in (
+        ("fact_checker", fact_checker, fact_checker.FactCheckResult, fact_result),
+        ("financial_news", financial_news_tracker, financial_news_tracker.FinancialNewsResult, news_result),
+    ):
+        body = response_body(sample)
+        decode = validated_decode(module, result_model)
+        result.append((name, lambda body=body: uncached_decode(body), lambda body=body, decode=decode: decode(body)))
+    return result
+
+
+def cases() -> List[Tuple[str, Callable[[], bytes], Callable[[], bytes]]]:
+    checker = fact_checker.FactChecker(prompt_file=os.devnull)
+    checker.system_prompt = "You are a professional fact-checker with extensive research capabilities. " * 20
+    tracker = financial_news_tracker.FinancialNewsTracker()
+    fact_prompt = f"Fact check the following text and identify any false or misleading claims:\n\n{ARTICLE}"
+    news_prompt = "Provide a comprehensive financial news update and analysis for: tech stocks\n\nTime period: Last 24 hours"
+
+    result = []
+    for structured in (False, True):
+        label = "structured" if structured else "plain"
+        schema = fact_checker.FactCheckResult if structured else None
+        result.append((
+            f"fact_checker ({label})",
+            lambda schema=schema: uncached_request(checker.api_key, "sonar-pro", checker.system_prompt, fact_prompt, schema),
+            lambda structured=structured: checker._request_body("sonar-pro", structured, fact_prompt),
+        ))
+        schema = financial_news_tracker.FinancialNewsResult if structured else None
+        result.append((
+            f"financial_news ({label})",
+            lambda schema=schema: uncached_request(tracker.api_key, "sonar-pro", tracker.SYSTEM_PROMPT, news_prompt, schema),
+            lambda structured=structured: tracker._request_body("sonar-pro", structured, news_prompt),
+        ))
+    return result
+
+
+def per_call_us(fn: Callable[[], bytes], iterations: int, repeat: int) -> float:
+    return min(timeit.repeat(fn, number=iterations, repeat=repeat)) / iterations * 1e6
+
+
+def main():
+    """Main entry point for the microbenchmark."""
+    parser = argparse.ArgumentParser(description="Per-request client CPU cost of encoding requests and decoding responses")
+    parser.add_argument("-n", "--iterations", type=int, default=20000, help="Calls per timing run (default: 20000)")
+    parser.add_argument("-r", "--repeat", type=int, default=5, help="Timing runs; the fastest is reported (default: 5)")
+    args = parser.parse_args()
+
+    header = f"{'request':<28} {'uncached us':>12} {'template us':>12} {'speedup':>8} {'req/s/core':>12}"
+    print(header)
+    print("-" * len(header))
+    for name, uncached, templated in cases():
+        if json.loads(uncached()) != json.loads(templated()):
+            print(f"{name}: templated payload differs from the uncached one", file=sys.stderr)
+            return 1
+        before = per_call_us(uncached, args.iterations, args.repeat)
+        after = per_call_us(templated, args.iterations, args.repeat)
+        print(f"{name:<28} {before:>12.2f} {after:>12.2f} {before / after:>7.1f}x {1e6 / after:>12,.0f}")
+
+    parser_name = fact_checker.loads.__module__
+    header = f"{'response':<28} {'json.loads us':>13} {'validated us':>13} {'speedup':>8} {'resp/s/core':>12}"
+    print(f"\n{header}")
+    print("-" * len(header))
+    for name, uncached, validated in decode_cases():
+        if uncached() != validated():
+            print(f"{name}: validated result differs from the plain json.loads one", file=sys.stderr)
+            return 1
+        before = per_call_us(uncached, args.iterations, args.repeat)
+        after = per_call_us(validated, args.iterations, args.repeat)
+        print(f"{name:<28} {before:>13.2f} {after:>13.2f} {before / after:>7.1f}x {1e6 / after:>12,.0f}")
+    print(f"(envelope parsed with {parser_name}; the validated path also checks every field against the schema)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
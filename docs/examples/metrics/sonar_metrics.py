@@ -0,0 +1,372 @@
+#!/usr/bin/env python3
+"""
+Prometheus-style metrics for the long-running Sonar API examples.
+
+Counters, gauges and histograms with the same interface as `prometheus_client`, plus a
+small HTTP server for the `/metrics` endpoint, using only the standard library. Updating
+a metric takes a lock and a few arithmetic operations, so instrumentation can stay on in
+the request path.
+
+  import sonar_metrics
+  sonar_metrics.start_http_server(9100)
+  with sonar_metrics.track_request("my_app", "sonar-pro"):
+      ...  # one API call
+
+The examples collect metrics when this directory is on the Python path, and serve them
+when METRICS_PORT is set.
+
+  python sonar_metrics.py --port 9100   # serve a demo of every metric
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+DEFAULT_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class _Metric:
+    """A metric family: one child per combination of label values."""
+
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), registry: Optional["Registry"] = None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._children[()] = self._new_child()
+        (registry or REGISTRY).register(self)
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values: str):
+        """The child metric for these label values (cache it in hot loops)."""
+        child = self._children.get(values)
+        if child is None:
+            key = tuple(str(v) for v in values)
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _unlabelled(self):
+        if self.labelnames:
+            raise ValueError(f"{self.name} has labels {self.labelnames}; use .labels(...)")
+        return self._children[()]
+
+    def _samples(self) -> Iterator[Tuple[str, str, float]]:
+        raise NotImplementedError
+
+    def expose(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines += [f"{name}{labels} {_format_value(value)}" for name, labels, value in self._samples()]
+        return "\n".join(lines)
+
+
+class _CounterChild:
+    __slots__ = ("_value", "_lock")
+
+    def __init__(self):
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1) -> None:
+        if amount < 0:
+            raise ValueError("Counters can only increase")
+        with self._lock:
+            self._value += amount
+
+
+class Counter(_Metric):
+    """A value that only goes up, such as the number of requests."""
+
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1) -> None:
+        self._unlabelled().inc(amount)
+
+    def _samples(self):
+        for values, child in list(self._children.items()):
+            yield f"{self.name}_total", _format_labels(self.labelnames, values), child._value
+
+
+class _GaugeChild:
+    __slots__ = ("_value", "_lock")
+
+    def __init__(self):
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def set(self, value: float) -> None:
+        self._value = float(value)
+
+    def inc(self, amount: float = 1) -> None:
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount: float = 1) -> None:
+        with self._lock:
+            self._value -= amount
+
+    @contextmanager
+    def track_inprogress(self):
+        """Count the block as in progress while it runs."""
+        self.inc()
+        try:
+            yield
+        finally:
+            self.dec()
+
+
+class Gauge(_Metric):
+    """A value that goes up and down, such as requests in flight or queue depth."""
+
+    kind = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value: float) -> None:
+        self._unlabelled().set(value)
+
+    def inc(self, amount: float = 1) -> None:
+        self._unlabelled().inc(amount)
+
+    def dec(self, amount: float = 1) -> None:
+        self._unlabelled().dec(amount)
+
+    def track_inprogress(self):
+        return self._unlabelled().track_inprogress()
+
+    def _samples(self):
+        for values, child in list(self._children.items()):
+            yield self.name, _format_labels(self.labelnames, values), child._value
+
+
+class _HistogramChild:
+    __slots__ = ("_upper_bounds", "_counts", "_sum", "_lock")
+
+    def __init__(self, upper_bounds: Tuple[float, ...]):
+        self._upper_bounds = upper_bounds
+        self._counts = [0] * len(upper_bounds)
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        # Counts are stored per bucket and made cumulative when exposed
+        index = bisect_left(self._upper_bounds, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    @contextmanager
+    def time(self):
+        """Observe how long the block takes, in seconds."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+
+class Histogram(_Metric):
+    """Observations counted in buckets, such as request latency."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS, registry: Optional["Registry"] = None):
+        bounds = sorted(float(b) for b in buckets)
+        if bounds[-1] != float("inf"):
+            bounds.append(float("inf"))
+        self._upper_bounds = tuple(bounds)
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return _HistogramChild(self._upper_bounds)
+
+    def observe(self, value: float) -> None:
+        self._unlabelled().observe(value)
+
+    def time(self):
+        return self._unlabelled().time()
+
+    def _samples(self):
+        for values, child in list(self._children.items()):
+            with child._lock:
+                counts, total = list(child._counts), child._sum
+            cumulative = 0
+            for bound, count in zip(self._upper_bounds, counts):
+                cumulative += count
+                le = 'le="' + _format_value(bound) + '"'
+                yield f"{self.name}_bucket", _format_labels(self.labelnames, values, le), cumulative
+            labels = _format_labels(self.labelnames, values)
+            yield f"{self.name}_sum", labels, total
+            yield f"{self.name}_count", labels, cumulative
+
+
+class Registry:
+    """The metrics served by one endpoint."""
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> None:
+        with self._lock:
+            if any(m.name == metric.name for m in self._metrics):
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics.append(metric)
+
+    def expose(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        with self._lock:
+            metrics = list(self._metrics)
+        return "\n".join(metric.expose() for metric in metrics) + "\n"
+
+
+REGISTRY = Registry()
+
+# Metrics shared by the examples. `client` is the example's name, e.g. "discord_bot".
+REQUESTS = Counter("sonar_requests", "Sonar API requests by outcome (ok, error, cancelled)", ["client", "model", "outcome"])
+REQUEST_DURATION = Histogram("sonar_request_duration_seconds", "Sonar API request latency", ["client", "model"])
+REQUESTS_IN_FLIGHT = Gauge("sonar_requests_in_flight", "Sonar API requests waiting for a response", ["client"])
+RETRIES = Counter("sonar_retries", "Extra Sonar API requests sent for a call, such as hedged backups", ["client", "reason"])
+CACHE_REQUESTS = Counter("sonar_cache_requests", "Cache lookups by result (hit or miss)", ["client", "cache", "result"])
+QUEUE_DEPTH = Gauge("sonar_queue_depth", "Work items waiting or in progress", ["client", "queue"])
+
+
+class track_request:
+    """Context manager that counts one API call, times it and tracks it as in flight."""
+
+    __slots__ = ("client", "model", "_in_flight", "_start")
+
+    def __init__(self, client: str, model: str):
+        self.client = client
+        self.model = model
+
+    def __enter__(self):
+        self._in_flight = REQUESTS_IN_FLIGHT.labels(self.client)
+        self._in_flight.inc()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self._start
+        self._in_flight.dec()
+        if exc_type is None:
+            outcome = "ok"
+        elif issubclass(exc_type, Exception):
+            outcome = "error"
+        else:
+            # Cancelled, e.g. the losing request of a hedged pair
+            outcome = "cancelled"
+        REQUEST_DURATION.labels(self.client, self.model).observe(elapsed)
+        REQUESTS.labels(self.client, self.model, outcome).inc()
+        return False
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.registry.expose().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Scrapes every few seconds would flood the logs
+
+
+def start_http_server(port: int, addr: str = "127.0.0.1", registry: Registry = REGISTRY) -> ThreadingHTTPServer:
+    """Serve `/metrics` on a daemon thread. Binds to localhost unless `addr` says otherwise."""
+    handler = type("MetricsHandler", (_MetricsHandler,), {"registry": registry})
+    server = ThreadingHTTPServer((addr, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
+
+
+_server: Optional[ThreadingHTTPServer] = None
+
+
+def serve_from_env() -> Optional[int]:
+    """
+    Start the metrics server if METRICS_PORT is set (METRICS_ADDR defaults to 127.0.0.1).
+    Safe to call more than once. Returns the port, or None if metrics are not served.
+    """
+    global _server
+    port = os.environ.get("METRICS_PORT")
+    if not port:
+        return None
+    if _server is None:
+        _server = start_http_server(int(port), os.environ.get("METRICS_ADDR", "127.0.0.1"))
+    return _server.server_address[1]
+
+
+def main():
+    """Serve the shared metrics with some demo traffic, to try out the endpoint and dashboards."""
+    parser = argparse.ArgumentParser(description="Serve demo Sonar metrics on /metrics")
+    parser.add_argument("--port", type=int, default=9100, help="Port to serve on (default: 9100)")
+    parser.add_argument("--addr", default="127.0.0.1", help="Address to bind (default: 127.0.0.1)")
+    args = parser.parse_args()
+
+    import random
+
+    start_http_server(args.port, args.addr)
+    print(f"Serving demo metrics on http://{args.addr}:{args.port}/metrics (Ctrl+C to stop)")
+    try:
+        while True:
+            model = random.choice(["sonar", "sonar-pro"])
+            try:
+                with track_request("demo", model):
+                    time.sleep(random.lognormvariate(-1.5, 0.6))
+                    if random.random() < 0.02:
+                        raise RuntimeError("simulated API error")
+            except RuntimeError:
+                RETRIES.labels("demo", "error").inc()
+            CACHE_REQUESTS.labels("demo", "answers", random.choice(["hit", "miss"])).inc()
+            QUEUE_DEPTH.labels("demo", "questions").set(random.randint(0, 5))
+    except KeyboardInterrupt:
+        return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
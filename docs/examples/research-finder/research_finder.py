@@ -4,29 +4,44 @@ Research Finder CLI - A tool to research topics or questions using Perplexity's
 """
 
 import argparse
+import difflib
 import json
 import os
+import re
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import nullcontext
 from pathlib import Path
-from typing import Dict, Optional, Any, List
+from typing import Dict, Iterator, Optional, Any, List
 
 import requests
+from requests.adapters import HTTPAdapter
 from requests.exceptions import RequestException
 
+try:
+    import usage_ledger
+except ImportError:
+    usage_ledger = None
+
 class ResearchAssistant:
     """A class to interact with Perplexity Sonar API for research."""
 
-    API_URL = "https://api.perplexity.ai/chat/completions"
+    API_URL = os.environ.get("PERPLEXITY_BASE_URL", "https://api.perplexity.ai").rstrip("/") + "/chat/completions"
     DEFAULT_MODEL = "sonar-pro" # Using sonar-pro for potentially better research capabilities
     PROMPT_FILE = "system_prompt.md"
+    # Name used for this client in the usage ledger
+    USAGE_CLIENT = "research_finder"
 
-    def __init__(self, api_key: Optional[str] = None, prompt_file: Optional[str] = None):
+    def __init__(self, api_key: Optional[str] = None, prompt_file: Optional[str] = None, max_connections: int = 10):
         """
         Initialize the ResearchAssistant with API key and system prompt.
 
         Args:
             api_key: Perplexity API key. If None, will try to read from file or environment.
             prompt_file: Path to file containing the system prompt. If None, uses default relative path.
+            max_connections: Connections kept open to the API, at least the number of
+                concurrent requests.
         """
         self.api_key = api_key or self._get_api_key()
         if not self.api_key:
@@ -45,6 +60,11 @@ class ResearchAssistant:
              prompt_path = script_dir / self.PROMPT_FILE
 
         self.system_prompt = self._load_system_prompt(prompt_path)
+        self.ledger = usage_ledger.UsageLedger.from_env() if usage_ledger else None
+        # One session for all requests, so connections are reused (and shared by batch workers)
+        self.session = requests.Session()
+        self.session.mount("https://", HTTPAdapter(pool_maxsize=max_connections))
+        self.session.mount("http://", HTTPAdapter(pool_maxsize=max_connections))
 
     def _get_api_key(self) -> str:
         """
@@ -111,6 +131,12 @@ class ResearchAssistant:
         if not query or not query.strip():
             return {"error": "Input query is empty. Cannot perform research."}
 
+        if self.ledger:
+            try:
+                model = self.ledger.select_model(self.USAGE_CLIENT, model)
+            except usage_ledger.BudgetExceeded as e:
+                return {"error": str(e)}
+
         headers = {
             "accept": "application/json",
             "content-type": "application/json",
@@ -130,9 +156,12 @@ class ResearchAssistant:
 
         try:
             # Increased timeout for potentially longer research tasks
-            response = requests.post(self.API_URL, headers=headers, json=data, timeout=90)
+            start = time.monotonic()
+            response = self.session.post(self.API_URL, headers=headers, json=data, timeout=90)
             response.raise_for_status() # Raise HTTPError for bad responses (4xx or 5xx)
             result = response.json()
+            if self.ledger:
+                self.ledger.record(self.USAGE_CLIENT, model, result.get("usage"), time.monotonic() - start)
 
             if "choices" in result and result["choices"] and "message" in result["choices"][0]:
                 content = result["choices"][0]["message"]["content"]
@@ -194,6 +223,105 @@ class ResearchAssistant:
             return {"error": f"An unexpected error occurred: {str(e)}"}
 
 
+_WORD_RE = re.compile(r"\w+")
+
+
+def _query_words(query: str) -> List[str]:
+    # Lowercase words with a plural "s" dropped, so "Effects of X" matches "effect of x?"
+    words = _WORD_RE.findall(query.lower())
+    return [w[:-1] if len(w) > 3 and w.endswith("s") and not w.endswith("ss") else w for w in words]
+
+
+def _key_terms(query: str) -> frozenset:
+    # Numbers and capitalized words after the first, which usually name what is asked about
+    words = _WORD_RE.findall(query)
+    return frozenset(
+        w.lower() for i, w in enumerate(words) if any(c.isdigit() for c in w) or (i and w[0].isupper())
+    )
+
+
+def dedupe_queries(queries: List[str], threshold: float = 1.0) -> List[Optional[int]]:
+    """
+    Find duplicate queries.
+
+    Queries are compared as word sequences, ignoring case, punctuation and plurals, so
+    word order still matters ("effect of A on B" is not a duplicate of "effect of B on A").
+    With a threshold below 1.0, similar queries are merged too, but only if they share the
+    same numbers and capitalized words: "population of Austria in 2024" is never merged
+    with "population of Australia in 2024", nor with "population of Austria in 2023".
+
+    Args:
+        queries: The queries, in input order.
+        threshold: Similarity (0-1) from which a query counts as a duplicate; the default
+            1.0 only merges queries that are identical after normalization.
+
+    Returns:
+        For each query, the index of the earlier query it duplicates, or None.
+    """
+    duplicate_of: List[Optional[int]] = []
+    exact: Dict[tuple, int] = {}
+    unique: List[int] = []
+    words = [_query_words(q) for q in queries]
+    terms = [_key_terms(q) for q in queries] if threshold < 1.0 else []
+    matcher = difflib.SequenceMatcher(autojunk=False)
+    for i, query_words in enumerate(words):
+        key = tuple(query_words)
+        match = exact.get(key)
+        if match is None and threshold < 1.0:
+            # SequenceMatcher caches details of the second sequence, so set it once per query
+            matcher.set_seq2(query_words)
+            for j in unique:
+                if terms[j] != terms[i]:
+                    continue
+                matcher.set_seq1(words[j])
+                if (matcher.real_quick_ratio() >= threshold and matcher.quick_ratio() >= threshold
+                        and matcher.ratio() >= threshold):
+                    match = j
+                    break
+        duplicate_of.append(match)
+        if match is None:
+            exact[key] = i
+            unique.append(i)
+    return duplicate_of
+
+
+def research_batch(
+    assistant: ResearchAssistant,
+    queries: List[str],
+    model: str = ResearchAssistant.DEFAULT_MODEL,
+    concurrency: int = 8,
+    dedupe_threshold: float = 1.0,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Research many queries concurrently, yielding one record per query in completion order.
+
+    Duplicate queries (see `dedupe_queries`) are sent once; their duplicates reuse the answer as soon as it
+    arrives. Each record has the query's `index` and `query`, `duplicate_of` (the index
+    of the query that was actually sent, or None), `seconds` spent on the API call
+    (0 for duplicates), `cached`, and the fields returned by `research_topic`.
+    """
+    duplicate_of = dedupe_queries(queries, dedupe_threshold)
+    duplicates: Dict[int, List[int]] = {}
+    for i, original in enumerate(duplicate_of):
+        if original is not None:
+            duplicates.setdefault(original, []).append(i)
+
+    def research(i: int):
+        start = time.perf_counter()
+        results = assistant.research_topic(queries[i], model=model)
+        return i, time.perf_counter() - start, results
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = [pool.submit(research, i) for i, original in enumerate(duplicate_of) if original is None]
+        for future in as_completed(futures):
+            i, seconds, results = future.result()
+            yield {"index": i, "query": queries[i], "duplicate_of": None,
+                   "seconds": round(seconds, 3), "cached": False, **results}
+            for j in duplicates.get(i, []):
+                yield {"index": j, "query": queries[j], "duplicate_of": i,
+                       "seconds": 0.0, "cached": True, **results}
+
+
 def display_results(results: Dict[str, Any], output_json: bool = False):
     """
     Display the research results in a human-readable format or as JSON.
@@ -244,17 +372,63 @@ def display_results(results: Dict[str, Any], output_json: bool = False):
              print(results["raw_response"])
 
 
+def run_batch(args: argparse.Namespace) -> int:
+    """Research every query in the batch file and write one JSON object per line."""
+    try:
+        with (sys.stdin if args.batch == "-" else open(args.batch, "r", encoding="utf-8")) as f:
+            queries = [line.strip() for line in f if line.strip() and not line.startswith("#")]
+    except OSError as e:
+        print(f"Error reading batch file: {e}", file=sys.stderr)
+        return 1
+    if not queries:
+        print("Error: batch file contains no queries", file=sys.stderr)
+        return 1
+
+    try:
+        assistant = ResearchAssistant(api_key=args.api_key, prompt_file=args.prompt_file,
+                                      max_connections=args.concurrency)
+    except ValueError as e:
+        print(f"Configuration Error: {e}", file=sys.stderr)
+        return 1
+
+    start = time.perf_counter()
+    failures = duplicates = 0
+    print(f"Researching {len(queries)} queries...", file=sys.stderr)
+    with (open(args.output, "w", encoding="utf-8") if args.output else nullcontext(sys.stdout)) as out:
+        for record in research_batch(assistant, queries, model=args.model, concurrency=args.concurrency,
+                                     dedupe_threshold=args.dedupe_threshold):
+            failures += "error" in record
+            duplicates += record["cached"]
+            # In completion order; sort by "index" to restore input order
+            out.write(json.dumps(record) + "\n")
+            out.flush()
+    print(
+        f"Researched {len(queries)} queries ({duplicates} answered from duplicates), "
+        f"{failures} failed, in {time.perf_counter() - start:.1f} s",
+        file=sys.stderr,
+    )
+    return 1 if failures == len(queries) else 0
+
+
 def main():
     """Main entry point for the research finder CLI."""
     parser = argparse.ArgumentParser(
         description="Research Finder CLI - Research topics using Perplexity Sonar API"
     )
 
-    parser.add_argument(
+    input_group = parser.add_mutually_exclusive_group(required=True)
+    input_group.add_argument(
         "query",
         type=str,
+        nargs="?",
         help="The research question or topic to investigate."
     )
+    input_group.add_argument(
+        "-b",
+        "--batch",
+        type=str,
+        help="File with one query per line ('-' for stdin); results are written as JSON Lines."
+    )
     parser.add_argument(
         "-m",
         "--model",
@@ -280,9 +454,32 @@ def main():
         action="store_true",
         help="Output results as JSON instead of human-readable format."
     )
+    parser.add_argument(
+        "-c",
+        "--concurrency",
+        type=int,
+        default=8,
+        help="Queries researched at once in batch mode (default: 8)"
+    )
+    parser.add_argument(
+        "--dedupe-threshold",
+        type=float,
+        default=1.0,
+        help="Similarity (0-1) from which batch queries count as duplicates and share one answer; "
+             "1.0 only merges queries differing in case, punctuation or plurals (default: 1.0)"
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        type=str,
+        help="Write batch results to this file instead of stdout."
+    )
 
     args = parser.parse_args()
 
+    if args.batch:
+        sys.exit(run_batch(args))
+
     try:
         print(f"Initializing research assistant for query: \"{args.query}\"", file=sys.stderr)
         assistant = ResearchAssistant(api_key=args.api_key, prompt_file=args.prompt_file)
@@ -0,0 +1,46 @@
+"""Tests for batch query deduplication. Run with: python -m pytest test_research_finder.py"""
+
+import pytest
+
+from research_finder import dedupe_queries
+
+AUSTRIA_AUSTRALIA = [
+    "What was the total population of Austria at the end of 2024 according to official statistics?",
+    "What was the total population of Australia at the end of 2024 according to official statistics?",
+]
+ASPIRIN_YEARS = [
+    "What did the 2019 guidelines recommend about daily aspirin for heart attack prevention?",
+    "What did the 2023 guidelines recommend about daily aspirin for heart attack prevention?",
+]
+
+
+@pytest.mark.parametrize("threshold", [1.0, 0.9, 0.5])
+def test_different_place_names_are_not_merged(threshold):
+    assert dedupe_queries(AUSTRIA_AUSTRALIA, threshold) == [None, None]
+
+
+@pytest.mark.parametrize("threshold", [1.0, 0.9, 0.5])
+def test_different_years_are_not_merged(threshold):
+    assert dedupe_queries(ASPIRIN_YEARS, threshold) == [None, None]
+
+
+def test_default_merges_only_normalized_duplicates():
+    queries = [
+        "Effects of caffeine on sleep",
+        "effect of caffeine on sleep?",
+        "Effects of caffeine on deep sleep",
+    ]
+    assert dedupe_queries(queries) == [None, 0, None]
+
+
+def test_fuzzy_threshold_merges_similar_queries():
+    queries = [
+        "Effects of caffeine on sleep quality in adults",
+        "Effects of caffeine on the sleep quality in adults",
+    ]
+    assert dedupe_queries(queries, 0.9) == [None, 0]
+
+
+def test_word_order_matters():
+    queries = ["impact of sleep on memory", "impact of memory on sleep"]
+    assert dedupe_queries(queries, 0.9) == [None, None]
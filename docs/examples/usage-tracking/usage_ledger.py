@@ -0,0 +1,370 @@
+#!/usr/bin/env python3
+"""
+Token and cost accounting for the Sonar API examples.
+
+Clients record one entry per API call (client, model, prompt and completion tokens,
+latency and cost) in an append-only JSON Lines ledger with one file per day. Per-client
+daily budgets switch calls to a cheaper model when a limit is near, and refuse calls
+once it is reached.
+
+  python usage_ledger.py report --since 7d --by client,model
+  python usage_ledger.py budgets
+
+The examples record usage when this directory is on the Python path:
+
+  export PYTHONPATH=/path/to/usage-tracking
+"""
+
+import argparse
+import json
+import logging
+import os
+import statistics
+import sys
+import threading
+import time
+from collections import defaultdict
+from dataclasses import asdict, dataclass
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DIR = Path.home() / ".local" / "share" / "perplexity-usage"
+
+# USD per million (prompt, completion) tokens, used when a response does not report its cost.
+# Token prices only: per-request search fees are not included in the estimate.
+PRICES: Dict[str, Tuple[float, float]] = {
+    "sonar": (1.0, 1.0),
+    "sonar-pro": (3.0, 15.0),
+    "sonar-reasoning": (1.0, 5.0),
+    "sonar-reasoning-pro": (2.0, 8.0),
+    "sonar-deep-research": (2.0, 8.0),
+}
+
+# Cheaper model to switch to when a client's budget is nearly used up
+DOWNGRADES: Dict[str, str] = {
+    "sonar-deep-research": "sonar-reasoning-pro",
+    "sonar-reasoning-pro": "sonar-reasoning",
+    "sonar-pro": "sonar",
+}
+
+
+class BudgetExceeded(Exception):
+    """Raised when a client has used up its daily budget."""
+    pass
+
+
+@dataclass
+class UsageRecord:
+    ts: float
+    client: str
+    model: str
+    prompt_tokens: int
+    completion_tokens: int
+    latency_ms: float
+    cost_usd: float
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+
+@dataclass
+class Budget:
+    daily_tokens: Optional[int] = None
+    daily_cost_usd: Optional[float] = None
+    # Fraction of a limit at which calls switch to a cheaper model
+    downgrade_at: float = 0.8
+
+    def used(self, tokens: int, cost_usd: float) -> float:
+        """The largest fraction used of any of the limits."""
+        fractions = [0.0]
+        if self.daily_tokens:
+            fractions.append(tokens / self.daily_tokens)
+        if self.daily_cost_usd:
+            fractions.append(cost_usd / self.daily_cost_usd)
+        return max(fractions)
+
+
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    prompt_price, completion_price = PRICES.get(model, (0.0, 0.0))
+    return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1_000_000
+
+
+def load_budgets(path: Path) -> Dict[str, Budget]:
+    """
+    Load budgets from a JSON file mapping client names to limits, for example
+    {"fact_checker": {"daily_tokens": 500000}, "*": {"daily_cost_usd": 5}}.
+    "*" applies to every client without its own entry.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        return {client: Budget(**limits) for client, limits in json.load(f).items()}
+
+
+class UsageLedger:
+    """Append-only usage ledger with per-client daily budgets. Safe to share between threads."""
+
+    def __init__(
+        self,
+        directory: Path = DEFAULT_DIR,
+        budgets: Optional[Dict[str, Budget]] = None,
+        downgrades: Dict[str, str] = DOWNGRADES,
+    ):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.budgets = budgets or {}
+        self.downgrades = downgrades
+        self._lock = threading.Lock()
+        # Today's totals per client: {client: [tokens, cost]}, kept current by reading new
+        # lines of today's file, so calls made by other processes count too
+        self._day: Optional[date] = None
+        self._offset = 0
+        self._totals: Dict[str, List[float]] = defaultdict(lambda: [0, 0.0])
+
+    @classmethod
+    def from_env(cls) -> "UsageLedger":
+        """
+        A ledger in $PERPLEXITY_USAGE_DIR (default ~/.local/share/perplexity-usage), with
+        budgets from $PERPLEXITY_BUDGETS or budgets.json in that directory if it exists.
+        """
+        directory = Path(os.environ.get("PERPLEXITY_USAGE_DIR", DEFAULT_DIR))
+        budgets_path = Path(os.environ.get("PERPLEXITY_BUDGETS", directory / "budgets.json"))
+        budgets = load_budgets(budgets_path) if budgets_path.exists() else None
+        return cls(directory, budgets)
+
+    def path_for(self, day: date) -> Path:
+        return self.directory / f"usage-{day.isoformat()}.jsonl"
+
+    def record(self, client: str, model: str, usage: Optional[Dict[str, Any]], latency_seconds: float) -> UsageRecord:
+        """
+        Append one API call to the ledger.
+
+        Args:
+            client: Name of the calling example, e.g. "fact_checker"
+            model: The model that served the call
+            usage: The response's `usage` block (may be None)
+            latency_seconds: Time taken by the call
+        """
+        usage = usage or {}
+        prompt_tokens = int(usage.get("prompt_tokens") or 0)
+        completion_tokens = int(usage.get("completion_tokens") or 0)
+        # Use the cost reported by the API when there is one
+        cost = usage.get("cost")
+        cost = cost.get("total_cost") if isinstance(cost, dict) else None
+        entry = UsageRecord(
+            ts=time.time(),
+            client=client,
+            model=model,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            latency_ms=round(latency_seconds * 1000, 1),
+            cost_usd=round(cost if cost is not None else estimate_cost(model, prompt_tokens, completion_tokens), 6),
+        )
+        line = json.dumps(asdict(entry)) + "\n"
+        with self._lock:
+            # One write per line in append mode, so lines from concurrent processes do not interleave
+            with open(self.path_for(date.today()), "a", encoding="utf-8") as f:
+                f.write(line)
+        return entry
+
+    def _refresh(self) -> None:
+        """Add lines appended to today's file since the last call to today's totals."""
+        today = date.today()
+        if today != self._day:
+            self._day, self._offset = today, 0
+            self._totals.clear()
+        try:
+            with open(self.path_for(today), "rb") as f:
+                f.seek(self._offset)
+                data = f.read()
+        except FileNotFoundError:
+            return
+        # Leave a partly written last line for the next refresh
+        end = data.rfind(b"\n") + 1
+        self._offset += end
+        for line in data[:end].splitlines():
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            totals = self._totals[entry["client"]]
+            totals[0] += entry["prompt_tokens"] + entry["completion_tokens"]
+            totals[1] += entry["cost_usd"]
+
+    def usage_today(self, client: str) -> Tuple[int, float]:
+        """Tokens and cost used by a client today."""
+        with self._lock:
+            self._refresh()
+            tokens, cost = self._totals.get(client, (0, 0.0))
+        return int(tokens), cost
+
+    def clients_today(self) -> List[str]:
+        """Clients that have made calls today."""
+        with self._lock:
+            self._refresh()
+            return sorted(self._totals)
+
+    def budget_for(self, client: str) -> Optional[Budget]:
+        return self.budgets.get(client) or self.budgets.get("*")
+
+    def select_model(self, client: str, model: str) -> str:
+        """
+        The model a client should use for its next call under its budget.
+
+        Returns `model`, or a cheaper model once the budget is `downgrade_at` used.
+
+        Raises:
+            BudgetExceeded: If the client has used up its budget for today
+        """
+        budget = self.budget_for(client)
+        if budget is None:
+            return model
+        tokens, cost = self.usage_today(client)
+        used = budget.used(tokens, cost)
+        if used >= 1:
+            raise BudgetExceeded(
+                f"Daily budget for {client} used up ({tokens:,} tokens, ${cost:.2f} today); try again tomorrow"
+            )
+        if used >= budget.downgrade_at and model in self.downgrades:
+            cheaper = self.downgrades[model]
+            logger.warning(f"{client} has used {used:.0%} of its daily budget; using {cheaper} instead of {model}")
+            return cheaper
+        return model
+
+
+def iter_records(directory: Path, since: Optional[datetime] = None, until: Optional[datetime] = None) -> Iterator[UsageRecord]:
+    """Read ledger entries from `directory`, optionally limited to a time range."""
+    start, end = (since.timestamp() if since else 0), (until.timestamp() if until else float("inf"))
+    for path in sorted(Path(directory).glob("usage-*.jsonl")):
+        day = date.fromisoformat(path.stem[len("usage-"):])
+        if since and day < since.date():
+            continue
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = UsageRecord(**json.loads(line))
+                except (ValueError, TypeError):
+                    continue  # Partly written or malformed line
+                if start <= entry.ts < end:
+                    yield entry
+
+
+def aggregate(records: Iterable[UsageRecord], by: List[str]) -> Dict[Tuple[str, ...], Dict[str, Any]]:
+    """Totals per group, where `by` names the grouping fields (client, model, day)."""
+    groups: Dict[Tuple[str, ...], List[UsageRecord]] = defaultdict(list)
+    for entry in records:
+        fields = {
+            "client": entry.client,
+            "model": entry.model,
+            "day": date.fromtimestamp(entry.ts).isoformat(),
+        }
+        groups[tuple(fields[name] for name in by)].append(entry)
+
+    result = {}
+    for key, entries in sorted(groups.items()):
+        latencies = sorted(e.latency_ms for e in entries)
+        result[key] = {
+            "calls": len(entries),
+            "prompt_tokens": sum(e.prompt_tokens for e in entries),
+            "completion_tokens": sum(e.completion_tokens for e in entries),
+            "total_tokens": sum(e.total_tokens for e in entries),
+            "cost_usd": round(sum(e.cost_usd for e in entries), 4),
+            "latency_mean_ms": round(statistics.fmean(latencies), 1),
+            "latency_p95_ms": latencies[int(0.95 * (len(latencies) - 1))],
+        }
+    return result
+
+
+def parse_since(value: str) -> datetime:
+    """Parse "7d", "12h" or an ISO date into a start time."""
+    units = {"h": "hours", "d": "days", "w": "weeks"}
+    if value[-1:] in units and value[:-1].isdigit():
+        return datetime.now() - timedelta(**{units[value[-1]]: int(value[:-1])})
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected e.g. 7d, 12h or 2025-01-31, got {value!r}")
+
+
+def print_report(groups: Dict[Tuple[str, ...], Dict[str, Any]], by: List[str]) -> None:
+    header = " ".join(f"{name:<22}" for name in by)
+    header += f" {'calls':>7} {'prompt tok':>11} {'compl tok':>11} {'cost $':>9} {'mean ms':>8} {'p95 ms':>8}"
+    print(header)
+    print("-" * len(header))
+    totals = defaultdict(float)
+    for key, row in groups.items():
+        for field in ("calls", "prompt_tokens", "completion_tokens", "cost_usd"):
+            totals[field] += row[field]
+        print(
+            " ".join(f"{value:<22}" for value in key)
+            + f" {row['calls']:>7} {row['prompt_tokens']:>11,} {row['completion_tokens']:>11,}"
+            f" {row['cost_usd']:>9.4f} {row['latency_mean_ms']:>8.0f} {row['latency_p95_ms']:>8.0f}"
+        )
+    print("-" * len(header))
+    print(
+        " ".join(f"{'total' if i == 0 else '':<22}" for i in range(len(by)))
+        + f" {int(totals['calls']):>7} {int(totals['prompt_tokens']):>11,} {int(totals['completion_tokens']):>11,}"
+        f" {totals['cost_usd']:>9.4f}"
+    )
+
+
+def main():
+    """Main entry point for the usage report CLI."""
+    parser = argparse.ArgumentParser(description="Report token usage and cost recorded by the Sonar API examples")
+    parser.add_argument(
+        "--dir", type=Path, default=Path(os.environ.get("PERPLEXITY_USAGE_DIR", DEFAULT_DIR)),
+        help="Ledger directory (default: $PERPLEXITY_USAGE_DIR or ~/.local/share/perplexity-usage)"
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    report = commands.add_parser("report", help="Aggregate usage by client, model and/or day")
+    report.add_argument("--since", type=parse_since, default=parse_since("7d"), help="Start of the period: 7d, 12h or a date (default: 7d)")
+    report.add_argument("--until", type=parse_since, help="End of the period (default: now)")
+    report.add_argument("--by", default="client,model", help="Comma-separated grouping: client, model, day (default: client,model)")
+    report.add_argument("--client", help="Only include this client")
+    report.add_argument("-j", "--json", action="store_true", help="Output as JSON")
+
+    commands.add_parser("budgets", help="Show today's usage against each client's budget")
+    args = parser.parse_args()
+
+    if args.command == "report":
+        by = [name.strip() for name in args.by.split(",") if name.strip()]
+        unknown = [name for name in by if name not in ("client", "model", "day")]
+        if unknown or not by:
+            print(f"Error: --by takes client, model and/or day, got {args.by!r}", file=sys.stderr)
+            return 1
+        records = (r for r in iter_records(args.dir, args.since, args.until) if not args.client or r.client == args.client)
+        groups = aggregate(records, by)
+        if args.json:
+            print(json.dumps([dict(zip(by, key), **row) for key, row in groups.items()], indent=2))
+        elif not groups:
+            print("No usage recorded in this period.")
+        else:
+            print_report(groups, by)
+        return 0
+
+    os.environ["PERPLEXITY_USAGE_DIR"] = str(args.dir)
+    ledger = UsageLedger.from_env()
+    if not ledger.budgets:
+        print(f"No budgets configured. Create {args.dir / 'budgets.json'} or set PERPLEXITY_BUDGETS.")
+        return 0
+    clients = sorted(set(ledger.budgets) - {"*"} | set(ledger.clients_today()))
+    print(f"{'client':<24} {'tokens':>12} {'limit':>12} {'cost $':>9} {'limit $':>9} {'used':>6}  status")
+    for client in clients:
+        budget = ledger.budget_for(client)
+        tokens, cost = ledger.usage_today(client)
+        if budget is None:
+            print(f"{client:<24} {tokens:>12,} {'-':>12} {cost:>9.4f} {'-':>9} {'-':>6}  no budget")
+            continue
+        used = budget.used(tokens, cost)
+        status = "blocked" if used >= 1 else "downgraded" if used >= budget.downgrade_at else "ok"
+        token_limit = f"{budget.daily_tokens:,}" if budget.daily_tokens else "-"
+        cost_limit = f"{budget.daily_cost_usd:.2f}" if budget.daily_cost_usd else "-"
+        print(f"{client:<24} {tokens:>12,} {token_limit:>12} {cost:>9.4f} {cost_limit:>9} {used:>6.0%}  {status}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())